@@ -1 +1,2 @@
 from .yolo import YoloHelmetDetector
+from .backends import load_backend
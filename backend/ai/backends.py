@@ -0,0 +1,246 @@
+import os
+import ast
+import json
+import hashlib
+import threading
+import cv2
+import numpy as np
+from .preprocess import PreprocessStage
+from .yolo import batched_nms, decode_predictions, unletterbox
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), "..", "models")
+BACKENDS = ("ultralytics", "onnxruntime", "opencv")
+
+
+class QuantizationBudgetError(ValueError):
+    pass
+
+
+class Detections:
+    """Boxes for one image in original pixel coordinates: xyxy (N, 4), conf (N,), cls (N,)."""
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+        self.cls = np.asarray(cls, dtype=np.int64).reshape(-1)
+
+    def __len__(self):
+        return len(self.conf)
+
+    def select(self, idx):
+        return Detections(self.xyxy[idx], self.conf[idx], self.cls[idx])
+
+    @property
+    def xywh(self):
+        """Top-left (x, y, w, h), the layout batched_nms expects."""
+        xywh = self.xyxy.copy()
+        xywh[:, 2:] -= xywh[:, :2]
+        return xywh
+
+
+class UltralyticsBackend:
+    """The original .pt model through ultralytics/torch."""
+
+    name = "ultralytics"
+
+    def __init__(self, model_path, threads=0):
+        import torch
+        from ultralytics import YOLO
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = YOLO(model_path)
+        self.names = dict(self.model.names)
+        self.version = model_version(model_path)
+        # YOLO's predictor keeps per-call state, so callers sharing one backend take turns
+        self._lock = threading.Lock()
+
+    def predict(self, images, conf, iou, imgsz):
+        with self._lock:
+            results = self.model(list(images), conf=conf, iou=iou, imgsz=imgsz, verbose=False)
+        out = []
+        for r in results:
+            b = r.boxes.cpu().numpy()
+            out.append(Detections(b.xyxy, b.conf, b.cls))
+        return out
+
+
+class OnnxBackend:
+    """
+    Shared letterbox -> forward -> decode -> class-aware NMS path for an
+    exported ONNX model. Subclasses provide _load() and _forward(blob).
+
+    A model exported with a fixed input size always runs at that size; the
+    imgsz argument only applies to models exported with --dynamic.
+
+    Images are letterboxed into one blob each and handed to
+    _forward_batch(blobs), which runs them one by one unless the engine can
+    stack them into a single forward pass (OnnxRuntimeBackend with a
+    dynamic-batch export).
+    """
+
+    name = "onnx"
+
+    def __init__(self, onnx_path, threads=0, check=True):
+        self.onnx_path = onnx_path
+        self.threads = threads
+        meta = read_model_meta(onnx_path)
+        if check:
+            check_quantization(onnx_path, meta)
+        self.names = meta.get("names", {})
+        self.fixed_size = None if meta.get("dynamic") else meta.get("imgsz")
+        self.version = model_version(onnx_path)
+        self.preprocess_stage = PreprocessStage()
+        self._load()
+
+    def predict(self, images, conf, iou, imgsz):
+        size = self.fixed_size or imgsz
+        # One slot per image: every blob must stay intact until the batch has run
+        prepared = [self.preprocess_stage.letterbox_blob(image, size, slot=i) for i, image in enumerate(images)]
+        outputs = self._forward_batch([blob for blob, _, _ in prepared])
+        out = []
+        for image, (_, r, pad), output in zip(images, prepared, outputs):
+            decoded = decode_predictions(output, conf)
+            if decoded is None or decoded[1].size == 0:
+                out.append(Detections(np.empty((0, 4)), [], []))
+                continue
+            cxcywh, scores, cls_ids = decoded
+            d = Detections(unletterbox(cxcywh, r, pad, image.shape), scores, cls_ids)
+            keep = batched_nms(d.xywh, d.conf, d.cls, conf, iou, max(image.shape[:2]))
+            out.append(d.select(keep))
+        return out
+
+    def _forward_batch(self, blobs):
+        return [self._forward(blob) for blob in blobs]
+
+
+class OnnxRuntimeBackend(OnnxBackend):
+    name = "onnxruntime"
+
+    def _load(self):
+        import onnxruntime as ort
+        opts = ort.SessionOptions()
+        if self.threads:
+            opts.intra_op_num_threads = self.threads
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(self.onnx_path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        # ultralytics stores names/imgsz in the model metadata; prefer it over the sidecar
+        meta = self.session.get_modelmeta().custom_metadata_map
+        if "names" in meta:
+            self.names = {int(k): v for k, v in ast.literal_eval(meta["names"]).items()}
+        shape = self.session.get_inputs()[0].shape
+        self.fixed_size = shape[2] if isinstance(shape[2], int) else None
+        self.dynamic_batch = not isinstance(shape[0], int)
+
+    def _forward(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+    def _forward_batch(self, blobs):
+        if not self.dynamic_batch or len(blobs) < 2:
+            return super()._forward_batch(blobs)
+        out = self._forward(np.concatenate(blobs))
+        return [out[i:i + 1] for i in range(len(blobs))]
+
+
+class OpenCvDnnBackend(OnnxBackend):
+    name = "opencv"
+
+    def _load(self):
+        if self.threads:
+            cv2.setNumThreads(self.threads)
+        self.net = cv2.dnn.readNetFromONNX(self.onnx_path)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        # A cv2.dnn.Net holds its input between setInput and forward, so callers take turns
+        self._lock = threading.Lock()
+
+    def _forward(self, blob):
+        with self._lock:
+            self.net.setInput(blob)
+            return self.net.forward()
+
+
+def model_version(path):
+    """<file name>:<content hash prefix>, so a retrained or re-exported model under the same name is told apart."""
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return f"{os.path.basename(path)}:{digest.hexdigest()}"
+
+
+def read_model_meta(onnx_path):
+    """Class names and input size from the <model>.json sidecar written by export_onnx.py."""
+    path = os.path.splitext(onnx_path)[0] + ".json"
+    if not os.path.exists(path):
+        names = os.getenv("HELMET_CLASS_NAMES", "With Helmet,Without Helmet")
+        return {"names": dict(enumerate(s.strip() for s in names.split(",") if s.strip())), "imgsz": 640}
+    with open(path) as f:
+        meta = json.load(f)
+    meta["names"] = {int(k): v for k, v in meta.get("names", {}).items()}
+    return meta
+
+
+def check_quantization(onnx_path, meta, budget=None):
+    """
+    Refuse a quantized model unless quantize_onnx.py recorded its mAP@0.5
+    drop against FP32 and the drop is within HELMET_INT8_MAX_DROP
+    (absolute mAP, default 0.01).
+    """
+    budget = budget if budget is not None else float(os.getenv("HELMET_INT8_MAX_DROP", "0.01"))
+    q = meta.get("quantization")
+    if q is None:
+        if ".int8" in os.path.basename(onnx_path):
+            raise QuantizationBudgetError(f"{onnx_path} has no recorded accuracy evaluation (run quantize_onnx.py)")
+        return
+    if q.get("map50_drop") is None or q["map50_drop"] > budget:
+        raise QuantizationBudgetError(
+            f"{onnx_path} loses {q.get('map50_drop')} mAP@0.5 against FP32, over the {budget} budget"
+        )
+
+
+def load_backend(name=None, model_dir=MODELS_DIR, threads=None):
+    """
+    Pick the inference backend from HELMET_BACKEND: "ultralytics",
+    "onnxruntime", "opencv", or "auto" (the default), which uses the first
+    ONNX engine that loads when models/helmet_yolo.onnx exists and falls back
+    to ultralytics otherwise. Only the ultralytics backend imports torch.
+
+    HELMET_PRECISION=int8 selects helmet_yolo.int8.onnx for the ONNX engines.
+    If that model fails the quantization budget it is refused and the FP32
+    export is used instead.
+    """
+    name = name or os.getenv("HELMET_BACKEND", "auto")
+    threads = threads if threads is not None else int(os.getenv("HELMET_INFER_THREADS", "0"))
+    pt_path = os.path.join(model_dir, os.getenv("HELMET_MODEL", "helmet_yolo.pt"))
+    onnx_path = os.getenv("HELMET_ONNX_PATH") or os.path.splitext(pt_path)[0] + ".onnx"
+    if os.getenv("HELMET_PRECISION", "fp32") == "int8" and name != "ultralytics":
+        int8_path = os.path.splitext(onnx_path)[0] + ".int8.onnx"
+        try:
+            if os.path.exists(int8_path):
+                check_quantization(int8_path, read_model_meta(int8_path))
+                onnx_path = int8_path
+            else:
+                print(f"[WARN] {int8_path} not found, using {onnx_path}")
+        except QuantizationBudgetError as e:
+            print(f"[WARN] Refusing INT8 model: {e}")
+
+    if name == "auto":
+        if os.path.exists(onnx_path):
+            for engine in (OnnxRuntimeBackend, OpenCvDnnBackend):
+                try:
+                    return engine(onnx_path, threads)
+                except ImportError:
+                    continue
+        name = "ultralytics"
+
+    if name == "ultralytics":
+        if not os.path.exists(pt_path):
+            raise FileNotFoundError(f"[ERROR] Model not found: {pt_path}")
+        return UltralyticsBackend(pt_path, threads)
+    if name not in BACKENDS:
+        raise ValueError(f"unknown HELMET_BACKEND {name!r}, expected one of {BACKENDS + ('auto',)}")
+    if not os.path.exists(onnx_path):
+        raise FileNotFoundError(f"[ERROR] ONNX model not found: {onnx_path} (run export_onnx.py)")
+    engine = OnnxRuntimeBackend if name == "onnxruntime" else OpenCvDnnBackend
+    return engine(onnx_path, threads)
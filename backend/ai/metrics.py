@@ -0,0 +1,102 @@
+import os
+import numpy as np
+
+
+def label_path_for(image_path):
+    """datasets/.../images/x.jpg -> datasets/.../labels/x.txt (YOLO layout)."""
+    head, name = os.path.split(image_path)
+    return os.path.join(os.path.dirname(head), "labels", os.path.splitext(name)[0] + ".txt")
+
+
+def load_labels(label_path, width, height):
+    """YOLO label file (cls cx cy w h, normalized) -> (cls (N,), xyxy (N, 4)) in pixels."""
+    if not os.path.exists(label_path):
+        return np.empty(0, dtype=np.int64), np.empty((0, 4), dtype=np.float32)
+    rows = np.loadtxt(label_path, dtype=np.float32, ndmin=2)
+    if rows.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty((0, 4), dtype=np.float32)
+    cls = rows[:, 0].astype(np.int64)
+    cx, cy, w, h = rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+    return cls, np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+
+def box_iou(a, b):
+    """Pairwise IoU of xyxy boxes, (N, 4) x (M, 4) -> (N, M)."""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def average_precision(tp, conf, n_gt):
+    """101-point interpolated AP (COCO style) from per-detection TP flags."""
+    if n_gt == 0:
+        return None
+    if len(tp) == 0:
+        return 0.0
+    order = np.argsort(-conf)
+    tp = np.asarray(tp, dtype=np.float64)[order]
+    tpc = np.cumsum(tp)
+    recall = tpc / n_gt
+    precision = tpc / np.arange(1, len(tp) + 1)
+    # Precision envelope, then sample it at 101 recall points
+    envelope = np.maximum.accumulate(precision[::-1])[::-1]
+    points = np.linspace(0, 1, 101)
+    idx = np.searchsorted(recall, points, side="left")
+    return float(np.mean(np.where(idx < len(envelope), envelope[np.minimum(idx, len(envelope) - 1)], 0.0)))
+
+
+class MapAccumulator:
+    """Collects per-image detections against ground truth and reports mAP@iou_th."""
+
+    def __init__(self, class_names, iou_th=0.5):
+        self.class_names = class_names
+        self.iou_th = iou_th
+        self._tp = {c: [] for c in class_names}
+        self._conf = {c: [] for c in class_names}
+        self._n_gt = {c: 0 for c in class_names}
+        self.images = 0
+
+    def add(self, det, gt_cls, gt_xyxy):
+        """det is an ai.backends.Detections for the image."""
+        self.images += 1
+        for c in self.class_names:
+            gt = gt_xyxy[gt_cls == c]
+            self._n_gt[c] += len(gt)
+            mask = det.cls == c
+            if not mask.any():
+                continue
+            conf = det.conf[mask]
+            boxes = det.xyxy[mask]
+            tp = np.zeros(len(conf), dtype=bool)
+            if len(gt):
+                iou = box_iou(boxes, gt)
+                matched = np.zeros(len(gt), dtype=bool)
+                # Greedy matching in confidence order; each ground truth box counts once
+                for i in np.argsort(-conf):
+                    j = int(np.argmax(np.where(matched, -1.0, iou[i])))
+                    if iou[i, j] >= self.iou_th and not matched[j]:
+                        matched[j] = True
+                        tp[i] = True
+            self._tp[c].extend(tp.tolist())
+            self._conf[c].extend(conf.tolist())
+
+    def result(self):
+        """mAP plus precision/recall over every detection that was added (i.e. at the caller's threshold)."""
+        per_class = {}
+        tp = sum(sum(v) for v in self._tp.values())
+        dets = sum(len(v) for v in self._tp.values())
+        n_gt = sum(self._n_gt.values())
+        for c, name in self.class_names.items():
+            ap = average_precision(np.array(self._tp[c]), np.array(self._conf[c]), self._n_gt[c])
+            if ap is not None:
+                per_class[name] = round(ap, 4)
+        return {
+            "map50": round(float(np.mean(list(per_class.values()))), 4) if per_class else 0.0,
+            "precision": round(tp / dets, 4) if dets else 0.0,
+            "recall": round(tp / n_gt, 4) if n_gt else 0.0,
+            "per_class": per_class,
+            "images": self.images
+        }
@@ -0,0 +1,96 @@
+import os
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+
+class PreprocessStage:
+    """
+    CLAHE and letterbox preprocessing that reuses its work buffers.
+
+    The CLAHE object and every intermediate array are created once per thread
+    and per input resolution, then written in place on later frames. Arrays
+    returned from here are those reused buffers: they stay valid until the
+    same thread calls again with the same resolution and `slot`, so a batch
+    should give each image its own slot.
+
+    Input resolutions are chosen by clients, so each thread keeps at most
+    max_buffer_mb of buffers, dropping the least recently used first. A
+    dropped buffer is only reallocated; arrays already returned stay valid.
+    """
+
+    def __init__(self, clip_limit=2.0, tile_grid=(8, 8), max_buffer_mb=None):
+        self.clip_limit = clip_limit
+        self.tile_grid = tile_grid
+        max_buffer_mb = max_buffer_mb if max_buffer_mb is not None else float(os.getenv("HELMET_PREPROCESS_BUFFER_MB", "256"))
+        self.max_buffer_bytes = int(max_buffer_mb * 1024 * 1024)
+        self._local = threading.local()
+
+    def _state(self):
+        state = getattr(self._local, "state", None)
+        if state is None:
+            # cv2 CLAHE keeps scratch buffers internally, so one per thread
+            state = {"clahe": cv2.createCLAHE(clipLimit=self.clip_limit, tileGridSize=self.tile_grid), "buffers": OrderedDict(), "bytes": 0}
+            self._local.state = state
+        return state
+
+    def _buffer(self, key, shape, dtype=np.uint8, fill=None):
+        state = self._state()
+        buffers = state["buffers"]
+        buf = buffers.get(key)
+        if buf is not None:
+            buffers.move_to_end(key)
+            return buf
+        buf = np.empty(shape, dtype=dtype) if fill is None else np.full(shape, fill, dtype=dtype)
+        buffers[key] = buf
+        state["bytes"] += buf.nbytes
+        while state["bytes"] > self.max_buffer_bytes and len(buffers) > 1:
+            _, old = buffers.popitem(last=False)
+            state["bytes"] -= old.nbytes
+        return buf
+
+    def clahe(self, image, slot=0):
+        """Equalize the L channel in LAB space; returns a reused BGR buffer."""
+        h, w = image.shape[:2]
+        lab = self._buffer(("lab", h, w, slot), (h, w, 3))
+        l = self._buffer(("l", h, w, slot), (h, w))
+        cl = self._buffer(("cl", h, w, slot), (h, w))
+        out = self._buffer(("bgr", h, w, slot), (h, w, 3))
+        cv2.cvtColor(image, cv2.COLOR_BGR2LAB, dst=lab)
+        cv2.extractChannel(lab, 0, dst=l)
+        self._state()["clahe"].apply(l, dst=cl)
+        cv2.insertChannel(cl, lab, 0)
+        cv2.cvtColor(lab, cv2.COLOR_LAB2BGR, dst=out)
+        return out
+
+    def resize_max(self, image, max_side, slot=0):
+        """Downscale so the long side is at most max_side. Returns (image, scale)."""
+        h, w = image.shape[:2]
+        r = max_side / max(h, w)
+        if r >= 1.0:
+            return image, 1.0
+        size = (int(round(w * r)), int(round(h * r)))
+        out = self._buffer(("resized", size[1], size[0], slot), (size[1], size[0], 3))
+        cv2.resize(image, size, dst=out, interpolation=cv2.INTER_AREA)
+        return out, r
+
+    def letterbox_blob(self, image, size, clahe=False, slot=0):
+        """
+        Resize into a gray-padded size x size canvas and write the normalized
+        RGB CHW tensor straight into a reused (1, 3, size, size) blob.
+        Returns (blob, r, (left, top)).
+        """
+        h, w = image.shape[:2]
+        r = min(size / h, size / w)
+        nw, nh = int(round(w * r)), int(round(h * r))
+        left, top = (size - nw) // 2, (size - nh) // 2
+        # The padding is written once per resolution; only the image area changes per frame
+        canvas = self._buffer(("canvas", h, w, size, slot), (size, size, 3), fill=114)
+        roi = canvas[top:top + nh, left:left + nw]
+        cv2.resize(image, (nw, nh), dst=roi, interpolation=cv2.INTER_LINEAR)
+        if clahe:
+            roi[...] = self.clahe(roi, slot=("lb", slot))
+        blob = self._buffer(("blob", size, slot), (1, 3, size, size), dtype=np.float32)
+        np.multiply(canvas[:, :, ::-1].transpose(2, 0, 1), 1 / 255.0, out=blob[0], casting="unsafe")
+        return blob, r, (left, top)
@@ -2,6 +2,56 @@ import os
 import base64
 import cv2
 import numpy as np
+from .preprocess import PreprocessStage
+
+
+def batched_nms(xywh, scores, cls_ids, score_th, nms_th, span):
+    # Class-aware NMS in a single call: shift each class into its own region
+    offset = (np.asarray(cls_ids) * (span + 1)).astype(np.float32)[:, None]
+    boxes = np.asarray(xywh, dtype=np.float32).copy()
+    boxes[:, :2] += offset
+    idxs = cv2.dnn.NMSBoxes(boxes.tolist(), np.asarray(scores, dtype=np.float32).tolist(), score_th, nms_th)
+    return np.asarray(idxs, dtype=np.int64).reshape(-1)
+
+
+def decode_predictions(out, score_th):
+    """Raw YOLO output -> (cxcywh, scores, cls_ids) above score_th, or None for an unknown layout."""
+    pred = np.squeeze(out, axis=0) if out.ndim == 3 and out.shape[0] == 1 else out
+    if pred.ndim != 2:
+        return None
+    # YOLOv8 exports (4+nc, N): no objectness column, anchors along axis 1
+    if pred.shape[0] < pred.shape[1]:
+        pred = pred.T
+        if pred.shape[1] < 5:
+            return None
+        cls_scores = pred[:, 4:]
+        cls_ids = np.argmax(cls_scores, axis=1)
+        scores = np.take_along_axis(cls_scores, cls_ids[:, None], axis=1)[:, 0]
+        keep = scores >= score_th
+        return pred[keep, :4], scores[keep], cls_ids[keep]
+    # YOLOv5 exports (N, 5+nc): conf = obj * cls, and cls <= 1 so obj bounds it
+    if pred.shape[1] < 6:
+        return None
+    pred = pred[pred[:, 4] >= score_th]
+    cls_scores = pred[:, 5:]
+    cls_ids = np.argmax(cls_scores, axis=1)
+    scores = pred[:, 4] * np.take_along_axis(cls_scores, cls_ids[:, None], axis=1)[:, 0]
+    keep = scores >= score_th
+    return pred[keep, :4], scores[keep], cls_ids[keep]
+
+
+def unletterbox(cxcywh, r, pad, orig_shape):
+    """Letterboxed (cx, cy, w, h) -> clipped (x1, y1, x2, y2) in original image coordinates."""
+    xyxy = np.empty_like(cxcywh)
+    xyxy[:, :2] = cxcywh[:, :2] - cxcywh[:, 2:4] / 2
+    xyxy[:, 2:] = cxcywh[:, :2] + cxcywh[:, 2:4] / 2
+    xyxy[:, [0, 2]] -= pad[0]
+    xyxy[:, [1, 3]] -= pad[1]
+    xyxy /= r
+    xyxy[:, [0, 2]] = np.clip(xyxy[:, [0, 2]], 0, orig_shape[1] - 1)
+    xyxy[:, [1, 3]] = np.clip(xyxy[:, [1, 3]], 0, orig_shape[0] - 1)
+    return xyxy
+
 
 class YoloHelmetDetector:
     def __init__(self):
@@ -11,6 +61,9 @@ class YoloHelmetDetector:
         self.nms_th = float(os.getenv("YOLO_NMS_THRESHOLD", "0.45"))
         names = os.getenv("YOLO_CLASS_NAMES", "no_helmet,helmet")
         self.class_names = [s.strip() for s in names.split(",") if s.strip()]
+        # Optional CLAHE, applied to the letterboxed image only
+        self.clahe = os.getenv("YOLO_CLAHE", "0") == "1"
+        self.preprocess_stage = PreprocessStage()
         self.net = None
         if self.onnx_path and os.path.exists(self.onnx_path):
             try:
@@ -18,69 +71,40 @@ class YoloHelmetDetector:
             except Exception:
                 self.net = None
 
-    def _letterbox(self, img, new_shape):
-        h, w = img.shape[:2]
-        r = min(new_shape[0] / h, new_shape[1] / w)
-        new_unpad = (int(round(w * r)), int(round(h * r)))
-        dw, dh = new_shape[1] - new_unpad[0], new_shape[0] - new_unpad[1]
-        top, bottom = dh // 2, dh - dh // 2
-        left, right = dw // 2, dw - dw // 2
-        img = cv2.resize(img, new_unpad, interpolation=cv2.INTER_LINEAR)
-        img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
-        return img, r, (left, top)
-
     def _preprocess(self, bgr):
-        size = (self.input_size, self.input_size)
-        lb, r, pad = self._letterbox(bgr, (size[1], size[0]))
-        blob = cv2.dnn.blobFromImage(lb, 1/255.0, size, swapRB=True, crop=False)
-        return blob, r, pad, lb.shape[:2]
+        blob, r, pad = self.preprocess_stage.letterbox_blob(bgr, self.input_size, clahe=self.clahe)
+        return blob, r, pad, (self.input_size, self.input_size)
 
-    def _postprocess_v5(self, out, r, pad, orig_shape):
-        if out.ndim == 3 and out.shape[0] == 1:
-            out = np.squeeze(out, axis=0)
-        boxes = []
-        if out.ndim == 2 and out.shape[1] >= 6:
-            num = out.shape[0]
-            for i in range(num):
-                cx, cy, w, h = out[i, 0:4]
-                obj = out[i, 4]
-                cls_scores = out[i, 5:]
-                if cls_scores.size == 0:
-                    continue
-                cls_id = int(np.argmax(cls_scores))
-                cls_score = float(cls_scores[cls_id])
-                conf = float(obj * cls_score)
-                if conf < self.score_th:
-                    continue
-                x1 = (cx - w / 2) - pad[0]
-                y1 = (cy - h / 2) - pad[1]
-                x2 = (cx + w / 2) - pad[0]
-                y2 = (cy + h / 2) - pad[1]
-                x1 /= r
-                y1 /= r
-                x2 /= r
-                y2 /= r
-                x1 = max(0, min(orig_shape[1] - 1, x1))
-                y1 = max(0, min(orig_shape[0] - 1, y1))
-                x2 = max(0, min(orig_shape[1] - 1, x2))
-                y2 = max(0, min(orig_shape[0] - 1, y2))
-                boxes.append((int(x1), int(y1), int(x2 - x1), int(y2 - y1), cls_id, conf))
-        if not boxes:
+    def _decode(self, out):
+        return decode_predictions(out, self.score_th)
+
+    def _postprocess(self, out, r, pad, orig_shape):
+        decoded = self._decode(out)
+        if decoded is None or decoded[1].size == 0:
             return []
-        b = np.array([box[0:4] for box in boxes])
-        s = np.array([box[5] for box in boxes])
-        idxs = cv2.dnn.NMSBoxes(b.tolist(), s.tolist(), self.score_th, self.nms_th)
+        cxcywh, scores, cls_ids = decoded
+        xyxy = unletterbox(cxcywh, r, pad, orig_shape)
+        xywh = np.concatenate([xyxy[:, :2], xyxy[:, 2:] - xyxy[:, :2]], axis=1)
+        idxs = batched_nms(xywh, scores, cls_ids, self.score_th, self.nms_th, max(orig_shape[:2]))
         result = []
-        if len(idxs) > 0:
-            for i in idxs.flatten():
-                x, y, w, h, cls_id, conf = boxes[i]
-                label = self.class_names[cls_id] if cls_id < len(self.class_names) else str(cls_id)
-                result.append({"x": x, "y": y, "w": w, "h": h, "label": label, "confidence": conf})
+        for i in idxs:
+            cls_id = int(cls_ids[i])
+            label = self.class_names[cls_id] if cls_id < len(self.class_names) else str(cls_id)
+            result.append({
+                "x": int(xyxy[i, 0]),
+                "y": int(xyxy[i, 1]),
+                "w": int(xywh[i, 2]),
+                "h": int(xywh[i, 3]),
+                "label": label,
+                "confidence": float(scores[i]),
+            })
         return result
 
     def detect(self, img_bytes):
         arr = np.frombuffer(img_bytes, dtype=np.uint8)
-        bgr = cv2.imdecode(arr, cv2.IMREAD_COLOR)
+        return self.detect_array(cv2.imdecode(arr, cv2.IMREAD_COLOR))
+
+    def detect_array(self, bgr):
         if bgr is None:
             return {"helmet": False, "confidence": 0.0, "boxes": [], "image": None}
         if self.net is None:
@@ -90,7 +114,7 @@ class YoloHelmetDetector:
         blob, r, pad, lb_shape = self._preprocess(bgr)
         self.net.setInput(blob)
         out = self.net.forward()
-        boxes = self._postprocess_v5(out, r, pad, bgr.shape)
+        boxes = self._postprocess(out, r, pad, bgr.shape)
         helmet = any(b["label"].lower() == "helmet" for b in boxes)
         conf = max([b["confidence"] for b in boxes], default=0.0)
         draw = bgr.copy()
@@ -9,23 +9,38 @@
 # d:/OGProjects2/helmate-detectation/.venv/Scripts/Activate.ps1
 
 import os
+import time
+import uuid
+import atexit
 import base64
 import datetime
-import time
-from flask import Flask, request, jsonify, Response
+import threading
+from flask import Flask, request, jsonify, Response, has_app_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
-import cv2
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from sqlalchemy import func, or_, and_
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, decode_token
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
+from services.cache import LruCache
+from services.persistence import WriteBehindWriter
+from services.events import EventHub, SessionTimer
+from services.metrics import REGISTRY, STAGE_SECONDS, REQUEST_SECONDS, IN_FLIGHT
+from services.loader import ModelLoader
+from services.jobs import JobRunner, JobQueueFullError, violation_spans
 try:
     from dotenv import load_dotenv
     load_dotenv()
 except Exception:
     pass
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
 
-def create_app():
+def create_app(background=True):
+    # background=False only builds the app: no job recovery, eager model load or cameras (the reloader's watcher process)
     app = Flask(__name__)
     db_url = os.getenv("DATABASE_URL", "sqlite:///helmet.db")
     app.config["SQLALCHEMY_DATABASE_URI"] = db_url
@@ -36,7 +51,7 @@ def create_app():
     CORS(app, resources={
         r"/api/*": {
             "origins": "*",
-            "allow_headers": ["Content-Type", "Authorization"],
+            "allow_headers": ["Content-Type", "Authorization", "X-Client-Id"],
             "expose_headers": ["Authorization"]
         },
         r"/stream/*": {
@@ -74,144 +89,445 @@ def create_app():
         timestamp = db.Column(db.DateTime, server_default=func.now(), nullable=False)
         result = db.Column(db.Boolean, nullable=False)
         confidence = db.Column(db.Float, nullable=False)
+        __table_args__ = (db.Index("ix_detection_logs_user_timestamp", "user_id", "timestamp"),)
+
+    class DetectionRollup(db.Model):
+        # Per-user hourly/daily aggregates of detection_logs, maintained as logs are written
+        __tablename__ = "detection_rollups"
+        id = db.Column(db.Integer, primary_key=True)
+        user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+        granularity = db.Column(db.String(8), nullable=False)
+        bucket_start = db.Column(db.DateTime, nullable=False)
+        count = db.Column(db.Integer, nullable=False, default=0)
+        helmet_count = db.Column(db.Integer, nullable=False, default=0)
+        confidence_sum = db.Column(db.Float, nullable=False, default=0.0)
+        confidence_max = db.Column(db.Float, nullable=False, default=0.0)
+        __table_args__ = (db.UniqueConstraint("user_id", "granularity", "bucket_start", name="uq_detection_rollups_bucket"),)
+
+    class VideoJob(db.Model):
+        # An uploaded video processed in the background; next_frame is the resume point after a restart
+        __tablename__ = "video_jobs"
+        id = db.Column(db.String(32), primary_key=True)
+        owner_id = db.Column(db.Integer, db.ForeignKey("auth_users.id"), nullable=False, index=True)
+        filename = db.Column(db.String(255), nullable=False)
+        path = db.Column(db.String(512), nullable=False)
+        status = db.Column(db.String(16), nullable=False, default="queued")
+        fps = db.Column(db.Float, nullable=False, default=0.0)
+        total_frames = db.Column(db.Integer, nullable=False, default=0)
+        stride = db.Column(db.Integer, nullable=False, default=1)
+        next_frame = db.Column(db.Integer, nullable=False, default=0)
+        frames_done = db.Column(db.Integer, nullable=False, default=0)
+        error = db.Column(db.String(512), nullable=True)
+        created_at = db.Column(db.DateTime, server_default=func.now(), nullable=False)
+        started_at = db.Column(db.DateTime, nullable=True)
+        finished_at = db.Column(db.DateTime, nullable=True)
+
+    class VideoJobSecond(db.Model):
+        __tablename__ = "video_job_seconds"
+        id = db.Column(db.Integer, primary_key=True)
+        job_id = db.Column(db.String(32), db.ForeignKey("video_jobs.id"), nullable=False)
+        second = db.Column(db.Integer, nullable=False)
+        frames = db.Column(db.Integer, nullable=False, default=0)
+        helmet_frames = db.Column(db.Integer, nullable=False, default=0)
+        violation_frames = db.Column(db.Integer, nullable=False, default=0)
+        max_violation_confidence = db.Column(db.Float, nullable=False, default=0.0)
+        __table_args__ = (db.UniqueConstraint("job_id", "second", name="uq_video_job_seconds_second"),)
+
+    def rollup_logs(logs):
+        buckets = {}
+        for log in logs:
+            ts = log["timestamp"]
+            hour = ts.replace(minute=0, second=0, microsecond=0)
+            for key in ((log["user_id"], "hour", hour), (log["user_id"], "day", hour.replace(hour=0))):
+                b = buckets.setdefault(key, [0, 0, 0.0, 0.0])
+                b[0] += 1
+                b[1] += 1 if log["result"] else 0
+                b[2] += log["confidence"]
+                b[3] = max(b[3], log["confidence"])
+        for (user_id, granularity, bucket_start), (count, helmet_count, conf_sum, conf_max) in buckets.items():
+            r = DetectionRollup.query.filter_by(user_id=user_id, granularity=granularity, bucket_start=bucket_start).first()
+            if r is None:
+                r = DetectionRollup(user_id=user_id, granularity=granularity, bucket_start=bucket_start, count=0, helmet_count=0, confidence_sum=0.0, confidence_max=0.0)
+                db.session.add(r)
+            r.count += count
+            r.helmet_count += helmet_count
+            r.confidence_sum += conf_sum
+            r.confidence_max = max(r.confidence_max, conf_max)
 
     with app.app_context():
         db.create_all()
+        # create_all skips indexes on tables that already exist
+        for index in DetectionLog.__table__.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+        # One-off backfill for logs written before rollups existed
+        if DetectionRollup.query.first() is None and DetectionLog.query.first() is not None:
+            chunk = []
+            for l in DetectionLog.query.order_by(DetectionLog.id).yield_per(5000):
+                chunk.append({"user_id": l.user_id, "timestamp": l.timestamp, "result": l.result, "confidence": l.confidence})
+                if len(chunk) >= 5000:
+                    rollup_logs(chunk)
+                    chunk = []
+            rollup_logs(chunk)
+            db.session.commit()
 
-    detector_ref = {"detector": None}
-
-    # Global timer state for the demo stream
-    timer_state = {
-        "accumulated_time": 0.0,
-        "running": False,
-        "last_request_time": 0.0
-    }
+    detector_ref = {"detector": None, "scheduler": None, "cache": None, "motion": None}
+    detector_lock = threading.Lock()
+
+    # HELMET_WORKERS > 0 runs inference in that many worker processes instead of this one
+    use_pool = int(os.getenv("HELMET_WORKERS", "0")) > 0
+
+    def make_detector():
+        # Imported here so torch/ultralytics/cv2 load in the loader thread, not at app import
+        if use_pool:
+            from services.workers import WorkerPool
+            return WorkerPool()
+        from services.detection import HelmetDetector
+        return HelmetDetector()
+
+    model_loader = ModelLoader(make_detector)
+    broadcasters = {}
+    broadcasters_lock = threading.Lock()
+
+    # Wear-time timers: one per client_id for /api/detect, one per demo stream source.
+    # Changes are pushed to /api/events subscribers on the "client:<id>" and "demo" channels.
+    event_hub = EventHub()
+    timers = LruCache(int(os.getenv("HELMET_TIMER_CACHE_SIZE", "10000")))
+    timers_lock = threading.Lock()
+    demo_timers = {}
+
+    def get_timer(client_id):
+        with timers_lock:
+            timer = timers.get(client_id)
+            if timer is None:
+                timer = SessionTimer()
+                timers.put(client_id, timer)
+            return timer
+
+    def publish_timer(channel, timer, scope):
+        event_hub.publish(channel, "timer", dict(timer.snapshot(), scope=scope))
+
+    # client_id -> {"user_id", "client_id", "streak"}; the streak is kept current by update_streak
+    user_cache = LruCache(int(os.getenv("HELMET_USER_CACHE_SIZE", "10000")))
 
     def get_or_create_user(client_id):
+        entry = user_cache.get(client_id)
+        if entry is not None:
+            return entry
         u = User.query.filter_by(client_id=client_id).first()
         if u is None:
             u = User(client_id=client_id)
             db.session.add(u)
-            db.session.commit()
+            db.session.flush()
             s = Streak(user_id=u.id, current_streak=0, last_detected_date=None, total_rewards=0)
             db.session.add(s)
             db.session.commit()
-        return u
-
-    def update_streak(user_id, helmet_on):
-        s = Streak.query.filter_by(user_id=user_id).first()
-        today = datetime.date.today()
-        if helmet_on:
-            if s.last_detected_date == today:
-                pass
-            else:
-                if s.last_detected_date == today - datetime.timedelta(days=1):
-                    s.current_streak += 1
+        else:
+            s = Streak.query.filter_by(user_id=u.id).first()
+        entry = {
+            "user_id": u.id,
+            "client_id": u.client_id,
+            "streak": {"id": s.id, "user_id": u.id, "current_streak": s.current_streak, "last_detected_date": s.last_detected_date, "total_rewards": s.total_rewards}
+        }
+        user_cache.put(client_id, entry)
+        return entry
+
+    # Streak rows changed but not yet flushed by db_writer. They outlive cache
+    # evictions, so a user reloaded from the database still sees them.
+    pending_streaks = {}
+    streak_lock = threading.RLock()
+
+    def streak_snapshot(u):
+        with streak_lock:
+            pending = pending_streaks.get(u["user_id"])
+            return dict(pending if pending is not None else u["streak"])
+
+    def update_streak(u, helmet_on):
+        # Returns the streak info plus the changed row to hand to db_writer (or None)
+        with streak_lock:
+            s = streak_snapshot(u)
+            today = datetime.date.today()
+            if helmet_on:
+                if s["last_detected_date"] == today:
+                    pass
                 else:
-                    s.current_streak = 1
-                s.last_detected_date = today
-                reward = 0
-                if s.current_streak in [3, 7, 30]:
-                    reward = 10 if s.current_streak == 3 else 25 if s.current_streak == 7 else 100
-                    s.total_rewards += reward
+                    if s["last_detected_date"] == today - datetime.timedelta(days=1):
+                        s["current_streak"] += 1
+                    else:
+                        s["current_streak"] = 1
+                    s["last_detected_date"] = today
+                    reward = 0
+                    if s["current_streak"] in [3, 7, 30]:
+                        reward = 10 if s["current_streak"] == 3 else 25 if s["current_streak"] == 7 else 100
+                        s["total_rewards"] += reward
+                    pending_streaks[u["user_id"]] = s
+                    u["streak"] = s
+                    return {"streak": s["current_streak"], "reward": reward}, s
+            return {"streak": s["current_streak"], "reward": 0}, None
+
+    def write_detections(logs, streaks):
+        with STAGE_SECONDS.time(stage="db_commit"):
+            if logs:
+                db.session.bulk_insert_mappings(DetectionLog, logs)
+                rollup_logs(logs)
+            if streaks:
+                db.session.bulk_update_mappings(Streak, list(streaks.values()))
+            try:
                 db.session.commit()
-                return {"streak": s.current_streak, "reward": reward}
-        return {"streak": s.current_streak, "reward": 0}
+            except Exception:
+                # Leaves the session usable for the retry (or the next request, in synchronous mode)
+                db.session.rollback()
+                raise
+
+    def flush_detections(items):
+        # One transaction per batch: bulk insert the logs, then the latest streak row per user
+        logs = [item["log"] for item in items]
+        streaks = {}
+        for item in items:
+            if item["streak"] is not None:
+                streaks[item["streak"]["id"]] = item["streak"]
+        if has_app_context():
+            # Synchronous mode: write in the request's own session
+            write_detections(logs, streaks)
+        else:
+            with app.app_context():
+                write_detections(logs, streaks)
+        with streak_lock:
+            for row in streaks.values():
+                if pending_streaks.get(row["user_id"]) is row:
+                    del pending_streaks[row["user_id"]]
+
+    def drop_detections(items):
+        # The batch never reached the database: forget its streak rows so the
+        # users are reloaded from what was actually stored
+        with streak_lock:
+            for item in items:
+                row = item["streak"]
+                if row is not None and pending_streaks.get(row["user_id"]) is row:
+                    del pending_streaks[row["user_id"]]
+                    user_cache.invalidate(item["client_id"])
+
+    db_writer = WriteBehindWriter(flush_detections, on_drop=drop_detections)
+    atexit.register(db_writer.close)
+
+    def read_binary_frame():
+        # Raw image/jpeg body (client_id in query or X-Client-Id) or multipart "image" part.
+        # Returned bytes go straight to np.frombuffer, so no base64 or JSON copies.
+        if request.mimetype == "multipart/form-data":
+            f = request.files.get("image")
+            client_id = request.form.get("client_id") or request.args.get("client_id")
+            return (f.read() if f else None), client_id
+        client_id = request.args.get("client_id") or request.headers.get("X-Client-Id")
+        return request.get_data(cache=False), client_id
+
+    def make_demo_pipeline(source):
+        import cv2
+        from services.pipeline import StreamPipeline
+
+        # Streams without detection if the model isn't up in time, as before when loading failed
+        loaded = model_loader.get(wait=float(os.getenv("HELMET_STREAM_MODEL_WAIT_S", "30")))
+
+        # Reset timer when the shared producer starts, not on every viewer connection
+        timer = SessionTimer()
+        demo_timers[source] = timer
+        publish_timer("demo", timer, "demo")
+        last = {"helmet": None}
+
+        def on_result(boxes):
+            helmet_count = sum(1 for b in boxes if b.get("is_helmet"))
+            no_helmet_count = sum(1 for b in boxes if not b.get("is_helmet"))
+            helmet_on = helmet_count > 0 and no_helmet_count == 0
+
+            if timer.observe(helmet_on):
+                publish_timer("demo", timer, "demo")
+            # The stream runs at camera rate, so only push detections when the verdict flips
+            if helmet_on != last["helmet"]:
+                last["helmet"] = helmet_on
+                confidence = max((b.get("confidence", 0.0) for b in boxes if b.get("is_helmet")), default=0.0)
+                event_hub.publish("demo", "detection", {"scope": "demo", "helmet": helmet_on, "confidence": confidence, "boxes": boxes})
+
+        def overlay(frame):
+            accumulated = timer.accumulated_time
+            minutes = int(accumulated // 60)
+            seconds = int(accumulated % 60)
+            timer_text = f"Time: {minutes:02}:{seconds:02}"
+
+            # Display timer in top-left
+            cv2.putText(frame, timer_text, (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 0), 2, cv2.LINE_AA)
+
+        detector = loaded
+        if detector is not None and os.getenv("HELMET_MOTION_GATE", "0") == "1":
+            from services.motion import MotionGatedDetector
+            detector = MotionGatedDetector(detector)
+        if detector is not None and int(os.getenv("HELMET_TRACK_INTERVAL", "1")) > 1:
+            from services.tracking import TrackingDetector
+            detector = TrackingDetector(detector)
+        return StreamPipeline(source, detector, on_result=on_result, overlay=overlay)
+
+    def get_broadcaster(source):
+        # One capture + detection producer per source, shared by every viewer
+        from services.broadcast import FrameBroadcaster
+        with broadcasters_lock:
+            if source not in broadcasters:
+                buffer_size = int(os.getenv("HELMET_STREAM_BUFFER", "2"))
+                broadcasters[source] = FrameBroadcaster(lambda: make_demo_pipeline(source), buffer_size=buffer_size)
+            return broadcasters[source]
 
     def generate_demo_stream():
-        cap = cv2.VideoCapture(0)
-        # Reset timer on new stream connection (optional, or keep persistent)
-        timer_state["accumulated_time"] = 0.0
-        timer_state["running"] = False
-        last_time = time.time()
-
+        sub = get_broadcaster(os.getenv("HELMET_DEMO_SOURCE", "0")).subscribe()
         try:
-            while True:
-                ok, frame = cap.read()
-                if not ok:
-                    break
-
-                if detector_ref["detector"] is None:
-                    try:
-                        from services.detection import HelmetDetector
-                        detector_ref["detector"] = HelmetDetector()
-                    except Exception:
-                        detector_ref["detector"] = None
-
-                current_time = time.time()
-                dt = current_time - last_time
-                last_time = current_time
-
-                ok2, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 92])
-                if not ok2:
-                    continue
-                img_bytes = buf.tobytes()
-                boxes = []
-                if detector_ref["detector"] is not None:
-                    try:
-                        result = detector_ref["detector"].detect(img_bytes)
-                        boxes = result.get("boxes", [])
-                    except Exception:
-                        boxes = []
-
-                helmet_count = sum(1 for b in boxes if b.get("is_helmet"))
-                no_helmet_count = sum(1 for b in boxes if not b.get("is_helmet"))
-
-                if helmet_count > 0 and no_helmet_count == 0:
-                    timer_state["running"] = True
-                else:
-                    timer_state["running"] = False
-
-                if timer_state["running"]:
-                    timer_state["accumulated_time"] += dt
-
-                minutes = int(timer_state["accumulated_time"] // 60)
-                seconds = int(timer_state["accumulated_time"] % 60)
-                timer_text = f"Time: {minutes:02}:{seconds:02}"
-                
-                # Display timer in top-left
-                cv2.putText(frame, timer_text, (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 0), 2, cv2.LINE_AA)
-
-                for b in boxes:
-                    x, y, w, h = b["x"], b["y"], b["w"], b["h"]
-                    is_helmet = b.get("is_helmet", False)
-                    conf = int((b.get("confidence", 0.0)) * 100)
-                    color = (34, 197, 94) if is_helmet else (239, 68, 68)
-                    label = b.get("label") or ("Helmet Detected" if is_helmet else "Wear the Helmet")
-                    cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
-                    text = f"{label} {conf}%"
-                    (tw, th), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-                    ly = max(0, y - th - 6)
-                    cv2.rectangle(frame, (x, ly), (x + tw + 10, ly + th + 8), color, -1)
-                    cv2.putText(frame, text, (x + 5, ly + th + 2), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2, cv2.LINE_AA)
-                ok3, jpg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-                if not ok3:
-                    continue
-                yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpg.tobytes() + b"\r\n")
+            for jpg in sub:
+                yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpg + b"\r\n")
         finally:
-            cap.release()
+            sub.close()
 
     @app.get("/api/demo_stream")
     def api_demo_stream():
         return Response(generate_demo_stream(), mimetype="multipart/x-mixed-replace; boundary=frame")
 
+    @app.get("/api/demo_stream/stats")
+    def api_demo_stream_stats():
+        stats = {}
+        with broadcasters_lock:
+            items = list(broadcasters.items())
+        for source, b in items:
+            pipeline = b.pipeline
+            stats[str(source)] = dict(b.stats(), stages=pipeline.stats() if pipeline is not None else None)
+            detector = pipeline.detector if pipeline is not None else None
+            if hasattr(detector, "tracker"):
+                stats[str(source)]["tracking"] = detector.stats()
+                detector = detector.detector
+            if hasattr(detector, "skipped"):
+                stats[str(source)]["motion"] = detector.stats()
+        return jsonify(stats)
+
+    # Cameras watched continuously, with or without viewers: HELMET_CAMERAS="gate1=rtsp://...|5;gate2=1;clips/gate.mp4".
+    # Each has a reader thread, its own timer and "camera:<name>" event channel, and they share the
+    # batched detector through CameraManager, which divides it fairly when it can't keep up.
+    camera_manager = None
+    camera_timers = {}
+    if os.getenv("HELMET_CAMERAS"):
+        from services.cameras import CameraManager, CameraSource, parse_cameras
+        camera_verdicts = {}
+
+        def camera_overlay(camera, frame):
+            import cv2
+            accumulated = camera_timers[camera.name].accumulated_time
+            text = f"{camera.name}  Time: {int(accumulated // 60):02}:{int(accumulated % 60):02}"
+            cv2.putText(frame, text, (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 0), 2, cv2.LINE_AA)
+
+        def on_camera_result(camera, result):
+            channel = "camera:" + camera.name
+            timer = camera_timers[camera.name]
+            if timer.observe(result["helmet"]):
+                publish_timer(channel, timer, "camera")
+            # Like the demo stream, detections are only pushed when the verdict flips
+            if result["helmet"] != camera_verdicts.get(camera.name):
+                camera_verdicts[camera.name] = result["helmet"]
+                event_hub.publish(channel, "detection", {"scope": "camera", "camera": camera.name, "helmet": result["helmet"],
+                                                         "confidence": result["confidence"], "boxes": result.get("boxes", [])})
+
+        cameras = []
+        for name, source, fps in parse_cameras(os.environ["HELMET_CAMERAS"], float(os.getenv("HELMET_CAMERA_FPS", "5"))):
+            cameras.append(CameraSource(name, source, fps, overlay=camera_overlay,
+                                        loop=os.getenv("HELMET_CAMERA_LOOP", "1") == "1",
+                                        stream_fps=float(os.getenv("HELMET_CAMERA_STREAM_FPS", "15")),
+                                        buffer_size=int(os.getenv("HELMET_STREAM_BUFFER", "2"))))
+            # A camera slowed down by the scheduler still counts as continuously watched
+            camera_timers[name] = SessionTimer(max_gap=max(2.0, 3.0 / fps) if fps > 0 else 2.0)
+        camera_manager = CameraManager(cameras, lambda: detector_ref["scheduler"] if ensure_detector() else None,
+                                       on_result=on_camera_result)
+
+    def get_camera(name):
+        return camera_manager.by_name.get(name) if camera_manager is not None else None
+
+    @app.get("/api/cameras")
+    def api_cameras():
+        if camera_manager is None:
+            return jsonify({"cameras": []})
+        return jsonify(camera_manager.stats())
+
+    @app.get("/api/cameras/<name>")
+    def api_camera(name):
+        camera = get_camera(name)
+        if camera is None:
+            return jsonify({"error": "not found"}), 404
+        return jsonify(dict(camera.stats(time.monotonic()), result=camera.result, timer=camera_timers[name].snapshot()))
+
+    @app.get("/api/cameras/<name>/stream")
+    def api_camera_stream(name):
+        camera = get_camera(name)
+        if camera is None:
+            return jsonify({"error": "not found"}), 404
+
+        def generate():
+            sub = camera.subscribe()
+            try:
+                for jpg in sub:
+                    yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpg + b"\r\n")
+            finally:
+                sub.close()
+        return Response(generate(), mimetype="multipart/x-mixed-replace; boundary=frame")
+
+    @app.get("/api/cameras/<name>/events")
+    def api_camera_events(name):
+        if get_camera(name) is None:
+            return jsonify({"error": "not found"}), 404
+        sub = event_hub.subscribe(["camera:" + name])
+        initial = [("timer", dict(camera_timers[name].snapshot(), scope="camera"))]
+        return Response(event_hub.stream(sub, initial), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    def demo_timer():
+        timer = demo_timers.get(os.getenv("HELMET_DEMO_SOURCE", "0"))
+        return timer if timer is not None else SessionTimer()
+
     @app.get("/api/timer_status")
     def api_timer_status():
-        return jsonify(timer_state)
+        # ?camera=<name> is that camera's timer; without a client_id this is the demo stream's timer, as before
+        client_id = request.args.get("client_id")
+        camera = request.args.get("camera")
+        if camera:
+            if camera not in camera_timers:
+                return jsonify({"error": "not found"}), 404
+            return jsonify(camera_timers[camera].snapshot())
+        timer = get_timer(client_id) if client_id else demo_timer()
+        return jsonify(timer.snapshot())
 
     @app.post("/api/timer/control")
     def api_timer_control():
         data = request.get_json(silent=True) or {}
         action = data.get("action")
-        if action == "stop":
-            timer_state["running"] = False
-        elif action == "start":
-            timer_state["running"] = True
-            timer_state["last_request_time"] = time.time()
-        elif action == "reset":
-            timer_state["accumulated_time"] = 0.0
-            timer_state["running"] = False
-        return jsonify(timer_state)
+        client_id = data.get("client_id")
+        camera = data.get("camera")
+        if camera:
+            timer = camera_timers.get(camera)
+            if timer is None:
+                return jsonify({"error": "not found"}), 404
+            timer.control(action)
+            publish_timer("camera:" + camera, timer, "camera")
+        elif client_id:
+            timer = get_timer(client_id)
+            timer.control(action)
+            publish_timer("client:" + client_id, timer, "client")
+        else:
+            timer = demo_timer()
+            timer.control(action)
+            publish_timer("demo", timer, "demo")
+        return jsonify(timer.snapshot())
+
+    @app.get("/api/events")
+    def api_events():
+        # Server-Sent Events: "timer" on transitions, "detection" per result.
+        # EventSource cannot send headers, so like /api/timer_status this is keyed by client_id only.
+        client_id = request.args.get("client_id")
+        if not client_id:
+            return jsonify({"error": "client_id required"}), 400
+        # The demo stream's own timer and detections only on request (?demo=1), so they never mix into a client's
+        channels = ["client:" + client_id] + (["demo"] if request.args.get("demo") == "1" else [])
+        sub = event_hub.subscribe(channels)
+        initial = [("timer", dict(get_timer(client_id).snapshot(), scope="client"))]
+        return Response(event_hub.stream(sub, initial), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
     @app.post("/api/auth/signup")
     def api_auth_signup():
@@ -259,8 +575,8 @@ def create_app():
         if not client_id:
             return jsonify({"error": "client_id required"}), 400
         u = get_or_create_user(client_id)
-        s = Streak.query.filter_by(user_id=u.id).first()
-        return jsonify({"user_id": u.id, "client_id": u.client_id, "streak": s.current_streak, "last_detected_date": str(s.last_detected_date) if s.last_detected_date else None, "total_rewards": s.total_rewards})
+        s = streak_snapshot(u)
+        return jsonify({"user_id": u["user_id"], "client_id": u["client_id"], "streak": s["current_streak"], "last_detected_date": str(s["last_detected_date"]) if s["last_detected_date"] else None, "total_rewards": s["total_rewards"]})
 
     @app.get("/api/streak")
     def api_streak():
@@ -268,77 +584,437 @@ def create_app():
         if not client_id:
             return jsonify({"error": "client_id required"}), 400
         u = get_or_create_user(client_id)
-        s = Streak.query.filter_by(user_id=u.id).first()
-        return jsonify({"streak": s.current_streak, "last_detected_date": str(s.last_detected_date) if s.last_detected_date else None, "total_rewards": s.total_rewards})
+        s = streak_snapshot(u)
+        return jsonify({"streak": s["current_streak"], "last_detected_date": str(s["last_detected_date"]) if s["last_detected_date"] else None, "total_rewards": s["total_rewards"]})
 
     @app.get("/api/history")
     def api_history():
         client_id = request.args.get("client_id")
         if not client_id:
             return jsonify({"error": "client_id required"}), 400
+        granularity = request.args.get("granularity", "raw")
+        if granularity not in ("raw", "hour", "day"):
+            return jsonify({"error": "granularity must be raw, hour or day"}), 400
         u = get_or_create_user(client_id)
         since = datetime.datetime.utcnow() - datetime.timedelta(days=30)
-        logs = DetectionLog.query.filter(DetectionLog.user_id == u.id, DetectionLog.timestamp >= since).order_by(DetectionLog.timestamp.asc()).all()
+
+        if granularity != "raw":
+            start = since.replace(minute=0, second=0, microsecond=0)
+            if granularity == "day":
+                start = start.replace(hour=0)
+            rows = DetectionRollup.query.filter(
+                DetectionRollup.user_id == u["user_id"],
+                DetectionRollup.granularity == granularity,
+                DetectionRollup.bucket_start >= start
+            ).order_by(DetectionRollup.bucket_start.asc()).all()
+            items = [{
+                "timestamp": r.bucket_start.isoformat(),
+                "count": r.count,
+                "helmet_count": r.helmet_count,
+                "helmet_ratio": round(r.helmet_count / r.count, 3) if r.count else 0.0,
+                "mean_confidence": round(r.confidence_sum / r.count, 3) if r.count else 0.0,
+                "max_confidence": round(r.confidence_max, 3)
+            } for r in rows]
+            return jsonify({"granularity": granularity, "items": items})
+
+        # Raw rows: keyset pagination on (timestamp, id); cursor is "<iso timestamp>_<id>"
+        try:
+            limit = max(1, min(int(request.args.get("limit", 500)), 1000))
+        except ValueError:
+            return jsonify({"error": "invalid limit"}), 400
+        q = DetectionLog.query.filter(DetectionLog.user_id == u["user_id"], DetectionLog.timestamp >= since)
+        cursor = request.args.get("cursor")
+        if cursor:
+            try:
+                ts, last_id = cursor.rsplit("_", 1)
+                ts, last_id = datetime.datetime.fromisoformat(ts), int(last_id)
+            except ValueError:
+                return jsonify({"error": "invalid cursor"}), 400
+            q = q.filter(or_(DetectionLog.timestamp > ts, and_(DetectionLog.timestamp == ts, DetectionLog.id > last_id)))
+        logs = q.order_by(DetectionLog.timestamp.asc(), DetectionLog.id.asc()).limit(limit + 1).all()
+        next_cursor = None
+        if len(logs) > limit:
+            logs = logs[:limit]
+            next_cursor = f"{logs[-1].timestamp.isoformat()}_{logs[-1].id}"
         items = [{"timestamp": l.timestamp.isoformat(), "result": l.result, "confidence": l.confidence} for l in logs]
-        return jsonify({"items": items})
+        return jsonify({"granularity": "raw", "items": items, "next_cursor": next_cursor})
 
     @app.post("/api/detect")
     @jwt_required()
     def api_detect():
-        payload = request.get_json(silent=True) or {}
-        data_url = payload.get("image")
-        client_id = payload.get("client_id")
-        if not data_url or not client_id:
-            return jsonify({"error": "image and client_id required"}), 400
-        try:
-            header, b64 = data_url.split(",", 1)
-            img_bytes = base64.b64decode(b64)
-        except Exception:
-            return jsonify({"error": "invalid image"}), 400
-        
-        # detector.detect now returns a dict {helmet, confidence, image}
-        if detector_ref["detector"] is None:
+        with IN_FLIGHT.track_inprogress(endpoint="detect"), REQUEST_SECONDS.time(endpoint="detect"):
+            return handle_detect()
+
+    def handle_detect():
+        if request.mimetype == "application/json":
+            payload = request.get_json(silent=True) or {}
+            data_url = payload.get("image")
+            client_id = payload.get("client_id")
+            if not data_url or not client_id:
+                return jsonify({"error": "image and client_id required"}), 400
             try:
-                from services.detection import HelmetDetector
-                detector_ref["detector"] = HelmetDetector()
-            except Exception as e:
-                return jsonify({"error": "model_unavailable"}), 503
-        result = detector_ref["detector"].detect(img_bytes)
+                header, b64 = data_url.split(",", 1)
+                with STAGE_SECONDS.time(stage="base64_decode"):
+                    img_bytes = base64.b64decode(b64)
+            except Exception:
+                return jsonify({"error": "invalid image"}), 400
+        else:
+            img_bytes, client_id = read_binary_frame()
+            if not img_bytes or not client_id:
+                return jsonify({"error": "image and client_id required"}), 400
+
+        if not ensure_detector():
+            return model_not_ready()
+        from services.batching import QueueFullError
+        try:
+            response = detect_and_record(img_bytes, client_id)
+        except QueueFullError:
+            return jsonify({"error": "busy"}), 503
+        return jsonify(response)
+
+    def model_not_ready():
+        status = model_loader.stats()
+        error = "model_unavailable" if status["state"] == "failed" else "model_loading"
+        retry = status["retry_in_s"] if status["retry_in_s"] is not None else 1
+        return jsonify({"error": error, "model": status}), 503, {"Retry-After": str(max(1, int(retry)))}
+
+    def ensure_detector():
+        # detector -> BatchScheduler (-> ResultCache) (-> MotionGatedDetector), once the background load has finished.
+        # A WorkerPool batches inside each worker, so it stands in for the scheduler.
+        if detector_ref["scheduler"] is not None:
+            return True
+        detector = model_loader.get()
+        if detector is None:
+            return False
+        from services.batching import BatchScheduler
+        with detector_lock:
+            if detector_ref["scheduler"] is None:
+                detector_ref["detector"] = detector
+                scheduler = detector if use_pool else BatchScheduler(detector)
+                front = scheduler
+                if os.getenv("HELMET_RESULT_CACHE", "1") == "1":
+                    from services.result_cache import ResultCache
+                    front = detector_ref["cache"] = ResultCache(scheduler, detector.config_key)
+                if os.getenv("HELMET_MOTION_GATE", "0") == "1":
+                    from services.motion import MotionGatedDetector
+                    detector_ref["motion"] = MotionGatedDetector(front)
+                # Assigned last: it is the lock-free "already built" check above
+                detector_ref["scheduler"] = scheduler
+        return True
+
+    def detect_and_record(img_bytes, client_id):
+        # Shared by /api/detect and the WebSocket channel; raises QueueFullError when overloaded
+        if detector_ref["motion"] is not None:
+            result = detector_ref["motion"].detect(img_bytes, key=client_id)
+        elif detector_ref["cache"] is not None:
+            result = detector_ref["cache"].detect(img_bytes)
+        else:
+            result = detector_ref["scheduler"].detect(img_bytes)
         helmet_on = result["helmet"]
         confidence = result["confidence"]
         
         u = get_or_create_user(client_id)
-        log = DetectionLog(user_id=u.id, result=helmet_on, confidence=confidence)
-        db.session.add(log)
+        streak_info, streak_row = update_streak(u, helmet_on)
+        db_writer.submit({
+            "client_id": client_id,
+            "log": {"user_id": u["user_id"], "timestamp": datetime.datetime.utcnow(), "result": helmet_on, "confidence": confidence},
+            "streak": streak_row
+        })
+
+        # Update this client's timer and push the result to its event stream
+        channel = "client:" + client_id
+        timer = get_timer(client_id)
+        if timer.observe(helmet_on):
+            publish_timer(channel, timer, "client")
+        response = {"helmet": helmet_on, "confidence": confidence, "streak": streak_info["streak"], "reward": streak_info["reward"], "boxes": result.get("boxes", [])}
+        event_hub.publish(channel, "detection", dict(response, scope="client"))
+        return response
+
+    ws_channels = set()
+    ws_lock = threading.Lock()
+
+    def ws_authenticate(token, client_id):
+        # JWT is verified once per connection instead of once per frame; the channel closes itself at "exp"
+        if not token or not client_id:
+            return None
+        try:
+            claims = decode_token(token)
+        except Exception:
+            return None
+        return client_id, claims.get("exp")
+
+    def ws_detect_frame(img_bytes, client_id):
+        with IN_FLIGHT.track_inprogress(endpoint="ws"), REQUEST_SECONDS.time(endpoint="ws"):
+            return detect_and_record(img_bytes, client_id)
+
+    if Sock is not None:
+        sock = Sock(app)
+
+        @sock.route("/api/ws/detect")
+        def ws_detect(ws):
+            from services.ws_channel import DetectionChannel
+            if not ensure_detector():
+                error = "model_unavailable" if model_loader.stats()["state"] == "failed" else "model_loading"
+                ws.send('{"type": "error", "error": "%s"}' % error)
+                return
+            channel = DetectionChannel(ws, ws_authenticate, ws_detect_frame)
+            with ws_lock:
+                ws_channels.add(channel)
+            try:
+                channel.run()
+            finally:
+                with ws_lock:
+                    ws_channels.discard(channel)
+
+    # Video jobs: uploads are processed by job_runner on HELMET_JOB_WORKERS threads, sampling
+    # HELMET_JOB_SAMPLE_FPS frames per second of video and yielding to live requests between batches.
+    job_dir = os.getenv("HELMET_JOB_DIR") or os.path.join(app.instance_path, "jobs")
+    os.makedirs(job_dir, exist_ok=True)
+    job_max_bytes = int(float(os.getenv("HELMET_JOB_MAX_MB", "2048")) * 1024 * 1024)
+    # Also bounds multipart parsing, which spools the upload before the route sees it (+1 MB for form overhead)
+    app.config["MAX_CONTENT_LENGTH"] = job_max_bytes + (1 << 20)
+
+    def job_to_dict(job):
+        return {
+            "id": job.id,
+            "filename": job.filename,
+            "status": job.status,
+            "progress": 1.0 if job.status == "done" else round(min(1.0, job.next_frame / job.total_frames), 4) if job.total_frames else None,
+            "processed_s": round(job.next_frame / job.fps, 1) if job.fps else None,
+            "duration_s": round(job.total_frames / job.fps, 1) if job.fps and job.total_frames else None,
+            "frames_done": job.frames_done,
+            "error": job.error,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None
+        }
+
+    def live_busy():
+        return IN_FLIGHT.get(endpoint="detect") + IN_FLIGHT.get(endpoint="ws") > 0
+
+    def finish_job(job, status, error=None):
+        job.status = status
+        job.error = error
+        job.finished_at = datetime.datetime.utcnow()
         db.session.commit()
+        event_hub.publish("job:" + job.id, "done", job_to_dict(job))
+        if os.getenv("HELMET_JOB_KEEP_UPLOADS", "0") != "1" and os.path.exists(job.path):
+            os.remove(job.path)
+
+    def run_video_job(job_id, cancelled):
+        from services.jobs import summarize_video
+        with app.app_context():
+            job = db.session.get(VideoJob, job_id)
+            if job is None or job.status not in ("queued", "running"):
+                return
+            job.status = "running"
+            job.started_at = job.started_at or datetime.datetime.utcnow()
+            db.session.commit()
+
+            # Frames go through the shared scheduler (or worker pool) like live requests,
+            # so the job never calls into the detector alongside it
+            while not ensure_detector() and not cancelled.is_set():
+                model_loader.get(wait=5.0)
+            if cancelled.is_set():
+                finish_job(job, "canceled")
+                return
+
+            channel = "job:" + job_id
+            checkpoint_s = float(os.getenv("HELMET_JOB_CHECKPOINT_S", "2"))
+            rows, next_frame, last_commit = [], job.next_frame, time.monotonic()
+            try:
+                for completed, next_frame in summarize_video(
+                    job.path, detector_ref["scheduler"].detect_array_batch, job.fps, job.stride, job.next_frame,
+                    batch=int(os.getenv("HELMET_BATCH_SIZE", "8")), live_busy=live_busy, cancelled=cancelled
+                ):
+                    rows += completed
+                    if next_frame is not None and time.monotonic() - last_commit < checkpoint_s:
+                        continue
+                    # Seconds and the resume point land in one transaction, so a restart neither skips nor repeats frames
+                    db.session.bulk_insert_mappings(VideoJobSecond, [dict(r, job_id=job_id) for r in rows])
+                    job.frames_done += sum(r["frames"] for r in rows)
+                    # total_frames is 0 when the container didn't say; the last resume point stands then
+                    job.next_frame = next_frame if next_frame is not None else (job.total_frames or job.next_frame)
+                    db.session.commit()
+                    rows, last_commit = [], time.monotonic()
+                    event_hub.publish(channel, "progress", job_to_dict(job))
+            except Exception as e:
+                db.session.rollback()
+                finish_job(job, "failed", str(e)[:500])
+                raise
+            finish_job(job, "canceled" if cancelled.is_set() else "done")
 
-        # Update timer state
-        current_time = time.time()
-        if helmet_on:
-            if timer_state["running"]:
-                # Calculate delta, but limit it to avoid huge jumps if connection lost
-                dt = current_time - timer_state["last_request_time"]
-                # Assume max 2 seconds gap for continuous detection
-                if 0 < dt < 2.0:
-                    timer_state["accumulated_time"] += dt
-            else:
-                timer_state["running"] = True
-            timer_state["last_request_time"] = current_time
+    job_runner = JobRunner(run_video_job)
+
+    def get_own_job(job_id):
+        job = db.session.get(VideoJob, job_id)
+        if job is None or str(job.owner_id) != get_jwt_identity():
+            return None
+        return job
+
+    @app.post("/api/jobs")
+    @jwt_required()
+    def api_jobs_create():
+        # multipart "video" part, or the raw video as the request body with ?filename=
+        from services.video import probe_video
+        if request.content_length and request.content_length > job_max_bytes:
+            return jsonify({"error": "video too large"}), 413
+        job_id = uuid.uuid4().hex
+        try:
+            upload = request.files.get("video") if request.mimetype == "multipart/form-data" else None
+        except RequestEntityTooLarge:
+            return jsonify({"error": "video too large"}), 413
+        filename = secure_filename((upload.filename if upload else request.args.get("filename")) or "video.mp4") or "video.mp4"
+        path = os.path.join(job_dir, job_id + os.path.splitext(filename)[1].lower())
+        if upload is not None:
+            upload.save(path)
         else:
-            timer_state["running"] = False
+            # A chunked body has no Content-Length to check up front, so count as it arrives
+            received = 0
+            try:
+                with open(path, "wb") as f:
+                    while True:
+                        chunk = request.stream.read(1 << 20)
+                        if not chunk:
+                            break
+                        received += len(chunk)
+                        if received > job_max_bytes:
+                            raise RequestEntityTooLarge()
+                        f.write(chunk)
+            except RequestEntityTooLarge:
+                os.remove(path)
+                return jsonify({"error": "video too large"}), 413
+        info = probe_video(path)
+        if info is None:
+            os.remove(path)
+            return jsonify({"error": "unreadable video"}), 400
+
+        sample_fps = float(os.getenv("HELMET_JOB_SAMPLE_FPS", "2"))
+        stride = max(1, int(round((info["fps"] or 25.0) / sample_fps)))
+        job = VideoJob(id=job_id, owner_id=int(get_jwt_identity()), filename=filename, path=path, status="queued",
+                       fps=info["fps"], total_frames=info["frames"] or 0, stride=stride)
+        db.session.add(job)
+        db.session.commit()
+        try:
+            job_runner.submit(job_id)
+        except JobQueueFullError:
+            db.session.delete(job)
+            db.session.commit()
+            os.remove(path)
+            return jsonify({"error": "too many pending jobs"}), 429, {"Retry-After": "30"}
+        return jsonify(job_to_dict(job)), 202, {"Location": f"/api/jobs/{job_id}"}
+
+    @app.get("/api/jobs")
+    @jwt_required()
+    def api_jobs_list():
+        jobs = VideoJob.query.filter_by(owner_id=int(get_jwt_identity())).order_by(VideoJob.created_at.desc()).limit(50).all()
+        return jsonify({"items": [job_to_dict(j) for j in jobs]})
+
+    @app.get("/api/jobs/<job_id>")
+    @jwt_required()
+    def api_jobs_get(job_id):
+        job = get_own_job(job_id)
+        if job is None:
+            return jsonify({"error": "not found"}), 404
+        return jsonify(job_to_dict(job))
 
-        streak_info = update_streak(u.id, helmet_on)
-        return jsonify({"helmet": helmet_on, "confidence": confidence, "streak": streak_info["streak"], "reward": streak_info["reward"], "boxes": result.get("boxes", [])})
+    @app.get("/api/jobs/<job_id>/summary")
+    @jwt_required()
+    def api_jobs_summary(job_id):
+        # Per-second verdicts plus merged violation spans; partial while the job is running
+        job = get_own_job(job_id)
+        if job is None:
+            return jsonify({"error": "not found"}), 404
+        rows = VideoJobSecond.query.filter_by(job_id=job_id).order_by(VideoJobSecond.second.asc()).all()
+        seconds = [{
+            "second": r.second,
+            "frames": r.frames,
+            "helmet_frames": r.helmet_frames,
+            "violation_frames": r.violation_frames,
+            "max_violation_confidence": round(r.max_violation_confidence, 3),
+            "verdict": "violation" if r.violation_frames else "helmet" if r.helmet_frames else "none"
+        } for r in rows]
+        return jsonify({"job": job_to_dict(job), "seconds": seconds, "violations": violation_spans(seconds)})
+
+    @app.delete("/api/jobs/<job_id>")
+    @jwt_required()
+    def api_jobs_cancel(job_id):
+        job = get_own_job(job_id)
+        if job is None:
+            return jsonify({"error": "not found"}), 404
+        if job.status not in ("queued", "running"):
+            return jsonify({"error": "job already " + job.status}), 409
+        if not job_runner.cancel(job_id):
+            finish_job(job, "canceled")
+        return jsonify({"id": job_id, "status": "canceling"}), 202
+
+    @app.get("/api/jobs/<job_id>/events")
+    def api_jobs_events(job_id):
+        # SSE "progress" and "done" events. EventSource cannot send headers; the random job id is the credential.
+        job = db.session.get(VideoJob, job_id)
+        if job is None:
+            return jsonify({"error": "not found"}), 404
+        sub = event_hub.subscribe(["job:" + job_id])
+        initial = [("done" if job.status not in ("queued", "running") else "progress", job_to_dict(job))]
+        return Response(event_hub.stream(sub, initial), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    @app.get("/api/detect/stats")
+    def api_detect_stats():
+        stats = {}
+        if detector_ref["scheduler"] is not None:
+            stats["workers" if use_pool else "batching"] = detector_ref["scheduler"].stats()
+        if detector_ref["detector"] is not None:
+            stats["passes"] = detector_ref["detector"].pass_stats()
+        if detector_ref["cache"] is not None:
+            stats["result_cache"] = detector_ref["cache"].stats()
+        if detector_ref["motion"] is not None:
+            stats["motion"] = detector_ref["motion"].stats()
+        stats["model"] = model_loader.stats()
+        stats["db"] = db_writer.stats()
+        stats["user_cache"] = user_cache.stats()
+        stats["events"] = event_hub.stats()
+        stats["jobs"] = job_runner.stats()
+        with ws_lock:
+            stats["websocket"] = [c.stats() for c in ws_channels]
+        return jsonify(stats)
+
+    @app.get("/metrics")
+    def metrics():
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
 
     @app.get("/api/health")
     def api_health():
         return jsonify({"status": "ok"})
 
+    @app.get("/api/ready")
+    def api_ready():
+        # Liveness is /api/health; this only turns 200 once the model is loaded and warmed up
+        status = model_loader.stats()
+        return jsonify(status), (200 if status["ready"] else 503)
+
+    if background:
+        # Jobs interrupted by a restart continue from their last checkpoint
+        with app.app_context():
+            for job in VideoJob.query.filter(VideoJob.status.in_(("queued", "running"))).order_by(VideoJob.created_at.asc()):
+                job_runner.submit(job.id, force=True)
+
+        if os.getenv("HELMET_EAGER_LOAD", "1") == "1":
+            model_loader.start()
+
+        if camera_manager is not None:
+            camera_manager.start()
+            atexit.register(camera_manager.stop)
+
     # from stream import stream_bp
     # app.register_blueprint(stream_bp)
     return app
 
-app = create_app()
+# Spawned inference workers import this file as __mp_main__; they must not build an app of their own.
+# `python app.py` runs under the werkzeug reloader, which re-runs this file in a child (WERKZEUG_RUN_MAIN=true)
+# that serves requests. The parent only watches for changes, so it must not also resume jobs, load the model or open cameras.
+if __name__ != "__mp_main__":
+    app = create_app(background=__name__ != "__main__" or os.environ.get("WERKZEUG_RUN_MAIN") == "true")
 
 
 if __name__ == "__main__":
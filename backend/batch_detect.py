@@ -0,0 +1,266 @@
+import os
+import csv
+import sys
+import glob
+import json
+import time
+import queue
+import hashlib
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future
+import cv2
+from services.video import iter_video
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+VIDEO_EXTS = (".mp4", ".avi", ".mov", ".mkv", ".m4v", ".webm")
+CSV_FIELDS = ("source", "frame", "time_s", "helmet", "confidence", "boxes", "helmet_boxes", "no_helmet_boxes", "error")
+
+
+def walk_files(root):
+    """Every image/video under root, in a stable (sorted) order, listing one directory at a time."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(IMAGE_EXTS + VIDEO_EXTS):
+                yield os.path.join(dirpath, name)
+
+
+def iter_units(inputs):
+    """Directories, globs and files -> file paths. Each path is one unit: an image, or a whole video."""
+    for spec in inputs:
+        if os.path.isdir(spec):
+            yield from walk_files(spec)
+        elif glob.has_magic(spec):
+            for path in sorted(glob.glob(spec, recursive=True)):
+                if os.path.isdir(path):
+                    yield from walk_files(path)
+                elif path.lower().endswith(IMAGE_EXTS + VIDEO_EXTS):
+                    yield path
+        else:
+            yield spec
+
+
+def iter_frames(inputs, stride, cursor):
+    """(unit, path, frame, seconds, image) for everything at or after the checkpoint cursor."""
+    for unit, path in enumerate(iter_units(inputs)):
+        if unit < cursor["unit"]:
+            continue
+        start = cursor["frame"] if unit == cursor["unit"] else 0
+        if unit == cursor["unit"] and cursor.get("path") not in (None, path):
+            raise SystemExit(f"[ERROR] Checkpoint expected {cursor['path']} as input #{unit}, found {path}; inputs changed since the last run")
+        if path.lower().endswith(VIDEO_EXTS):
+            yield from ((unit, path, i, t, image) for i, t, image in iter_video(path, stride, start))
+        elif start == 0:
+            yield unit, path, 0, None, cv2.imread(path)
+
+
+class Prefetcher:
+    """Runs a generator on a background thread into a bounded queue, so decoding overlaps inference without buffering the input."""
+
+    _END = object()
+
+    def __init__(self, iterable, depth):
+        self._queue = queue.Queue(maxsize=depth)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=(iterable,), name="prefetch", daemon=True)
+        self._thread.start()
+
+    def _run(self, iterable):
+        try:
+            for item in iterable:
+                self._queue.put(item)
+        except BaseException as e:
+            self._error = e
+        self._queue.put(self._END)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is self._END:
+                if self._error is not None:
+                    raise self._error
+                return
+            yield item
+
+
+def batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def submit(detector, images):
+    """Futures for a batch: queued on the worker pool, or computed right away by an in-process detector."""
+    if hasattr(detector, "submit_array"):
+        return [detector.submit_array(image) for image in images]
+    futures = []
+    for result in detector.detect_array_batch(images):
+        f = Future()
+        f.set_result(result)
+        futures.append(f)
+    return futures
+
+
+class ResultWriter:
+    """Appends one row per frame as JSONL or CSV and knows how many bytes are safely on disk."""
+
+    def __init__(self, path, fmt, offset):
+        self.fmt = fmt
+        self.file = open(path, "a+", newline="")
+        # Rows written after the last checkpoint are rewritten on resume, so drop them
+        self.file.truncate(offset)
+        self.file.seek(offset)
+        self.csv = csv.DictWriter(self.file, CSV_FIELDS) if fmt == "csv" else None
+        if self.csv is not None and offset == 0:
+            self.csv.writeheader()
+
+    def write(self, path, frame, seconds, result, error=None):
+        boxes = result.get("boxes", []) if result else []
+        row = {
+            "source": path,
+            "frame": frame,
+            "time_s": seconds,
+            "helmet": result["helmet"] if result else None,
+            "confidence": result["confidence"] if result else None,
+            "boxes": len(boxes),
+            "helmet_boxes": sum(1 for b in boxes if b["is_helmet"]),
+            "no_helmet_boxes": sum(1 for b in boxes if not b["is_helmet"]),
+            "error": error
+        }
+        if self.csv is not None:
+            self.csv.writerow(row)
+        else:
+            row["boxes"] = [{k: b[k] for k in ("x", "y", "w", "h", "label", "confidence")} for b in boxes]
+            self.file.write(json.dumps(row) + "\n")
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def load_checkpoint(path, fingerprint, resume):
+    fresh = {"fingerprint": fingerprint, "unit": 0, "path": None, "frame": 0, "output_bytes": 0, "frames": 0, "done": False}
+    if not resume or not os.path.exists(path):
+        return fresh
+    with open(path) as f:
+        ckpt = json.load(f)
+    if ckpt.get("fingerprint") != fingerprint:
+        raise SystemExit(f"[ERROR] {path} was written for other inputs/options; remove it or drop --resume")
+    return ckpt
+
+
+def save_checkpoint(path, ckpt):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(ckpt, f)
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the helmet detector over image folders, globs and video files, writing JSONL/CSV rows")
+    parser.add_argument("inputs", nargs="+", help="directories, glob patterns, image or video files")
+    parser.add_argument("--output", required=True, help="results file; .csv writes CSV, anything else JSONL")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="override the format picked from --output")
+    parser.add_argument("--stride", type=int, default=1, help="video: run every Nth frame")
+    parser.add_argument("--batch", type=int, default=int(os.getenv("HELMET_BATCH_SIZE", "8")))
+    parser.add_argument("--workers", type=int, default=0, help="inference worker processes (0 = in this process)")
+    parser.add_argument("--threads", type=int, default=0, help="intra-op threads per worker (0 = cores / workers)")
+    parser.add_argument("--prefetch", type=int, default=0, help="decoded frames buffered ahead of inference (default 2 batches)")
+    parser.add_argument("--checkpoint-every", type=int, default=20, help="batches between checkpoints")
+    parser.add_argument("--resume", action="store_true", help="continue from <output>.ckpt.json")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.output.lower().endswith(".csv") else "jsonl")
+    ckpt_path = args.output + ".ckpt.json"
+    fingerprint = hashlib.blake2b(json.dumps([args.inputs, args.stride, fmt]).encode(), digest_size=8).hexdigest()
+    ckpt = load_checkpoint(ckpt_path, fingerprint, args.resume)
+    if ckpt["done"]:
+        print(f"[INFO] {args.output} is already complete ({ckpt['frames']} frames)")
+        return
+    if ckpt["frames"]:
+        print(f"[INFO] Resuming at input #{ckpt['unit']} ({ckpt['path']}) frame {ckpt['frame']}, {ckpt['frames']} frames already written")
+
+    if args.workers > 0:
+        from services.workers import WorkerPool
+        detector = WorkerPool(workers=args.workers, threads=args.threads or None, max_batch=args.batch)
+    else:
+        from ai.backends import load_backend
+        from services.detection import HelmetDetector
+        detector = HelmetDetector(backend=load_backend(threads=args.threads or None))
+
+    writer = ResultWriter(args.output, fmt, ckpt["output_bytes"])
+    frames = Prefetcher(iter_frames(args.inputs, max(1, args.stride), ckpt), args.prefetch or 2 * args.batch)
+    # Batches submitted but not yet written; results go out in input order
+    in_flight = deque()
+    max_in_flight = max(1, args.workers) * 2
+    started = time.perf_counter()
+    last_report = started
+    written = 0
+    # Frames written by this run only; after --resume ckpt["frames"] also counts the earlier runs
+    run_frames = 0
+    since_checkpoint = 0
+
+    def drain(limit):
+        nonlocal written, run_frames, since_checkpoint, last_report
+        while len(in_flight) > limit:
+            items, futures = in_flight.popleft()
+            for (unit, path, frame, seconds), future in zip(items, futures):
+                if future is None:
+                    writer.write(path, frame, seconds, None, error="unreadable")
+                else:
+                    try:
+                        writer.write(path, frame, seconds, future.result())
+                    except Exception as e:
+                        writer.write(path, frame, seconds, None, error=str(e))
+                ckpt.update(unit=unit, path=path, frame=frame + 1)
+            written += len(items)
+            run_frames += len(items)
+            since_checkpoint += 1
+            if since_checkpoint >= args.checkpoint_every:
+                ckpt.update(output_bytes=writer.sync(), frames=ckpt["frames"] + written)
+                written = 0
+                since_checkpoint = 0
+                save_checkpoint(ckpt_path, ckpt)
+            now = time.perf_counter()
+            if now - last_report >= 10:
+                last_report = now
+                total = ckpt["frames"] + written
+                print(f"[INFO] {total} frames, {path} frame {frame}, {run_frames / (now - started):.1f} frames/s")
+
+    try:
+        for batch in batches(frames, args.batch):
+            # Make room first: a pool has frame slots for exactly max_in_flight batches
+            drain(max_in_flight - 1)
+            readable = [item[4] for item in batch if item[4] is not None]
+            submitted = iter(submit(detector, readable) if readable else [])
+            futures = [next(submitted) if item[4] is not None else None for item in batch]
+            # Drop the frames themselves; only their positions wait in the in-flight queue
+            in_flight.append(([item[:4] for item in batch], futures))
+        drain(0)
+        ckpt.update(output_bytes=writer.sync(), frames=ckpt["frames"] + written, done=True)
+        save_checkpoint(ckpt_path, ckpt)
+    finally:
+        writer.close()
+        if hasattr(detector, "close"):
+            detector.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"[INFO] Wrote {ckpt['frames']} frames to {args.output} in {elapsed:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
+
+# python batch_detect.py datasets/helmet/test/images --output audit.jsonl
+# python batch_detect.py "footage/**/*.mp4" --stride 15 --workers 4 --threads 1 --output audit.csv --resume
@@ -0,0 +1,99 @@
+import os
+import glob
+import json
+import time
+import uuid
+import argparse
+import threading
+import urllib.request
+import urllib.error
+
+DATASET_DIR = os.path.join(os.path.dirname(__file__), "datasets", "helmet", "test", "images")
+
+
+def post_json(url, payload, token=None):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = "Bearer " + token
+    req = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"), headers=headers, method="POST")
+    with urllib.request.urlopen(req, timeout=30) as resp:
+        return json.loads(resp.read())
+
+
+def get_token(base):
+    email = f"load-{uuid.uuid4().hex[:8]}@example.com"
+    post_json(base + "/api/auth/signup", {"email": email, "password": "loadtest"})
+    return post_json(base + "/api/auth/login", {"email": email, "password": "loadtest"})["token"]
+
+
+def client(base, token, frame, deadline, latencies, errors, lock):
+    client_id = "load_" + uuid.uuid4().hex[:12]
+    url = base + "/api/detect?client_id=" + client_id
+    headers = {"Content-Type": "image/jpeg", "Authorization": "Bearer " + token}
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            req = urllib.request.Request(url, data=frame, headers=headers, method="POST")
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                resp.read()
+            ok = True
+        except (urllib.error.URLError, OSError):
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors.append(elapsed)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent /api/detect load test against a running server")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--image", help="JPEG to send (default: first bundled test image)")
+    args = parser.parse_args()
+
+    path = args.image or sorted(glob.glob(os.path.join(DATASET_DIR, "*.jpg")))[0]
+    with open(path, "rb") as f:
+        frame = f.read()
+    token = get_token(args.url)
+
+    latencies, errors, lock = [], [], threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+    threads = [
+        threading.Thread(target=client, args=(args.url, token, frame, deadline, latencies, errors, lock))
+        for _ in range(args.clients)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps({
+        "clients": args.clients,
+        "seconds": round(elapsed, 2),
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000.0, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000.0, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000.0, 1)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
+
+# Before: HELMET_DB_WRITE_BEHIND=0 python app.py   After: python app.py
+# python bench_detect_load.py --clients 50 --seconds 30
@@ -0,0 +1,237 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import platform
+import cv2
+import numpy as np
+from ai.backends import load_backend
+from ai.metrics import MapAccumulator, label_path_for, load_labels
+from services.detection import HelmetDetector
+
+try:
+    import resource
+except ImportError:
+    # Windows: no getrusage, peak RSS is reported as null
+    resource = None
+
+DATASET_DIR = os.path.join(os.path.dirname(__file__), "datasets", "helmet")
+
+# Higher is worse for latency keys, lower is worse for accuracy/throughput keys
+LATENCY_TOLERANCE = 0.10
+ACCURACY_TOLERANCE = 0.005
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def summary(self):
+        out = {}
+        for stage, values in sorted(self.samples.items()):
+            ms = np.asarray(values) * 1000.0
+            out[stage] = {
+                "count": len(ms),
+                "mean_ms": round(float(ms.mean()), 3),
+                "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                "p95_ms": round(float(np.percentile(ms, 95)), 3),
+                "p99_ms": round(float(np.percentile(ms, 99)), 3)
+            }
+        return out
+
+
+class TimedBackend:
+    """Records each predict() call as infer_pass_<n>, n counting from 1 per frame batch."""
+
+    def __init__(self, backend, timer):
+        self.backend = backend
+        self.timer = timer
+        self.name = backend.name
+        self.names = backend.names
+        self.calls = 0
+
+    def predict(self, images, conf, iou, imgsz):
+        self.calls += 1
+        started = time.perf_counter()
+        out = self.backend.predict(images, conf=conf, iou=iou, imgsz=imgsz)
+        elapsed = time.perf_counter() - started
+        self.timer.add(f"infer_pass_{self.calls}", elapsed)
+        return out
+
+
+class TimedCascade:
+    def __init__(self, cascade, timer):
+        self.cascade = cascade
+        self.timer = timer
+        self.elapsed = 0.0
+
+    def detectMultiScale(self, *args, **kwargs):
+        started = time.perf_counter()
+        faces = self.cascade.detectMultiScale(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        self.elapsed += elapsed
+        self.timer.add("haar_fallback", elapsed)
+        return faces
+
+
+def list_images(splits, limit):
+    paths = []
+    for split in splits:
+        paths += sorted(glob.glob(os.path.join(DATASET_DIR, split, "images", "*.jpg")))
+    return paths[:limit] if limit else paths
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+def run_stages(detector, paths):
+    """Per-image pass that mirrors HelmetDetector.detect, timing each stage, plus accuracy vs labels."""
+    timer = StageTimer()
+    backend = TimedBackend(detector.backend, timer)
+    detector.backend = backend
+    detector.face_model = TimedCascade(detector.face_model, timer)
+    acc = MapAccumulator(dict(backend.names))
+
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        started = time.perf_counter()
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        timer.add("decode", time.perf_counter() - started)
+        if image is None:
+            continue
+
+        started = time.perf_counter()
+        proc, scale = detector.preprocess(image)
+        timer.add("preprocess_clahe", time.perf_counter() - started)
+
+        backend.calls = 0
+        infer_before = sum(sum(v) for k, v in timer.samples.items() if k.startswith("infer_pass_"))
+        started = time.perf_counter()
+        result, passes = detector.infer_batch([proc])[0]
+        infer_total = time.perf_counter() - started
+        infer_spent = sum(sum(v) for k, v in timer.samples.items() if k.startswith("infer_pass_")) - infer_before
+
+        detector.face_model.elapsed = 0.0
+        started = time.perf_counter()
+        detector._summarize(image, result, passes, scale)
+        summarize_total = time.perf_counter() - started
+        # Tier selection inside infer_batch plus box/label/safety aggregation, excluding the Haar fallback
+        timer.add("postprocess", (infer_total - infer_spent) + (summarize_total - detector.face_model.elapsed))
+
+        if scale != 1.0:
+            result.xyxy /= scale
+        gt_cls, gt_xyxy = load_labels(label_path_for(path), image.shape[1], image.shape[0])
+        acc.add(result, gt_cls, gt_xyxy)
+
+    detector.backend = backend.backend
+    detector.face_model = detector.face_model.cascade
+    return timer.summary(), acc.result(), dict(detector.pass_counts)
+
+
+def run_throughput(args, paths, batch_sizes, thread_counts):
+    images = [cv2.imread(p) for p in paths]
+    images = [im for im in images if im is not None]
+    rows = []
+    for threads in thread_counts:
+        detector = HelmetDetector(backend=load_backend(args.backend, threads=threads))
+        detector.detect_array_batch(images[:1])  # warm-up
+        for batch in batch_sizes:
+            started = time.perf_counter()
+            for i in range(0, len(images), batch):
+                detector.detect_array_batch(images[i:i + batch])
+            elapsed = time.perf_counter() - started
+            rows.append({"threads": threads, "batch": batch, "images": len(images), "images_per_sec": round(len(images) / elapsed, 2)})
+    return rows
+
+
+def compare(current, baseline):
+    """List of human-readable regressions of current against a baseline report."""
+    regressions = []
+    for stage, stats in current["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if base and base["p50_ms"] > 0 and stats["p50_ms"] > base["p50_ms"] * (1 + LATENCY_TOLERANCE):
+            regressions.append(f"{stage} p50 {base['p50_ms']} -> {stats['p50_ms']} ms")
+    base_tp = {(r["threads"], r["batch"]): r["images_per_sec"] for r in baseline.get("throughput", [])}
+    for row in current["throughput"]:
+        base = base_tp.get((row["threads"], row["batch"]))
+        if base and row["images_per_sec"] < base * (1 - LATENCY_TOLERANCE):
+            regressions.append(f"throughput threads={row['threads']} batch={row['batch']} {base} -> {row['images_per_sec']} img/s")
+    for key in ("map50", "precision", "recall"):
+        base = baseline.get("accuracy", {}).get(key)
+        if base is not None and current["accuracy"][key] < base - ACCURACY_TOLERANCE:
+            regressions.append(f"{key} {base} -> {current['accuracy'][key]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline latency/throughput/accuracy benchmark of HelmetDetector over the bundled dataset")
+    parser.add_argument("--splits", default="valid,test")
+    parser.add_argument("--limit", type=int, default=0, help="max images (0 = all)")
+    parser.add_argument("--backend", default=None, help="HELMET_BACKEND override")
+    parser.add_argument("--batch-sizes", default="1,4,8")
+    parser.add_argument("--threads", default="1,2,4", help="inference thread counts for the throughput sweep")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON report; exit 1 on regression")
+    args = parser.parse_args()
+
+    paths = list_images(args.splits.split(","), args.limit)
+    detector = HelmetDetector(backend=load_backend(args.backend))
+    detector.detect_array(cv2.imread(paths[0]))  # warm-up outside the measurements
+    detector.pass_counts = {}
+
+    stages, accuracy, passes = run_stages(detector, paths)
+    throughput = run_throughput(args, paths, [int(b) for b in args.batch_sizes.split(",")], [int(t) for t in args.threads.split(",")])
+
+    report = {
+        "meta": {
+            "backend": detector.backend.name,
+            "infer_mode": detector.infer_mode,
+            "clahe_resized": detector.clahe_resized,
+            "splits": args.splits,
+            "images": len(paths),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "stages": stages,
+        "passes": passes,
+        "throughput": throughput,
+        "accuracy": accuracy,
+        "peak_rss_mb": peak_rss_mb()
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        # The detector logs to stdout too, so the file is the machine-readable copy
+        with open(args.output, "w") as f:
+            f.write(text)
+        print(f"[INFO] Wrote {args.output}")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline)
+        for r in regressions:
+            print(f"[REGRESSION] {r}", file=sys.stderr)
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
+
+# python bench_model.py --output before.json
+# python bench_model.py --output after.json --compare before.json
@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+from ai.yolo import YoloHelmetDetector
+
+
+def legacy_postprocess_v5(det, out, r, pad, orig_shape):
+    # Row-by-row decode that YoloHelmetDetector used before vectorization
+    if out.ndim == 3 and out.shape[0] == 1:
+        out = np.squeeze(out, axis=0)
+    boxes = []
+    if out.ndim == 2 and out.shape[1] >= 6:
+        for i in range(out.shape[0]):
+            cx, cy, w, h = out[i, 0:4]
+            obj = out[i, 4]
+            cls_scores = out[i, 5:]
+            cls_id = int(np.argmax(cls_scores))
+            conf = float(obj * cls_scores[cls_id])
+            if conf < det.score_th:
+                continue
+            x1 = max(0, min(orig_shape[1] - 1, ((cx - w / 2) - pad[0]) / r))
+            y1 = max(0, min(orig_shape[0] - 1, ((cy - h / 2) - pad[1]) / r))
+            x2 = max(0, min(orig_shape[1] - 1, ((cx + w / 2) - pad[0]) / r))
+            y2 = max(0, min(orig_shape[0] - 1, ((cy + h / 2) - pad[1]) / r))
+            boxes.append((int(x1), int(y1), int(x2 - x1), int(y2 - y1), cls_id, conf))
+    if not boxes:
+        return []
+    idxs = cv2.dnn.NMSBoxes([list(b[0:4]) for b in boxes], [b[5] for b in boxes], det.score_th, det.nms_th)
+    return [boxes[i] for i in np.asarray(idxs).reshape(-1)]
+
+
+def synthetic_v5_output(num_anchors=25200, nc=2, positives=40, seed=0):
+    rng = np.random.default_rng(seed)
+    out = np.zeros((num_anchors, 5 + nc), dtype=np.float32)
+    out[:, 0:2] = rng.uniform(0, 640, size=(num_anchors, 2))
+    out[:, 2:4] = rng.uniform(8, 160, size=(num_anchors, 2))
+    # Mostly background anchors with a handful of confident ones, like a real frame
+    out[:, 4] = rng.beta(0.3, 20, size=num_anchors)
+    out[:, 5:] = rng.uniform(0, 1, size=(num_anchors, nc))
+    hot = rng.choice(num_anchors, size=positives, replace=False)
+    out[hot, 4] = rng.uniform(0.5, 0.95, size=positives)
+    return out[None]
+
+
+def time_it(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare legacy and vectorized YOLO postprocessing")
+    parser.add_argument("--tensor", help="recorded net.forward() output saved with np.save (YOLOv5 layout)")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.tensor:
+        if not os.path.exists(args.tensor):
+            print(f"Tensor not found: {args.tensor}")
+            sys.exit(1)
+        out = np.load(args.tensor)
+    else:
+        out = synthetic_v5_output()
+
+    det = YoloHelmetDetector()
+    orig_shape = (720, 1280, 3)
+    r = min(det.input_size / orig_shape[0], det.input_size / orig_shape[1])
+    pad = ((det.input_size - int(round(orig_shape[1] * r))) // 2, (det.input_size - int(round(orig_shape[0] * r))) // 2)
+
+    legacy_ms = time_it(lambda: legacy_postprocess_v5(det, out, r, pad, orig_shape), args.repeat)
+    vector_ms = time_it(lambda: det._postprocess(out, r, pad, orig_shape), args.repeat)
+    print(f"Output tensor: {out.shape}")
+    print(f"Legacy loop:   {legacy_ms:8.3f} ms/frame ({len(legacy_postprocess_v5(det, out, r, pad, orig_shape))} boxes)")
+    print(f"Vectorized:    {vector_ms:8.3f} ms/frame ({len(det._postprocess(out, r, pad, orig_shape))} boxes)")
+    print(f"Speedup:       {legacy_ms / max(vector_ms, 1e-9):8.1f}x")
+
+    v8 = np.ascontiguousarray(np.concatenate([out[0, :, :4], out[0, :, 5:] * out[0, :, 4:5]], axis=1).T[None])
+    v8_ms = time_it(lambda: det._postprocess(v8, r, pad, orig_shape), args.repeat)
+    print(f"Vectorized v8: {v8_ms:8.3f} ms/frame ({len(det._postprocess(v8, r, pad, orig_shape))} boxes, {v8.shape})")
+
+
+if __name__ == "__main__":
+    main()
+
+# python bench_postprocess.py --tensor recorded_output.npy
@@ -0,0 +1,76 @@
+import time
+import argparse
+import tracemalloc
+import cv2
+import numpy as np
+from ai.preprocess import PreprocessStage
+
+
+def legacy_clahe(image):
+    # HelmetDetector.preprocess before buffers were reused
+    lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
+    l, a, b = cv2.split(lab)
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    cl = clahe.apply(l)
+    limg = cv2.merge((cl, a, b))
+    return cv2.cvtColor(limg, cv2.COLOR_LAB2BGR)
+
+
+def legacy_letterbox_blob(img, size):
+    # YoloHelmetDetector._letterbox + blobFromImage before buffers were reused
+    h, w = img.shape[:2]
+    r = min(size / h, size / w)
+    new_unpad = (int(round(w * r)), int(round(h * r)))
+    dw, dh = size - new_unpad[0], size - new_unpad[1]
+    top, bottom = dh // 2, dh - dh // 2
+    left, right = dw // 2, dw - dw // 2
+    img = cv2.resize(img, new_unpad, interpolation=cv2.INTER_LINEAR)
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return cv2.dnn.blobFromImage(img, 1 / 255.0, (size, size), swapRB=True, crop=False)
+
+
+def measure(fn, frame, repeat):
+    fn(frame)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(frame)
+    ms = (time.perf_counter() - start) / repeat * 1000.0
+
+    tracemalloc.start()
+    fn(frame)
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    fn(frame)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ms, (peak - base) / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preprocess time and per-frame allocations, legacy vs PreprocessStage")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--size", type=int, default=640)
+    args = parser.parse_args()
+
+    stage = PreprocessStage()
+    cases = [
+        ("legacy CLAHE (full res)", legacy_clahe),
+        ("stage CLAHE (full res)", lambda f: stage.clahe(f)),
+        ("stage CLAHE (resized to 960)", lambda f: stage.clahe(stage.resize_max(f, 960)[0])),
+        ("legacy letterbox + blob", lambda f: legacy_letterbox_blob(f, args.size)),
+        ("stage letterbox -> blob", lambda f: stage.letterbox_blob(f, args.size)),
+        ("stage letterbox + CLAHE -> blob", lambda f: stage.letterbox_blob(f, args.size, clahe=True)),
+    ]
+    rng = np.random.default_rng(0)
+    for name, (w, h) in (("720p", (1280, 720)), ("1080p", (1920, 1080))):
+        frame = rng.integers(0, 255, size=(h, w, 3), dtype=np.uint8)
+        print(f"{name} ({w}x{h})")
+        for label, fn in cases:
+            ms, mb = measure(fn, frame, args.repeat)
+            print(f"  {label:34s} {ms:8.3f} ms  {mb:8.2f} MiB allocated/frame")
+
+
+if __name__ == "__main__":
+    main()
+
+# python bench_preprocess.py
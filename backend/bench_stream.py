@@ -0,0 +1,91 @@
+import os
+import glob
+import time
+import argparse
+import cv2
+
+DATASET_DIR = os.path.join(os.path.dirname(__file__), "datasets", "helmet", "test", "images")
+
+
+def load_frames(source, count, size):
+    if source is not None:
+        cap = cv2.VideoCapture(int(source) if source.isdigit() else source)
+        frames = []
+        while len(frames) < count:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frames.append(frame)
+        cap.release()
+        return frames
+    paths = sorted(glob.glob(os.path.join(DATASET_DIR, "*.jpg")))[:count]
+    return [cv2.resize(cv2.imread(p), size) for p in paths]
+
+
+def stream_frame(frame, detect):
+    # Mirrors the per-frame work in generate_demo_stream after capture
+    boxes = detect(frame)
+    out = frame.copy()
+    for b in boxes:
+        x, y, w, h = b["x"], b["y"], b["w"], b["h"]
+        color = (34, 197, 94) if b.get("is_helmet") else (239, 68, 68)
+        cv2.rectangle(out, (x, y), (x + w, y + h), color, 2)
+    ok, jpg = cv2.imencode(".jpg", out, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return jpg.tobytes()
+
+
+def fps(frames, detect, rounds):
+    stream_frame(frames[0], detect)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for frame in frames:
+            stream_frame(frame, detect)
+    return rounds * len(frames) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MJPEG demo stream frames/sec: bytes detect API vs detect_array")
+    parser.add_argument("--source", help="video file or camera index (default: bundled test images)")
+    parser.add_argument("--frames", type=int, default=30)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.frames, (args.width, args.height))
+    if not frames:
+        print("No frames loaded")
+        return
+
+    try:
+        from services.detection import HelmetDetector
+        detector = HelmetDetector()
+    except Exception as e:
+        # Without the model only the removed JPEG round trip can be measured
+        print(f"[WARN] HelmetDetector unavailable ({e}); timing the stream without inference")
+        detector = None
+
+    def via_bytes(frame):
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 92])
+        if detector is None:
+            cv2.imdecode(buf, cv2.IMREAD_COLOR)
+            return []
+        return detector.detect(buf.tobytes())["boxes"]
+
+    def via_array(frame):
+        if detector is None:
+            return []
+        return detector.detect_array(frame)["boxes"]
+
+    before = fps(frames, via_bytes, args.rounds)
+    after = fps(frames, via_array, args.rounds)
+    print(f"Frames: {len(frames)} x {frames[0].shape[1]}x{frames[0].shape[0]}")
+    print(f"detect(bytes):       {before:7.2f} frames/sec")
+    print(f"detect_array(frame): {after:7.2f} frames/sec")
+    print(f"Speedup:             {after / before:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
+
+# python bench_stream.py --source sample.mp4
@@ -0,0 +1,72 @@
+import os
+import glob
+import json
+import time
+import argparse
+import threading
+import cv2
+from ai.backends import load_backend
+from services.detection import HelmetDetector
+from services.workers import WorkerPool
+
+DATASET_DIR = os.path.join(os.path.dirname(__file__), "datasets", "helmet", "test", "images")
+
+
+def run(detector, images, clients, seconds):
+    # `clients` threads each sending one frame at a time, like concurrent /api/detect requests
+    done = [0] * clients
+    deadline = time.perf_counter() + seconds
+
+    def client(n):
+        i = n
+        while time.perf_counter() < deadline:
+            detector.detect_array(images[i % len(images)])
+            done[n] += 1
+            i += clients
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(done) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inference throughput of the in-process detector vs the worker pool")
+    parser.add_argument("--workers", default="1,2,4", help="worker counts to sweep")
+    parser.add_argument("--threads", type=int, default=0, help="intra-op threads per worker (0 = cores / workers)")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--images", type=int, default=64)
+    args = parser.parse_args()
+
+    images = [cv2.imread(p) for p in sorted(glob.glob(os.path.join(DATASET_DIR, "*.jpg")))[:args.images]]
+    images = [im for im in images if im is not None]
+
+    detector = HelmetDetector(backend=load_backend())
+    detector.detect_array(images[0])
+    rows = [{"mode": "in_process", "workers": 0, "images_per_sec": round(run(detector, images, args.clients, args.seconds), 2)}]
+
+    for workers in [int(w) for w in args.workers.split(",")]:
+        pool = WorkerPool(workers=workers, threads=args.threads or None)
+        fps = run(pool, images, args.clients, args.seconds)
+        rows.append({
+            "mode": "pool",
+            "workers": workers,
+            "threads_per_worker": pool.threads,
+            "images_per_sec": round(fps, 2),
+            "speedup": round(fps / rows[0]["images_per_sec"], 2),
+            "utilization": [w["utilization"] for w in pool.stats()["per_worker"]]
+        })
+        pool.close()
+
+    print(json.dumps({"cpu_count": os.cpu_count(), "clients": args.clients, "results": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
+
+# python bench_workers.py --workers 1,2,4,8 --threads 1
+# HELMET_WORKERS=4 HELMET_WORKER_THREADS=2 python app.py
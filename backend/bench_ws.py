@@ -0,0 +1,92 @@
+import os
+import glob
+import json
+import time
+import uuid
+import argparse
+import threading
+import simple_websocket
+from bench_detect_load import get_token, percentile, DATASET_DIR
+
+
+def client(ws_url, token, frame, seconds, results, lock):
+    # Sends a frame whenever it holds a credit; every reply hands the credit back
+    ws = simple_websocket.Client.connect(ws_url)
+    ws.send(json.dumps({"type": "auth", "token": token, "client_id": "ws_" + uuid.uuid4().hex[:12]}))
+    ready = json.loads(ws.receive(timeout=30))
+    if ready.get("type") != "ready":
+        raise RuntimeError(f"handshake failed: {ready}")
+    credits = ready["credits"]
+    sent_at = {}
+    seq = 0
+    latencies, counts = [], {"result": 0, "busy": 0, "dropped": 0}
+    deadline = time.perf_counter() + seconds
+    try:
+        while time.perf_counter() < deadline:
+            while credits > 0:
+                sent_at[seq] = time.perf_counter()
+                ws.send(frame)
+                seq += 1
+                credits -= 1
+            message = json.loads(ws.receive(timeout=30))
+            credits += message.get("credits", 0)
+            kind = message.get("type")
+            if kind in counts:
+                counts[kind] += 1
+            if kind == "result":
+                latencies.append(time.perf_counter() - sent_at.pop(message["seq"]))
+            elif kind == "busy":
+                time.sleep(message.get("retry_ms", 100) / 1000.0)
+    finally:
+        ws.close()
+    with lock:
+        results.append((latencies, counts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket detection channel: round-trip latency and sustained FPS")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--clients", type=int, default=1)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--image", help="JPEG to send (default: first bundled test image)")
+    args = parser.parse_args()
+
+    path = args.image or sorted(glob.glob(os.path.join(DATASET_DIR, "*.jpg")))[0]
+    with open(path, "rb") as f:
+        frame = f.read()
+    token = get_token(args.url)
+    ws_url = args.url.replace("http", "ws", 1) + "/api/ws/detect"
+
+    results, lock = [], threading.Lock()
+    threads = [
+        threading.Thread(target=client, args=(ws_url, token, frame, args.seconds, results, lock))
+        for _ in range(args.clients)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = [l for ls, _ in results for l in ls]
+    totals = {k: sum(c[k] for _, c in results) for k in ("result", "busy", "dropped")}
+    print(json.dumps({
+        "clients": args.clients,
+        "seconds": round(elapsed, 2),
+        "frames": totals["result"],
+        "busy": totals["busy"],
+        "dropped": totals["dropped"],
+        "fps_total": round(totals["result"] / elapsed, 2),
+        "fps_per_client": round(totals["result"] / elapsed / max(1, args.clients), 2),
+        "rtt_p50_ms": round(percentile(latencies, 0.50) * 1000.0, 1),
+        "rtt_p95_ms": round(percentile(latencies, 0.95) * 1000.0, 1),
+        "rtt_p99_ms": round(percentile(latencies, 0.99) * 1000.0, 1)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
+
+# python app.py
+# python bench_ws.py --clients 4 --seconds 20
@@ -1,43 +1,14 @@
 import os
 import cv2
-from ultralytics import YOLO
+from services.detection import HelmetDetector
+from services.tracking import TrackingDetector
 
-def load_model():
-    model_path = os.path.join(os.path.dirname(__file__), "models", "helmet_yolo.pt")
-    return YOLO(model_path)
-
-def preprocess(image):
-    lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
-    l, a, b = cv2.split(lab)
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    cl = clahe.apply(l)
-    limg = cv2.merge((cl, a, b))
-    return cv2.cvtColor(limg, cv2.COLOR_LAB2BGR)
-
-def infer(model, image):
-    r = model(image, conf=0.15, iou=0.45, imgsz=640, verbose=False)[0]
-    if len(r.boxes) == 0:
-        r = model(image, conf=0.08, iou=0.50, imgsz=640, verbose=False)[0]
-    if len(r.boxes) == 0:
-        r = model(image, conf=0.05, iou=0.50, imgsz=960, verbose=False)[0]
-    return r
-
-def draw_boxes(image, model, result):
-    boxes = []
-    for box in result.boxes:
-        cls_id = int(box.cls[0])
-        label = model.names[cls_id].lower().strip()
-        conf = float(box.conf[0])
-        is_helmet = label == "with helmet"
-        x1, y1, x2, y2 = map(int, box.xyxy[0])
-        boxes.append((x1, y1, x2, y2, is_helmet, conf))
-    if len(boxes) == 0:
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        face_model = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml"))
-        faces = face_model.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(60, 60))
-        for (fx, fy, fw, fh) in faces:
-            boxes.append((fx, fy, fx+fw, fy+fh, False, 0.5))
-    for x1, y1, x2, y2, is_helmet, conf in boxes:
+def draw_boxes(image, boxes):
+    for b in boxes:
+        x1, y1 = b["x"], b["y"]
+        x2, y2 = x1 + b["w"], y1 + b["h"]
+        is_helmet = b["is_helmet"]
+        conf = b["confidence"]
         color = (34, 197, 94) if is_helmet else (239, 68, 68)
         cv2.rectangle(image, (x1, y1), (x2, y2), color, 2)
         text = ("Helmet Detected" if is_helmet else "Wear the Helmet") + f" {int(conf*100)}%"
@@ -48,15 +19,16 @@ def draw_boxes(image, model, result):
     return image
 
 def main():
-    model = load_model()
+    detector = HelmetDetector()
+    if int(os.getenv("HELMET_TRACK_INTERVAL", "1")) > 1:
+        detector = TrackingDetector(detector)
     cap = cv2.VideoCapture(0)
     while True:
         ok, frame = cap.read()
         if not ok:
             break
-        proc = preprocess(frame)
-        result = infer(model, proc)
-        out = draw_boxes(frame, model, result)
+        result = detector.detect_array(frame)
+        out = draw_boxes(frame, result["boxes"])
         cv2.imshow("Helmet Detection Demo", out)
         key = cv2.waitKey(1) & 0xFF
         if key == ord('q'):
@@ -67,4 +39,4 @@ def main():
 if __name__ == "__main__":
     main()
 
-# python demo_webcam.py
\ No newline at end of file
+# python demo_webcam.py
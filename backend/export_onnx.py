@@ -0,0 +1,34 @@
+import os
+import json
+import argparse
+from ultralytics import YOLO
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), "models")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export models/helmet_yolo.pt to ONNX for the onnxruntime/opencv backends")
+    parser.add_argument("--weights", default=os.path.join(MODELS_DIR, "helmet_yolo.pt"))
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--opset", type=int, default=12)
+    parser.add_argument("--dynamic", action="store_true", help="dynamic input size (lets the 960 px tier run; OpenCV DNN may not support it)")
+    parser.add_argument("--no-simplify", action="store_true")
+    args = parser.parse_args()
+
+    model = YOLO(args.weights)
+    onnx_path = model.export(format="onnx", imgsz=args.imgsz, opset=args.opset, dynamic=args.dynamic, simplify=not args.no_simplify)
+
+    # OpenCV DNN can't read ONNX metadata, so class names and input size also go in a sidecar
+    meta_path = os.path.splitext(onnx_path)[0] + ".json"
+    with open(meta_path, "w") as f:
+        json.dump({"names": {str(k): v for k, v in model.names.items()}, "imgsz": args.imgsz, "dynamic": args.dynamic}, f, indent=2)
+
+    print(f"[INFO] Exported {onnx_path}")
+    print(f"[INFO] Wrote {meta_path}")
+
+
+if __name__ == "__main__":
+    main()
+
+# python export_onnx.py
+# HELMET_BACKEND=onnxruntime python app.py   (or opencv; "auto" picks the .onnx when it exists)
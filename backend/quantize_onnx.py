@@ -0,0 +1,162 @@
+import os
+import glob
+import json
+import time
+import random
+import argparse
+import tempfile
+import cv2
+import numpy as np
+import onnx
+from onnxruntime.quantization import (
+    CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType, quantize_static, quant_pre_process
+)
+from ai.backends import OnnxRuntimeBackend, read_model_meta
+from ai.metrics import MapAccumulator, label_path_for, load_labels
+from ai.preprocess import PreprocessStage
+from bench_detect_load import percentile
+
+BASE_DIR = os.path.dirname(__file__)
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+DATASET_DIR = os.path.join(BASE_DIR, "datasets", "helmet")
+
+
+def list_images(split):
+    return sorted(glob.glob(os.path.join(DATASET_DIR, split, "images", "*.jpg")))
+
+
+class HelmetCalibrationReader(CalibrationDataReader):
+    """Feeds letterboxed train images exactly as the backends preprocess them."""
+
+    def __init__(self, input_name, paths, size):
+        self.input_name = input_name
+        self.paths = list(paths)
+        self.size = size
+        self.stage = PreprocessStage()
+
+    def get_next(self):
+        while self.paths:
+            image = cv2.imread(self.paths.pop())
+            if image is None:
+                continue
+            blob, _, _ = self.stage.letterbox_blob(image, self.size)
+            return {self.input_name: blob.copy()}
+        return None
+
+
+def head_nodes(model_path):
+    """
+    Non-Conv nodes of the detect head (the module producing the output).
+    YOLOv8 concatenates box coordinates (0..640) with class scores (0..1)
+    in one tensor, which a single INT8 scale can't represent, so the decode
+    math stays in FP32.
+    """
+    graph = onnx.load(model_path).graph
+    output = graph.output[0].name
+    producer = next((n for n in graph.node if output in n.output), None)
+    if producer is None or producer.name.count("/") < 2:
+        return []
+    prefix = producer.name.rsplit("/", 1)[0] + "/"
+    return [n.name for n in graph.node if n.name.startswith(prefix) and n.op_type != "Conv"]
+
+
+def evaluate(backend, paths, names, conf, iou):
+    acc = MapAccumulator(names)
+    latencies = []
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        started = time.perf_counter()
+        det = backend.predict([image], conf=conf, iou=iou, imgsz=backend.fixed_size or 640)[0]
+        latencies.append(time.perf_counter() - started)
+        gt_cls, gt_xyxy = load_labels(label_path_for(path), image.shape[1], image.shape[0])
+        acc.add(det, gt_cls, gt_xyxy)
+    result = acc.result()
+    result.update({
+        "latency_mean_ms": round(float(np.mean(latencies)) * 1000.0, 2) if latencies else 0.0,
+        "latency_p50_ms": round(percentile(latencies, 0.50) * 1000.0, 2),
+        "latency_p95_ms": round(percentile(latencies, 0.95) * 1000.0, 2)
+    })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Static INT8 quantization of the ONNX helmet model with an mAP/latency gate")
+    parser.add_argument("--model", default=os.path.join(MODELS_DIR, "helmet_yolo.onnx"))
+    parser.add_argument("--output", help="default: <model>.int8.onnx")
+    parser.add_argument("--calib-images", type=int, default=200)
+    parser.add_argument("--eval-images", type=int, default=0, help="0 = whole valid split")
+    parser.add_argument("--method", choices=["minmax", "entropy", "percentile"], default="minmax")
+    parser.add_argument("--keep-head-int8", action="store_true", help="also quantize the detect head decode")
+    parser.add_argument("--threads", type=int, default=int(os.getenv("HELMET_INFER_THREADS", "0")))
+    parser.add_argument("--budget", type=float, default=float(os.getenv("HELMET_INT8_MAX_DROP", "0.01")))
+    args = parser.parse_args()
+    output = args.output or os.path.splitext(args.model)[0] + ".int8.onnx"
+
+    fp32 = OnnxRuntimeBackend(args.model, args.threads)
+    size = fp32.fixed_size or 640
+
+    calib = list_images("train")
+    random.Random(0).shuffle(calib)
+    calib = calib[:args.calib_images]
+    print(f"[INFO] Calibrating on {len(calib)} train images at {size}px")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prepared = os.path.join(tmp, "prepared.onnx")
+        try:
+            quant_pre_process(args.model, prepared)
+        except Exception as e:
+            print(f"[WARN] Shape inference pre-pass failed ({e}), quantizing the raw export")
+            prepared = args.model
+        exclude = [] if args.keep_head_int8 else head_nodes(prepared)
+        method = {"minmax": CalibrationMethod.MinMax, "entropy": CalibrationMethod.Entropy,
+                  "percentile": CalibrationMethod.Percentile}[args.method]
+        quantize_static(
+            prepared, output, HelmetCalibrationReader(fp32.input_name, calib, size),
+            quant_format=QuantFormat.QDQ, per_channel=True,
+            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+            calibrate_method=method, nodes_to_exclude=exclude
+        )
+    print(f"[INFO] Wrote {output} ({len(exclude)} head nodes kept in FP32)")
+
+    # Same class names / input size as the FP32 export, without a quantization record yet
+    meta = read_model_meta(args.model)
+    meta.update({"names": fp32.names, "imgsz": size, "dynamic": fp32.fixed_size is None})
+    meta.pop("quantization", None)
+    int8 = OnnxRuntimeBackend(output, args.threads, check=False)
+
+    valid = list_images("valid")
+    if args.eval_images:
+        valid = valid[:args.eval_images]
+    # Low threshold as in ultralytics val, so the PR curve covers the full recall range
+    report = {"fp32": evaluate(fp32, valid, fp32.names, 0.001, 0.6), "int8": evaluate(int8, valid, fp32.names, 0.001, 0.6)}
+    drop = round(report["fp32"]["map50"] - report["int8"]["map50"], 4)
+    meta["quantization"] = {
+        "source": os.path.basename(args.model),
+        "method": args.method,
+        "calibration_images": len(calib),
+        "eval_images": report["fp32"]["images"],
+        "fp32_map50": report["fp32"]["map50"],
+        "int8_map50": report["int8"]["map50"],
+        "map50_drop": drop,
+        "fp32_latency_ms": report["fp32"]["latency_mean_ms"],
+        "int8_latency_ms": report["int8"]["latency_mean_ms"],
+        "budget": args.budget
+    }
+    meta_path = os.path.splitext(output)[0] + ".json"
+    with open(meta_path, "w") as f:
+        json.dump(dict(meta, names={str(k): v for k, v in meta["names"].items()}), f, indent=2)
+
+    print(json.dumps(report, indent=2))
+    print(f"[INFO] mAP@0.5 drop {drop} (budget {args.budget}), latency {report['fp32']['latency_mean_ms']} -> {report['int8']['latency_mean_ms']} ms")
+    if drop > args.budget:
+        print(f"[ERROR] Over budget: the detection service will refuse {output}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
+
+# python export_onnx.py && python quantize_onnx.py
+# HELMET_BACKEND=onnxruntime HELMET_PRECISION=int8 python app.py
@@ -0,0 +1,145 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from services.metrics import BATCH_QUEUE_DEPTH, ERRORS
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class BatchScheduler:
+    """
+    Collects detect requests from many request threads and runs them through
+    HelmetDetector.detect_batch together.
+
+    A single worker thread takes the first queued frame, then keeps collecting
+    until it has max_batch frames or max_wait_ms has passed since that first
+    frame, and resolves each caller's future with its own result.
+
+    Frames are encoded bytes (submit) or decoded BGR arrays (submit_array,
+    used by the camera readers); a batch holding both runs one model call
+    per kind.
+    """
+
+    def __init__(self, detector, max_batch=None, max_wait_ms=None, max_queue=None):
+        self.detector = detector
+        self.max_batch = max_batch or int(os.getenv("HELMET_BATCH_SIZE", "8"))
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else float(os.getenv("HELMET_BATCH_WAIT_MS", "10"))) / 1000.0
+        self.max_queue = max_queue or int(os.getenv("HELMET_BATCH_QUEUE", "64"))
+
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._frames = 0
+        self._rejected = 0
+        self._batch_sizes = {}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+        BATCH_QUEUE_DEPTH.set_function(self._queue.qsize)
+        self._worker = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+        self._worker.start()
+
+    def submit(self, img_bytes):
+        return self._enqueue(img_bytes)
+
+    def submit_array(self, image):
+        return self._enqueue(image)
+
+    def _enqueue(self, frame):
+        future = Future()
+        try:
+            self._queue.put_nowait((frame, future, time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            ERRORS.inc(stage="queue_full")
+            raise QueueFullError("detection queue is full")
+        return future
+
+    def detect(self, img_bytes, timeout=None):
+        return self.submit(img_bytes).result(timeout=timeout)
+
+    def detect_array(self, image, timeout=None):
+        return self.submit_array(image).result(timeout=timeout)
+
+    def detect_array_batch(self, images):
+        # Queues as many frames as fit and waits for those before queueing more;
+        # QueueFullError only when none of this call's frames could be queued
+        results, futures = [], []
+        for image in images:
+            while True:
+                try:
+                    futures.append(self.submit_array(image))
+                    break
+                except QueueFullError:
+                    if not futures:
+                        raise
+                    results += [f.result() for f in futures]
+                    futures = []
+        return results + [f.result() for f in futures]
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            waits = [started - enqueued for _, _, enqueued in batch]
+            with self._lock:
+                self._batches += 1
+                self._frames += len(batch)
+                self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+                self._wait_total += sum(waits)
+                self._wait_max = max(self._wait_max, max(waits))
+            try:
+                results = self._detect([frame for frame, _, _ in batch])
+            except Exception as e:
+                ERRORS.inc(stage="detect")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def _detect(self, frames):
+        encoded = [i for i, frame in enumerate(frames) if isinstance(frame, bytes)]
+        if len(encoded) == len(frames):
+            return self.detector.detect_batch(frames)
+        decoded = [i for i, frame in enumerate(frames) if not isinstance(frame, bytes)]
+        results = [None] * len(frames)
+        for indices, run in ((encoded, self.detector.detect_batch), (decoded, self.detector.detect_array_batch)):
+            if indices:
+                for i, result in zip(indices, run([frames[i] for i in indices])):
+                    results[i] = result
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "max_queue": self.max_queue,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "frames": self._frames,
+                "rejected": self._rejected,
+                "mean_batch_size": round(self._frames / self._batches, 3) if self._batches else 0.0,
+                "batch_sizes": dict(self._batch_sizes),
+                "mean_queue_wait_ms": round(self._wait_total / self._frames * 1000.0, 3) if self._frames else 0.0,
+                "max_queue_wait_ms": round(self._wait_max * 1000.0, 3)
+            }
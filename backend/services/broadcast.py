@@ -0,0 +1,136 @@
+import queue
+import threading
+
+_END = object()
+
+
+class Subscription:
+    """One viewer's bounded frame buffer. A slow viewer loses its oldest frames."""
+
+    def __init__(self, broadcaster, buffer_size):
+        self._broadcaster = broadcaster
+        self._queue = queue.Queue(maxsize=buffer_size)
+        self.delivered = 0
+        self.dropped = 0
+
+    def put(self, item):
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def __iter__(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _END:
+                    break
+                self.delivered += 1
+                yield item
+        finally:
+            self.close()
+
+    def end(self):
+        """Called by the producer when its source is gone; iteration stops after the buffered frames."""
+        self.put(_END)
+
+    def close(self):
+        self._broadcaster.unsubscribe(self)
+
+
+class FrameBroadcaster:
+    """
+    Runs a single StreamPipeline for a source and fans its JPEG frames out to
+    every subscriber.
+
+    make_pipeline() is called when the first viewer subscribes, and the
+    pipeline is stopped again when the last one leaves.
+    """
+
+    def __init__(self, make_pipeline, buffer_size=2):
+        self.make_pipeline = make_pipeline
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._pipeline = None
+        self._starting = False
+        self._thread = None
+        self.frames = 0
+        self.starts = 0
+
+    @property
+    def pipeline(self):
+        return self._pipeline
+
+    def subscribe(self):
+        sub = Subscription(self, self.buffer_size)
+        with self._lock:
+            self._subscribers.append(sub)
+            if self._pipeline is not None or self._starting:
+                return sub
+            self._starting = True
+        # make_pipeline() can wait for the model; build it unlocked so other viewers and stats() aren't held up
+        try:
+            pipeline = self.make_pipeline()
+        except Exception:
+            with self._lock:
+                self._starting = False
+                waiting, self._subscribers = self._subscribers, []
+            for s in waiting:
+                s.end()
+            raise
+        with self._lock:
+            self._starting = False
+            if self._subscribers:
+                self._pipeline = pipeline
+                self.starts += 1
+                self._thread = threading.Thread(target=self._produce, args=(pipeline,), name="stream-broadcast", daemon=True)
+                self._thread.start()
+                return sub
+        # Everyone left while it was starting
+        pipeline.stop()
+        return sub
+
+    def unsubscribe(self, sub):
+        pipeline = None
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+            if not self._subscribers and self._pipeline is not None:
+                pipeline = self._pipeline
+                self._pipeline = None
+        if pipeline is not None:
+            pipeline.stop()
+
+    def _produce(self, pipeline):
+        for jpg in pipeline.frames():
+            with self._lock:
+                subscribers = list(self._subscribers)
+            self.frames += 1
+            for sub in subscribers:
+                sub.put(jpg)
+        # Source ended on its own: release anyone still waiting on it
+        with self._lock:
+            if self._pipeline is pipeline:
+                self._pipeline = None
+                for sub in self._subscribers:
+                    sub.end()
+
+    def stats(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            running = self._pipeline is not None
+            starting = self._starting
+        return {
+            "running": running,
+            "starting": starting,
+            "starts": self.starts,
+            "frames": self.frames,
+            "subscribers": [{"delivered": s.delivered, "dropped": s.dropped} for s in subscribers]
+        }
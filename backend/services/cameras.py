@@ -0,0 +1,391 @@
+import os
+import re
+import time
+import threading
+from collections import deque
+import cv2
+from services.batching import QueueFullError
+from services.broadcast import Subscription
+from services.metrics import CAMERA_FRAMES, ERRORS, log
+from services.pipeline import draw_boxes, open_source
+
+
+def parse_cameras(spec, default_fps):
+    """
+    HELMET_CAMERAS -> [(name, source, target_fps)]. Entries are separated by
+    ";" and look like "gate1=rtsp://10.0.0.5/stream|5": an optional name,
+    the source (device index, URL or video file) and an optional target fps.
+    """
+    cameras = []
+    for i, entry in enumerate(e.strip() for e in spec.split(";")):
+        if not entry:
+            continue
+        fps = default_fps
+        if "|" in entry:
+            entry, fps = entry.rsplit("|", 1)
+            fps = float(fps)
+        m = re.match(r"^([\w-]+)=(.+)$", entry)
+        name, source = (m.group(1), m.group(2)) if m else (f"cam{i}", entry)
+        cameras.append((name, source.strip(), fps))
+    names = [name for name, _, _ in cameras]
+    if len(set(names)) != len(names):
+        raise ValueError(f"duplicate camera names in HELMET_CAMERAS: {names}")
+    return cameras
+
+
+class RateMeter:
+    """Events per second over the last `window` seconds."""
+
+    def __init__(self, window=5.0):
+        self.window = window
+        self._times = deque()
+
+    def mark(self, now):
+        self._times.append(now)
+        self._trim(now)
+
+    def rate(self, now):
+        self._trim(now)
+        return len(self._times) / self.window
+
+    def _trim(self, now):
+        while self._times and self._times[0] < now - self.window:
+            self._times.popleft()
+
+
+class CameraSource:
+    """
+    One configured camera. Its reader thread keeps only the newest frame for
+    the scheduler and, while anyone is watching, encodes frames with the
+    latest boxes for MJPEG at up to stream_fps.
+
+    Video files are paced to their own fps and, with loop, restarted at the
+    end so they can stand in for a live camera. Devices and URLs that fail
+    to open or stop delivering frames are reopened with a backoff doubling
+    from 1s to 30s.
+    """
+
+    def __init__(self, name, source, target_fps, overlay=None, loop=True, stream_fps=15.0, jpeg_quality=80, buffer_size=2):
+        self.name = name
+        self.source = source
+        self.target_fps = target_fps
+        self.overlay = overlay
+        self.is_file = os.path.isfile(source)
+        self.loop = loop
+        self.stream_interval = 1.0 / stream_fps if stream_fps > 0 else 0.0
+        self.jpeg_quality = jpeg_quality
+        self.buffer_size = buffer_size
+        self.state = "connecting"
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._frame = None
+        self._seq = 0
+        self._captured_at = 0.0
+        self._subscribers = []
+        self._next_encode = 0.0
+        self._read_rate = RateMeter()
+        self._sample_rate = RateMeter()
+
+        # Scheduler state, only touched by the CameraManager thread
+        self.credit = 0.0
+        self.submitted_seq = 0
+        self.in_flight = 0
+
+        self.result = None
+        self.result_seq = 0
+        self.result_at = 0.0
+        self.frames_read = 0
+        self.submitted = 0
+        self.inferred = 0
+        self.rejected = 0
+        self.errors = 0
+        self.reconnects = 0
+        self.latency_total = 0.0
+
+        self._thread = threading.Thread(target=self._run, name=f"camera-{name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=2.0)
+
+    def latest(self):
+        """(frame, seq, captured_at) of the newest frame read; frame is None before the first one."""
+        with self._lock:
+            return self._frame, self._seq, self._captured_at
+
+    def subscribe(self):
+        sub = Subscription(self, self.buffer_size)
+        with self._lock:
+            self._subscribers.append(sub)
+            if self.state == "ended":
+                sub.end()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+
+    def set_result(self, seq, result, now):
+        # Frames can finish out of order on a worker pool; never replace a newer result
+        with self._lock:
+            if seq <= self.result_seq:
+                return False
+            self.result = result
+            self.result_seq = seq
+            self.result_at = now
+            self.inferred += 1
+            self._sample_rate.mark(now)
+            return True
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            cap = open_source(self.source)
+            if not cap.isOpened():
+                cap.release()
+                ERRORS.inc(stage="camera_open")
+                log.log(f"camera-{self.name}", f"[WARN] Camera {self.name}: cannot open {self.source}, retrying in {backoff:.0f}s")
+                self.state = "reconnecting"
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            self.state = "streaming"
+            read_any = self._read(cap)
+            cap.release()
+            if self._stop.is_set():
+                break
+            if self.is_file and self.loop and read_any:
+                continue
+            if self.is_file:
+                break
+            if read_any:
+                backoff = 1.0
+            self.reconnects += 1
+            ERRORS.inc(stage="camera_read")
+            log.log(f"camera-{self.name}", f"[WARN] Camera {self.name}: stream from {self.source} stopped, reconnecting in {backoff:.0f}s")
+            self.state = "reconnecting"
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+        with self._lock:
+            self.state = "ended" if not self._stop.is_set() else "stopped"
+            for sub in self._subscribers:
+                sub.end()
+
+    def _read(self, cap):
+        interval = 0.0
+        if self.is_file:
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            interval = 1.0 / fps if fps and fps > 0 else 0.0
+        next_at = time.monotonic()
+        read_any = False
+        while not self._stop.is_set():
+            ok, frame = cap.read()
+            if not ok:
+                return read_any
+            read_any = True
+            now = time.monotonic()
+            with self._lock:
+                self._frame = frame
+                self._seq += 1
+                self._captured_at = now
+                self.frames_read += 1
+                self._read_rate.mark(now)
+                watched = bool(self._subscribers) and now >= self._next_encode
+                if watched:
+                    self._next_encode = now + self.stream_interval
+            CAMERA_FRAMES.inc(camera=self.name, outcome="read")
+            if watched:
+                self._encode(frame)
+            if interval:
+                # After a stall, carry on at file rate from now rather than catching up
+                next_at = max(next_at + interval, now)
+                delay = next_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+        return read_any
+
+    def _encode(self, frame):
+        # The scheduler may still be reading this frame
+        frame = frame.copy()
+        if self.overlay is not None:
+            self.overlay(self, frame)
+        with self._lock:
+            boxes = self.result["boxes"] if self.result else []
+        draw_boxes(frame, boxes)
+        ok, jpg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return
+        jpg = jpg.tobytes()
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            sub.put(jpg)
+
+    def stats(self, now):
+        with self._lock:
+            return {
+                "name": self.name,
+                "source": self.source,
+                "state": self.state,
+                "target_fps": self.target_fps,
+                "read_fps": round(self._read_rate.rate(now), 2),
+                "sample_fps": round(self._sample_rate.rate(now), 2),
+                "frames_read": self.frames_read,
+                "submitted": self.submitted,
+                "inferred": self.inferred,
+                "rejected": self.rejected,
+                "errors": self.errors,
+                "reconnects": self.reconnects,
+                "mean_latency_ms": round(self.latency_total / self.inferred * 1000.0, 3) if self.inferred else 0.0,
+                "result_age_s": round(now - self.result_at, 3) if self.result is not None else None,
+                "subscribers": len(self._subscribers)
+            }
+
+
+class CameraManager:
+    """
+    Feeds the newest frame of every CameraSource into one shared batched
+    detector (a BatchScheduler or WorkerPool, through submit_array) with a
+    weighted deficit round-robin.
+
+    Each camera earns credit at its target fps, capped at one frame, and a
+    frame is sent only for a camera holding a full credit and a frame it has
+    not sent yet. At most max_in_flight frames are outstanding; when a slot
+    frees up the next eligible camera after the last one served gets it.
+    While the detector keeps up every camera samples at its target. When it
+    can't, credit stops being the limit and cameras take turns, so each
+    camera's rate drops to the same share (cameras asking for less than that
+    keep their own rate) instead of the fastest source crowding out the rest.
+
+    on_result(camera, result) runs on the manager thread for every result.
+    """
+
+    def __init__(self, cameras, get_detector, on_result=None, max_in_flight=None):
+        self.cameras = cameras
+        self.by_name = {c.name: c for c in cameras}
+        self.get_detector = get_detector
+        self.on_result = on_result
+        self.max_in_flight = max_in_flight or int(os.getenv("HELMET_CAMERA_IN_FLIGHT", "0"))
+        self.in_flight = 0
+        self._next = 0
+        self._cond = threading.Condition()
+        self._completed = deque()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="camera-manager", daemon=True)
+
+    def start(self):
+        for camera in self.cameras:
+            camera.start()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
+        self._thread.join(timeout=2.0)
+        for camera in self.cameras:
+            camera.stop()
+
+    def _run(self):
+        last = time.monotonic()
+        while not self._stop.is_set():
+            detector = self.get_detector()
+            if detector is None:
+                self._stop.wait(0.5)
+                last = time.monotonic()
+                continue
+            if not self.max_in_flight:
+                # Enough to fill one batch on every worker
+                self.max_in_flight = getattr(detector, "max_batch", 8) * getattr(detector, "workers", 1)
+
+            self._finish_completed()
+            now = time.monotonic()
+            dt, last = now - last, now
+            for camera in self.cameras:
+                camera.credit = min(1.0, camera.credit + camera.target_fps * dt)
+            self._dispatch(detector)
+
+            # Sleep until a result comes back or the next camera earns a frame
+            waits = [(1.0 - c.credit) / c.target_fps for c in self.cameras if c.target_fps > 0 and c.credit < 1.0]
+            timeout = min([0.05] + waits)
+            with self._cond:
+                if not self._completed and not self._stop.is_set():
+                    self._cond.wait(max(0.002, timeout))
+
+    def _dispatch(self, detector):
+        n = len(self.cameras)
+        for k in range(n):
+            if self.in_flight >= self.max_in_flight:
+                return
+            index = (self._next + k) % n
+            camera = self.cameras[index]
+            if camera.credit < 1.0:
+                continue
+            frame, seq, captured_at = camera.latest()
+            if frame is None or seq == camera.submitted_seq:
+                continue
+            try:
+                future = detector.submit_array(frame)
+            except QueueFullError:
+                # Shared with live requests; try again on the next pass
+                camera.rejected += 1
+                CAMERA_FRAMES.inc(camera=camera.name, outcome="rejected")
+                return
+            camera.credit -= 1.0
+            camera.submitted_seq = seq
+            camera.submitted += 1
+            camera.in_flight += 1
+            self.in_flight += 1
+            self._next = (index + 1) % n
+            future.add_done_callback(lambda f, c=camera, s=seq, t=time.monotonic(): self._on_done(c, s, t, f))
+
+    def _on_done(self, camera, seq, submitted_at, future):
+        # Runs on the detector's thread; the result is handled on ours
+        with self._cond:
+            self._completed.append((camera, seq, submitted_at, time.monotonic(), future))
+            self._cond.notify()
+
+    def _finish_completed(self):
+        while True:
+            with self._cond:
+                if not self._completed:
+                    return
+                camera, seq, submitted_at, done_at, future = self._completed.popleft()
+            self.in_flight -= 1
+            camera.in_flight -= 1
+            try:
+                result = future.result()
+            except Exception as e:
+                camera.errors += 1
+                ERRORS.inc(stage="camera_detect")
+                log.log(f"camera-{camera.name}-detect", f"[ERROR] Camera {camera.name}: detection failed: {e}")
+                continue
+            if not camera.set_result(seq, result, done_at):
+                continue
+            camera.latency_total += done_at - submitted_at
+            CAMERA_FRAMES.inc(camera=camera.name, outcome="inferred")
+            if self.on_result is not None:
+                try:
+                    self.on_result(camera, result)
+                except Exception as e:
+                    ERRORS.inc(stage="camera_result")
+                    log.log(f"camera-{camera.name}-result", f"[ERROR] Camera {camera.name}: result handler failed: {e}")
+
+    def stats(self):
+        now = time.monotonic()
+        cameras = [c.stats(now) for c in self.cameras]
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "target_fps": round(sum(c["target_fps"] for c in cameras), 2),
+            "sample_fps": round(sum(c["sample_fps"] for c in cameras), 2),
+            "cameras": cameras
+        }
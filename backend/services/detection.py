@@ -1,7 +1,103 @@
 import os
+import time
+import hashlib
 import cv2
 import numpy as np
-from ultralytics import YOLO
+from ai.yolo import batched_nms
+from ai.preprocess import PreprocessStage
+from ai.backends import load_backend
+from services.metrics import STAGE_SECONDS, INFER_PASS_SECONDS, FRAME_PASSES, HAAR_FALLBACK, MODEL_LOAD_SECONDS, log
+
+# (conf, iou, imgsz) tiers, tried in order until one yields boxes
+INFER_TIERS = ((0.15, 0.45, 640), (0.08, 0.50, 640), (0.05, 0.50, 960))
+
+
+def fit_tiers(tiers, fixed_size, mode="single"):
+    """
+    The tiers a model exported with a fixed input size can really run. Such
+    a model ignores imgsz, so a tier at another size would only repeat a pass
+    already made at fixed_size. In "single" mode those tiers are clamped to
+    fixed_size, which folds their thresholds into the base pass for free;
+    the cascade drops them.
+    """
+    if not fixed_size or all(t[2] == fixed_size for t in tiers):
+        return tiers
+    if mode == "cascade":
+        kept = tuple(t for t in tiers if t[2] == fixed_size)
+        if kept:
+            return kept
+    return tuple((conf, iou, fixed_size) for conf, iou, _ in tiers)
+
+
+def infer_cascade(backend, image, tiers=INFER_TIERS):
+    """Run up to one forward pass per tier. Returns (Detections, passes)."""
+    passes = 0
+    for conf, iou, imgsz in tiers:
+        with INFER_PASS_SECONDS.time(backend=backend.name, infer_pass=str(passes + 1)):
+            r = backend.predict([image], conf=conf, iou=iou, imgsz=imgsz)[0]
+        passes += 1
+        if len(r) > 0:
+            break
+    return r, passes
+
+
+def infer_single(backend, image, tiers=INFER_TIERS, small_box_px=24, hires_min_side=960):
+    """
+    One forward pass at the lowest threshold, with the cascade tiers applied
+    to the raw candidates afterwards. Returns (Detections, passes).
+
+    The high-resolution tier only runs when it can plausibly help: a leftover
+    candidate is small at model scale, or the frame is large enough that the
+    base pass downsampled it. Otherwise the low-confidence candidates from the
+    base pass stand in for it.
+    """
+    return infer_single_batch(backend, [image], tiers, small_box_px, hires_min_side)[0]
+
+
+def infer_single_batch(backend, images, tiers=INFER_TIERS, small_box_px=24, hires_min_side=960):
+    """Batched infer_single: one base forward pass for all images, one more for those needing the hires tier."""
+    base = [t for t in tiers if t[2] == tiers[0][2]]
+    hires = [t for t in tiers if t[2] != tiers[0][2]]
+    imgsz = base[0][2]
+    with INFER_PASS_SECONDS.time(backend=backend.name, infer_pass="1"):
+        results = backend.predict(images, conf=min(t[0] for t in tiers), iou=max(t[1] for t in base), imgsz=imgsz)
+
+    out = []
+    retry = []
+    for i, (image, r) in enumerate(zip(images, results)):
+        r, needs_hires = _apply_tiers(r, image, base, imgsz, small_box_px, hires_min_side)
+        out.append((r, 1))
+        if needs_hires and hires:
+            retry.append(i)
+
+    if retry:
+        tier_conf, tier_iou, tier_imgsz = hires[0]
+        with INFER_PASS_SECONDS.time(backend=backend.name, infer_pass="2"):
+            hires_results = backend.predict([images[i] for i in retry], conf=tier_conf, iou=tier_iou, imgsz=tier_imgsz)
+        for i, r in zip(retry, hires_results):
+            out[i] = (r, 2)
+    return out
+
+
+def _apply_tiers(r, image, base, imgsz, small_box_px, hires_min_side):
+    # Returns the first non-empty base tier, or the raw candidates and whether the hires tier is worth running
+    large = max(image.shape[:2]) >= hires_min_side
+    if len(r) == 0:
+        return r, large
+
+    conf = r.conf
+    cls_ids = r.cls
+    xywh = r.xywh
+    for tier_conf, tier_iou, _ in base:
+        keep = np.flatnonzero(conf >= tier_conf)
+        if keep.size == 0:
+            continue
+        keep = keep[batched_nms(xywh[keep], conf[keep], cls_ids[keep], tier_conf, tier_iou, max(image.shape[:2]))]
+        return r.select(keep), False
+
+    scale = imgsz / max(image.shape[:2])
+    small = float(np.min(xywh[:, 2:]) * scale) < small_box_px
+    return r, small or large
 
 
 class HelmetDetector:
@@ -11,45 +107,89 @@ class HelmetDetector:
     Dataset classes (IMPORTANT):
       0 -> With Helmet
       1 -> Without Helmet
-    """
-
-    def __init__(self):
-        model_path = os.path.join(
-            os.path.dirname(__file__),
-            "..", "models", "helmet_yolo.pt"
-        )
 
-        if not os.path.exists(model_path):
-            raise FileNotFoundError(f"[ERROR] Model not found: {model_path}")
+    Inference goes through an ai.backends backend (HELMET_BACKEND): the .pt
+    model via ultralytics, or its ONNX export via ONNX Runtime / OpenCV DNN.
+    """
 
-        print(f"[INFO] Loading YOLO model: {model_path}")
-        self.model = YOLO(model_path)
+    def __init__(self, backend=None):
+        started = time.perf_counter()
+        self.backend = backend or load_backend()
+        MODEL_LOAD_SECONDS.set(time.perf_counter() - started, backend=self.backend.name)
+        print(f"[INFO] Inference backend: {self.backend.name}")
 
         self.face_model = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml"))
         # Normalize model class names once
         self.class_names = {
             idx: name.lower().strip()
-            for idx, name in self.model.names.items()
+            for idx, name in self.backend.names.items()
         }
 
         print("[INFO] Model classes:", self.class_names)
 
-    def preprocess(self, image):
-        lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        cl = clahe.apply(l)
-        limg = cv2.merge((cl, a, b))
-        return cv2.cvtColor(limg, cv2.COLOR_LAB2BGR)
+        # "single": one pass + tiered postprocessing, "cascade": legacy re-runs
+        self.infer_mode = os.getenv("HELMET_INFER_MODE", "single")
+        self.small_box_px = int(os.getenv("HELMET_SMALL_BOX_PX", "24"))
+        self.hires_min_side = int(os.getenv("HELMET_HIRES_MIN_SIDE", "960"))
+        fixed_size = getattr(self.backend, "fixed_size", None)
+        self.tiers = fit_tiers(INFER_TIERS, fixed_size, self.infer_mode)
+        if self.tiers != INFER_TIERS:
+            print(f"[INFO] Model input is fixed at {fixed_size}px; inference tiers {INFER_TIERS} -> {self.tiers} (export with --dynamic for the hires tier)")
+
+        # CLAHE on a frame already downscaled to the largest inference size, instead of full resolution
+        self.clahe_resized = os.getenv("HELMET_CLAHE_RESIZED", "0") == "1"
+        self.preprocess_stage = PreprocessStage(clip_limit=2.0, tile_grid=(8, 8))
+
+        # Forward passes used for the last frame, and a histogram over all frames
+        self.last_passes = 0
+        self.pass_counts = {}
+
+    def preprocess(self, image, slot=0):
+        """CLAHE-enhanced frame plus the scale it was resized by (1.0 unless clahe_resized)."""
+        scale = 1.0
+        if self.clahe_resized:
+            image, scale = self.preprocess_stage.resize_max(image, max(t[2] for t in self.tiers), slot=slot)
+        return self.preprocess_stage.clahe(image, slot=slot), scale
 
     def infer(self, image):
-        r = self.model(image, conf=0.15, iou=0.45, imgsz=640, verbose=False)[0]
-        if len(r.boxes) == 0:
-            r = self.model(image, conf=0.08, iou=0.50, imgsz=640, verbose=False)[0]
-        if len(r.boxes) == 0:
-            r = self.model(image, conf=0.05, iou=0.50, imgsz=960, verbose=False)[0]
+        if self.infer_mode == "cascade":
+            r, passes = infer_cascade(self.backend, image, self.tiers)
+        else:
+            r, passes = infer_single(self.backend, image, self.tiers, small_box_px=self.small_box_px, hires_min_side=self.hires_min_side)
+        self._count_passes(passes)
         return r
 
+    def infer_batch(self, images):
+        if self.infer_mode == "cascade":
+            outs = [infer_cascade(self.backend, image, self.tiers) for image in images]
+        else:
+            outs = infer_single_batch(self.backend, images, self.tiers, small_box_px=self.small_box_px, hires_min_side=self.hires_min_side)
+        for _, passes in outs:
+            self._count_passes(passes)
+        return outs
+
+    def _count_passes(self, passes):
+        self.last_passes = passes
+        self.pass_counts[passes] = self.pass_counts.get(passes, 0) + 1
+        FRAME_PASSES.inc(passes=str(passes))
+
+    def config_key(self):
+        """Short hash of the model version and every setting that shapes a result (tiers, mode, CLAHE scaling)."""
+        config = (self.backend.name, getattr(self.backend, "version", None), self.infer_mode, self.tiers,
+                  self.small_box_px, self.hires_min_side, self.clahe_resized)
+        return hashlib.blake2b(repr(config).encode(), digest_size=8).hexdigest()
+
+    def pass_stats(self):
+        frames = sum(self.pass_counts.values())
+        total = sum(k * v for k, v in self.pass_counts.items())
+        return {
+            "mode": self.infer_mode,
+            "frames": frames,
+            "passes": total,
+            "mean_passes": round(total / frames, 3) if frames else 0.0,
+            "histogram": dict(self.pass_counts)
+        }
+
     def detect(self, img_bytes):
         """
         Detect helmet from image bytes.
@@ -60,21 +200,36 @@ class HelmetDetector:
           boxes: list
         }
         """
+        return self.detect_batch([img_bytes])[0]
 
-        # -------------------------------
-        # Decode image
-        # -------------------------------
-        img_array = np.frombuffer(img_bytes, np.uint8)
-        image = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+    def detect_batch(self, images_bytes):
+        """Detect helmets in several encoded images with one batched model call."""
+        with STAGE_SECONDS.time(stage="imdecode"):
+            images = [cv2.imdecode(np.frombuffer(b, np.uint8), cv2.IMREAD_COLOR) for b in images_bytes]
+        return self.detect_array_batch(images)
+
+    def detect_array(self, image):
+        """Detect helmet in an already decoded BGR frame (same result as detect)."""
+        return self.detect_array_batch([image])[0]
 
-        if image is None:
-            return {"helmet": False, "confidence": 0.0, "boxes": []}
+    def detect_array_batch(self, images):
+        valid = [i for i, image in enumerate(images) if image is not None]
 
-        image_proc = self.preprocess(image)
+        results = [{"helmet": False, "confidence": 0.0, "boxes": []} for _ in images]
+        if not valid:
+            return results
 
-        result = self.infer(image_proc)
+        with STAGE_SECONDS.time(stage="preprocess"):
+            procs = [self.preprocess(images[i], slot=n) for n, i in enumerate(valid)]
+        with STAGE_SECONDS.time(stage="infer"):
+            outs = self.infer_batch([proc for proc, _ in procs])
+        with STAGE_SECONDS.time(stage="postprocess"):
+            for i, (_, scale), (result, passes) in zip(valid, procs, outs):
+                results[i] = self._summarize(images[i], result, passes, scale)
+        return results
 
-        print(f"[DEBUG] Boxes detected: {len(result.boxes)}")
+    def _summarize(self, image, result, passes, scale=1.0):
+        log.log("boxes", f"[DEBUG] Boxes detected: {len(result)}")
 
         boxes = []
         has_helmet = False
@@ -83,10 +238,9 @@ class HelmetDetector:
         # -------------------------------
         # Parse detections
         # -------------------------------
-        for box in result.boxes:
-            cls_id = int(box.cls[0])
-            label = self.class_names.get(cls_id, "unknown")
-            conf = float(box.conf[0])
+        for xyxy, conf, cls_id in zip(result.xyxy, result.conf, result.cls):
+            label = self.class_names.get(int(cls_id), "unknown")
+            conf = float(conf)
             is_helmet = label == "with helmet"
             is_no_helmet = label == "without helmet"
 
@@ -95,7 +249,7 @@ class HelmetDetector:
             if is_no_helmet:
                 has_no_helmet = True
 
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
+            x1, y1, x2, y2 = (int(v / scale) for v in xyxy)
 
             boxes.append({
                 "x": x1,
@@ -109,8 +263,10 @@ class HelmetDetector:
             })
 
         if len(boxes) == 0:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            faces = self.face_model.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(60, 60))
+            HAAR_FALLBACK.inc()
+            with STAGE_SECONDS.time(stage="haar_fallback"):
+                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+                faces = self.face_model.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(60, 60))
             for (x, y, w, h) in faces:
                 boxes.append({
                     "x": int(x),
@@ -144,5 +300,6 @@ class HelmetDetector:
         return {
             "helmet": helmet_detected,
             "confidence": round(max_conf, 3),
-            "boxes": boxes
+            "boxes": boxes,
+            "passes": passes
         }
@@ -0,0 +1,168 @@
+import os
+import json
+import queue
+import threading
+import time
+
+
+class SessionTimer:
+    """
+    Helmet wear-time for one client (or one demo stream source).
+
+    observe() is fed every detection result. Time between two consecutive
+    helmet-on results is accumulated, unless the gap exceeds max_gap seconds
+    (the client stopped sending frames). It returns True when the caller
+    should publish a timer event: on a running/stopped transition, or every
+    sync_interval seconds while running so viewers can correct their
+    locally extrapolated clock.
+    """
+
+    def __init__(self, max_gap=2.0, sync_interval=None):
+        self.max_gap = max_gap
+        self.sync_interval = sync_interval if sync_interval is not None else float(os.getenv("HELMET_TIMER_SYNC_S", "5"))
+        self.accumulated_time = 0.0
+        self.running = False
+        self.last_request_time = 0.0
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, helmet_on, now=None):
+        now = now if now is not None else time.time()
+        with self._lock:
+            was_running = self.running
+            if helmet_on:
+                if self.running:
+                    dt = now - self.last_request_time
+                    if 0 < dt < self.max_gap:
+                        self.accumulated_time += dt
+                else:
+                    self.running = True
+                self.last_request_time = now
+            else:
+                self.running = False
+            if self.running != was_running or (self.running and now - self._last_sync >= self.sync_interval):
+                self._last_sync = now
+                return True
+            return False
+
+    def control(self, action, now=None):
+        now = now if now is not None else time.time()
+        with self._lock:
+            if action == "stop":
+                self.running = False
+            elif action == "start":
+                self.running = True
+                self.last_request_time = now
+            elif action == "reset":
+                self.accumulated_time = 0.0
+                self.running = False
+            self._last_sync = now
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "accumulated_time": self.accumulated_time,
+                "running": self.running,
+                "last_request_time": self.last_request_time
+            }
+
+
+class EventSubscription:
+    """One SSE connection's bounded event buffer. A stalled client loses its oldest events."""
+
+    def __init__(self, hub, channels, buffer_size):
+        self._hub = hub
+        self.channels = tuple(channels)
+        self._queue = queue.Queue(maxsize=buffer_size)
+        self.delivered = 0
+        self.dropped = 0
+
+    def put(self, item):
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout):
+        """Next formatted event, or None if nothing arrived within timeout."""
+        try:
+            item = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        self.delivered += 1
+        return item
+
+    def close(self):
+        self._hub.unsubscribe(self)
+
+
+class EventHub:
+    """
+    Fans named events out to Server-Sent Events subscribers by channel.
+
+    publish() on a channel nobody listens to is a dict lookup, and an idle
+    subscriber is a thread blocked on its queue that wakes only for events or
+    the keep-alive comment, so clients cost nothing between state changes.
+    """
+
+    def __init__(self, buffer_size=None, keepalive=None):
+        self.buffer_size = buffer_size or int(os.getenv("HELMET_SSE_BUFFER", "32"))
+        self.keepalive = keepalive if keepalive is not None else float(os.getenv("HELMET_SSE_KEEPALIVE_S", "15"))
+        self._lock = threading.Lock()
+        self._channels = {}
+        self.published = 0
+
+    def subscribe(self, channels):
+        sub = EventSubscription(self, channels, self.buffer_size)
+        with self._lock:
+            for channel in sub.channels:
+                self._channels.setdefault(channel, []).append(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for channel in sub.channels:
+                subs = self._channels.get(channel)
+                if subs and sub in subs:
+                    subs.remove(sub)
+                    if not subs:
+                        del self._channels[channel]
+
+    def publish(self, channel, event, data):
+        with self._lock:
+            subs = list(self._channels.get(channel, ()))
+        if not subs:
+            return 0
+        message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        for sub in subs:
+            sub.put(message)
+        self.published += 1
+        return len(subs)
+
+    def stream(self, sub, initial=()):
+        """SSE body generator: initial (event, data) pairs, then live events and keep-alives."""
+        try:
+            for event, data in initial:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            while True:
+                message = sub.get(self.keepalive)
+                # A comment line keeps proxies from closing the idle connection
+                yield message if message is not None else ": keepalive\n\n"
+        finally:
+            sub.close()
+
+    def stats(self):
+        with self._lock:
+            channels = len(self._channels)
+            subscribers = {id(sub) for subs in self._channels.values() for sub in subs}
+        return {
+            "channels": channels,
+            "subscribers": len(subscribers),
+            "published": self.published
+        }
@@ -0,0 +1,174 @@
+import os
+import time
+import queue
+import threading
+import traceback
+from services.batching import QueueFullError
+from services.metrics import ERRORS
+
+
+class JobQueueFullError(Exception):
+    pass
+
+
+class JobRunner:
+    """
+    Runs background jobs on a fixed number of threads (HELMET_JOB_WORKERS),
+    with at most max_pending jobs waiting, so long videos get a bounded
+    share of the machine however many are uploaded.
+
+    run_fn(job_id, cancelled) does the work; cancelled is a threading.Event
+    it should check between steps.
+    """
+
+    def __init__(self, run_fn, workers=None, max_pending=None):
+        self.run_fn = run_fn
+        self.workers = workers or int(os.getenv("HELMET_JOB_WORKERS", "1"))
+        self.max_pending = max_pending or int(os.getenv("HELMET_JOB_QUEUE", "16"))
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._cancel = {}
+        self._running = set()
+        self.completed = 0
+        self.failed = 0
+        self._threads = [threading.Thread(target=self._run, name=f"job-runner-{i}", daemon=True) for i in range(self.workers)]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, job_id, force=False):
+        """Queue a job. force skips the pending limit, for jobs recovered at startup."""
+        with self._lock:
+            if job_id in self._cancel:
+                return
+            if not force and self._queue.qsize() >= self.max_pending:
+                raise JobQueueFullError("too many pending jobs")
+            self._cancel[job_id] = threading.Event()
+        self._queue.put(job_id)
+
+    def cancel(self, job_id):
+        with self._lock:
+            event = self._cancel.get(job_id)
+        if event is None:
+            return False
+        event.set()
+        return True
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            with self._lock:
+                cancelled = self._cancel[job_id]
+                self._running.add(job_id)
+            try:
+                self.run_fn(job_id, cancelled)
+                with self._lock:
+                    self.completed += 1
+            except Exception as e:
+                ERRORS.inc(stage="job")
+                print(f"[ERROR] Job {job_id} failed: {e}")
+                traceback.print_exc()
+                with self._lock:
+                    self.failed += 1
+            finally:
+                with self._lock:
+                    self._running.discard(job_id)
+                    self._cancel.pop(job_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._queue.qsize(),
+                "running": len(self._running),
+                "completed": self.completed,
+                "failed": self.failed
+            }
+
+
+def is_violation(result):
+    # A person without a helmet: any model box that isn't a helmet, or the Haar "Wear the Helmet" fallback
+    return any(not b["is_helmet"] for b in result["boxes"])
+
+
+def summarize_video(path, detect_batch, fps, stride, start_frame=0, batch=8, live_busy=None, cancelled=None, max_yield_s=0.2):
+    """
+    Runs every stride-th frame from start_frame through detect_batch and
+    folds the results into per-second rows:
+        {"second", "frames", "helmet_frames", "violation_frames", "max_violation_confidence"}
+
+    Yields (completed seconds, next_frame) after each batch. All frames
+    before next_frame are covered by seconds already yielded, so it is the
+    point to resume from; the second still being filled is held back until
+    a later frame closes it. The last item has next_frame None.
+
+    Before each batch it waits up to max_yield_s while live_busy() is true,
+    so live requests go first but the job still moves.
+    """
+    from services.video import iter_video
+    fps = fps or 25.0
+    open_rows = {}
+    first_frames = {}
+
+    def fold(items):
+        while True:
+            try:
+                results = detect_batch([image for _, _, image in items])
+                break
+            except QueueFullError:
+                time.sleep(0.05)
+        for (index, _, _), result in zip(items, results):
+            second = int(index / fps)
+            row = open_rows.get(second)
+            if row is None:
+                row = open_rows[second] = {"second": second, "frames": 0, "helmet_frames": 0, "violation_frames": 0, "max_violation_confidence": 0.0}
+                first_frames[second] = index
+            row["frames"] += 1
+            if result["helmet"]:
+                row["helmet_frames"] += 1
+            if is_violation(result):
+                row["violation_frames"] += 1
+                row["max_violation_confidence"] = max(row["max_violation_confidence"], result["confidence"])
+        current = int(items[-1][0] / fps)
+        return close(current), first_frames[current]
+
+    def close(before_second):
+        done = sorted(s for s in open_rows if s < before_second)
+        for s in done:
+            first_frames.pop(s)
+        return [open_rows.pop(s) for s in done]
+
+    pending = []
+    for item in iter_video(path, stride, start_frame):
+        if item[2] is None:
+            continue
+        pending.append(item)
+        if len(pending) < batch:
+            continue
+        if cancelled is not None and cancelled.is_set():
+            return
+        waited = 0.0
+        while live_busy is not None and live_busy() and waited < max_yield_s:
+            time.sleep(0.01)
+            waited += 0.01
+        yield fold(pending)
+        pending = []
+    if cancelled is not None and cancelled.is_set():
+        return
+    if pending:
+        yield fold(pending)
+    yield close(float("inf")), None
+
+
+def violation_spans(seconds):
+    """Merge consecutive per-second rows with violations into [{"start_s", "end_s", "max_confidence"}]."""
+    spans = []
+    for row in seconds:
+        if row["violation_frames"] == 0:
+            continue
+        if spans and row["second"] == spans[-1]["end_s"]:
+            spans[-1]["end_s"] = row["second"] + 1
+            spans[-1]["max_confidence"] = max(spans[-1]["max_confidence"], row["max_violation_confidence"])
+        else:
+            spans.append({"start_s": row["second"], "end_s": row["second"] + 1, "max_confidence": row["max_violation_confidence"]})
+    return spans
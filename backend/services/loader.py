@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+import traceback
+import numpy as np
+from services.metrics import ERRORS
+
+
+def synthetic_frames(count, size=(480, 640)):
+    """Deterministic noise frames: enough texture to exercise every preprocess/infer path."""
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, size=(size[0], size[1], 3), dtype=np.uint8) for _ in range(count)]
+
+
+class ModelLoader:
+    """
+    Builds the detector in a background thread at startup, then warms it up
+    so the first real request doesn't pay for weight loading, lazy
+    allocation or JIT.
+
+    A failed load is retried in the background once the backoff (doubling
+    from backoff_s up to max_backoff_s) has elapsed, whether or not anything
+    calls get(), so an instance kept out of rotation by /api/ready still
+    recovers. get() does not retry any sooner.
+    """
+
+    def __init__(self, factory, warmup_frames=None, warmup_batch=None, backoff_s=None, max_backoff_s=300.0):
+        self.factory = factory
+        self.warmup_frames = warmup_frames if warmup_frames is not None else int(os.getenv("HELMET_WARMUP_FRAMES", "3"))
+        self.warmup_batch = warmup_batch or int(os.getenv("HELMET_BATCH_SIZE", "8"))
+        self.backoff_s = backoff_s if backoff_s is not None else float(os.getenv("HELMET_LOAD_BACKOFF_S", "5"))
+        self.max_backoff_s = max_backoff_s
+
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+        self.detector = None
+        self.state = "idle"
+        self.error = None
+        self.attempts = 0
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self._retry_at = 0.0
+
+    def start(self):
+        """Begin loading unless already loading, loaded, or still backing off after a failure."""
+        with self._lock:
+            if self.state in ("loading", "warming", "ready"):
+                return
+            if self.state == "failed" and time.monotonic() < self._retry_at:
+                return
+            self.state = "loading"
+            self.attempts += 1
+            self._thread = threading.Thread(target=self._load, name="model-loader", daemon=True)
+            self._thread.start()
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            detector = self.factory()
+            self.load_seconds = round(time.perf_counter() - started, 3)
+            with self._lock:
+                self.state = "warming"
+            started = time.perf_counter()
+            self._warmup(detector)
+            self.warmup_seconds = round(time.perf_counter() - started, 3)
+        except Exception as e:
+            ERRORS.inc(stage="model_load")
+            delay = min(self.max_backoff_s, self.backoff_s * 2 ** (self.attempts - 1))
+            print(f"[ERROR] Model load failed (attempt {self.attempts}, retry in {delay:.0f}s): {e}")
+            traceback.print_exc()
+            with self._lock:
+                self.state = "failed"
+                self.error = str(e)
+                self._retry_at = time.monotonic() + delay
+            retry = threading.Timer(delay, self.start)
+            retry.daemon = True
+            retry.start()
+            return
+        with self._lock:
+            self.detector = detector
+            self.state = "ready"
+            self.error = None
+        self._ready.set()
+        print(f"[INFO] Model ready: load {self.load_seconds}s, warm-up {self.warmup_seconds}s ({self.warmup_frames} frames)")
+
+    def _warmup(self, detector):
+        if self.warmup_frames <= 0:
+            return
+        frames = synthetic_frames(max(self.warmup_batch, 1))
+        for i in range(self.warmup_frames):
+            detector.detect_array(frames[i % len(frames)])
+        # The batch scheduler will send up to warmup_batch frames at once; allocate for that too
+        if self.warmup_batch > 1 and hasattr(detector, "detect_array_batch"):
+            detector.detect_array_batch(frames)
+
+    def get(self, wait=0.0):
+        """The ready detector, or None. Kicks off a (re)load when appropriate."""
+        if self._ready.is_set():
+            return self.detector
+        self.start()
+        if wait and self._ready.wait(wait):
+            return self.detector
+        return None
+
+    def stats(self):
+        with self._lock:
+            retry_in = max(0.0, self._retry_at - time.monotonic()) if self.state == "failed" else None
+            return {
+                "state": self.state,
+                "ready": self.state == "ready",
+                "attempts": self.attempts,
+                "load_seconds": self.load_seconds,
+                "warmup_seconds": self.warmup_seconds,
+                "warmup_frames": self.warmup_frames,
+                "error": self.error,
+                "retry_in_s": round(retry_in, 1) if retry_in is not None else None
+            }
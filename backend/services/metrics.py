@@ -0,0 +1,202 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers a sub-millisecond decode up to a multi-second CPU fallback pass
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_str(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{k}="{str(v)}"' for k, v in zip(labelnames, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, registry, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(k, "") for k in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_label_str(self.labelnames, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Settable gauge; set_function() makes it read a callable at scrape time instead."""
+
+    kind = "gauge"
+
+    def __init__(self, registry, name, description, labelnames=()):
+        super().__init__(registry, name, description, labelnames)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def set_function(self, fn, **labels):
+        with self._lock:
+            self._functions[self._key(labels)] = fn
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def render(self):
+        with self._lock:
+            functions = list(self._functions.items())
+        for key, fn in functions:
+            try:
+                value = fn()
+            except Exception:
+                continue
+            with self._lock:
+                self._values[key] = value
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, description, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _label_str(self.labelnames + ("le",), key + (le,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_str(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """Holds metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class RateLimitedLog:
+    """
+    print() at most once per `interval` seconds per key. Suppressed lines are
+    counted and reported with the next one, so per-frame debug output costs a
+    dict lookup instead of a synchronous stdout write.
+    """
+
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._last = {}
+        self._suppressed = {}
+
+    def log(self, key, message):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last.get(key, float("-inf")) < self.interval:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return
+            self._last[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+        print(message + (f" ({suppressed} similar suppressed)" if suppressed else ""))
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram(REGISTRY, "helmet_stage_seconds", "Hot-path stage latency", ("stage",))
+INFER_PASS_SECONDS = Histogram(REGISTRY, "helmet_infer_pass_seconds", "Latency of each model forward pass", ("backend", "infer_pass"))
+REQUEST_SECONDS = Histogram(REGISTRY, "helmet_request_seconds", "End-to-end detection request latency", ("endpoint",))
+FRAME_PASSES = Counter(REGISTRY, "helmet_frame_passes_total", "Frames by number of forward passes used (>1 means a fallback tier ran)", ("passes",))
+HAAR_FALLBACK = Counter(REGISTRY, "helmet_haar_fallback_total", "Frames with no model boxes that ran the Haar face fallback")
+ERRORS = Counter(REGISTRY, "helmet_errors_total", "Errors by stage", ("stage",))
+IN_FLIGHT = Gauge(REGISTRY, "helmet_requests_in_flight", "Detection requests currently being served", ("endpoint",))
+BATCH_QUEUE_DEPTH = Gauge(REGISTRY, "helmet_batch_queue_depth", "Frames waiting for the batch scheduler")
+MODEL_LOAD_SECONDS = Gauge(REGISTRY, "helmet_model_load_seconds", "Time taken to load the inference backend", ("backend",))
+WORKER_BUSY_SECONDS = Counter(REGISTRY, "helmet_worker_busy_seconds_total", "Time each inference worker process spent running batches", ("worker",))
+WORKER_RESTARTS = Counter(REGISTRY, "helmet_worker_restarts_total", "Inference worker processes restarted after exiting", ("worker",))
+RESULT_CACHE = Counter(REGISTRY, "helmet_result_cache_total", "Result cache lookups by outcome (exact_hit, near_hit, miss)", ("outcome",))
+CAMERA_FRAMES = Counter(REGISTRY, "helmet_camera_frames_total", "Camera frames by source and outcome (read, inferred, rejected)", ("camera", "outcome"))
+
+log = RateLimitedLog()
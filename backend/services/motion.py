@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+THUMB_SIZE = (64, 48)
+
+
+def thumbnail_from_array(image):
+    small = cv2.resize(image, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return cv2.GaussianBlur(small, (3, 3), 0)
+
+
+def thumbnail_from_bytes(img_bytes):
+    # JPEG decoders can downscale while decoding, far cheaper than a full decode
+    gray = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if gray is None:
+        return None
+    return thumbnail_from_array(gray)
+
+
+class MotionGate:
+    """
+    Change detector for one frame source. A frame counts as unchanged when
+    the mean absolute difference of its blurred 64x48 grayscale thumbnail
+    against the thumbnail of the last inferred frame is below `threshold`.
+    """
+
+    def __init__(self, threshold, max_age, refresh_interval):
+        self.threshold = threshold
+        self.max_age = max_age
+        self.refresh_interval = refresh_interval
+        self.reference = None
+        self.result = None
+        self.stored_at = 0.0
+        self.reused = 0
+
+    def lookup(self, thumb, now):
+        if self.result is None or thumb is None or self.reference.shape != thumb.shape:
+            return None
+        if now - self.stored_at > self.max_age or self.reused >= self.refresh_interval:
+            return None
+        if float(cv2.absdiff(thumb, self.reference).mean()) >= self.threshold:
+            return None
+        self.reused += 1
+        return self.result
+
+    def store(self, thumb, result, now):
+        self.reference = thumb
+        self.result = result
+        self.stored_at = now
+        self.reused = 0
+
+
+class MotionGatedDetector:
+    """
+    Returns the previous result for a source instead of running the wrapped
+    detector while its scene has not changed. The cached result is still
+    refreshed after `max_age` seconds or `refresh_interval` reused frames.
+
+    Each key (a client id, a camera) has its own gate, and at most `max_keys`
+    gates are kept, least recently used first out.
+    """
+
+    def __init__(self, detector, threshold=None, max_age=None, refresh_interval=None, max_keys=256):
+        self.detector = detector
+        self.threshold = threshold if threshold is not None else float(os.getenv("HELMET_MOTION_THRESHOLD", "2.5"))
+        self.max_age = max_age if max_age is not None else float(os.getenv("HELMET_MOTION_MAX_AGE", "2.0"))
+        self.refresh_interval = refresh_interval or int(os.getenv("HELMET_MOTION_REFRESH", "30"))
+        self.max_keys = max_keys
+        self._gates = OrderedDict()
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.skipped = 0
+
+    def _gate(self, key):
+        with self._lock:
+            gate = self._gates.get(key)
+            if gate is None:
+                gate = MotionGate(self.threshold, self.max_age, self.refresh_interval)
+                self._gates[key] = gate
+                if len(self._gates) > self.max_keys:
+                    self._gates.popitem(last=False)
+            else:
+                self._gates.move_to_end(key)
+            return gate
+
+    def _run(self, thumb, key, infer):
+        gate = self._gate(key)
+        now = time.monotonic()
+        cached = gate.lookup(thumb, now)
+        with self._lock:
+            self.frames += 1
+            if cached is not None:
+                self.skipped += 1
+        if cached is not None:
+            return dict(cached, reused=True)
+        result = infer()
+        if thumb is not None:
+            gate.store(thumb, result, now)
+        return result
+
+    def detect(self, img_bytes, key="default"):
+        return self._run(thumbnail_from_bytes(img_bytes), key, lambda: self.detector.detect(img_bytes))
+
+    def detect_array(self, image, key="default"):
+        thumb = thumbnail_from_array(image) if image is not None else None
+        return self._run(thumb, key, lambda: self.detector.detect_array(image))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "threshold": self.threshold,
+                "max_age": self.max_age,
+                "refresh_interval": self.refresh_interval,
+                "frames": self.frames,
+                "skipped": self.skipped,
+                "skip_ratio": round(self.skipped / self.frames, 3) if self.frames else 0.0,
+                "sources": len(self._gates)
+            }
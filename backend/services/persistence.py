@@ -0,0 +1,125 @@
+import os
+import queue
+import threading
+import time
+from services.metrics import ERRORS
+
+
+class WriteBehindWriter:
+    """
+    Buffers database writes and flushes them in bulk from a background thread.
+
+    Items are handed to flush_fn(items) in batches of up to `max_rows`, or
+    whatever has arrived `max_wait_ms` after the first pending item. flush_fn
+    is expected to write the whole batch in one transaction. With
+    enabled=False every submit() flushes synchronously in the caller's thread
+    instead, which is the old per-request commit behaviour.
+
+    A failed flush is retried up to `retries` times with doubling backoff
+    while later items wait in the queue (synchronous flushes aren't retried,
+    so a request never sleeps). A batch that still fails is handed to
+    on_drop(items), so the caller can undo whatever it assumed was written.
+    """
+
+    def __init__(self, flush_fn, max_rows=None, max_wait_ms=None, enabled=None, retries=None, on_drop=None):
+        self.flush_fn = flush_fn
+        self.on_drop = on_drop
+        self.max_rows = max_rows or int(os.getenv("HELMET_DB_FLUSH_ROWS", "200"))
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else float(os.getenv("HELMET_DB_FLUSH_MS", "500"))) / 1000.0
+        self.enabled = enabled if enabled is not None else os.getenv("HELMET_DB_WRITE_BEHIND", "1") == "1"
+        self.retries = retries if retries is not None else int(os.getenv("HELMET_DB_FLUSH_RETRIES", "3"))
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.flushes = 0
+        self.rows = 0
+        self.errors = 0
+        self.dropped = 0
+        self._worker = None
+        if self.enabled:
+            self._worker = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+            self._worker.start()
+
+    def submit(self, item):
+        if not self.enabled or self._closed:
+            self._flush([item], retries=0)
+            return
+        self._queue.put(item)
+
+    def _flush(self, items, retries=None):
+        retries = self.retries if retries is None else retries
+        delay = 0.5
+        for attempt in range(retries + 1):
+            try:
+                self.flush_fn(items)
+                break
+            except Exception as e:
+                ERRORS.inc(stage="db_flush")
+                with self._lock:
+                    self.errors += 1
+                if attempt < retries:
+                    print(f"[WARN] Write-behind flush of {len(items)} items failed ({e}), retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    delay *= 2
+                    continue
+                print(f"[ERROR] Write-behind flush failed {attempt + 1} times, {len(items)} rows lost: {e}")
+                with self._lock:
+                    self.dropped += len(items)
+                if self.on_drop is not None:
+                    self.on_drop(items)
+                return
+        with self._lock:
+            self.flushes += 1
+            self.rows += len(items)
+
+    def _collect(self):
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # close() sentinel: flush what we have, then stop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            self._flush(batch)
+
+    def close(self, timeout=10.0):
+        """Flush everything still queued and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join(timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "max_rows": self.max_rows,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "pending": self._queue.qsize(),
+                "flushes": self.flushes,
+                "rows": self.rows,
+                "errors": self.errors,
+                "dropped": self.dropped,
+                "mean_rows_per_flush": round(self.rows / self.flushes, 3) if self.flushes else 0.0
+            }
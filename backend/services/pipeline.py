@@ -0,0 +1,209 @@
+import queue
+import threading
+import time
+import cv2
+from services.metrics import ERRORS
+
+
+def open_source(source):
+    """VideoCapture for a device index ("0"), URL or video file path."""
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    return cv2.VideoCapture(source)
+
+
+def draw_boxes(frame, boxes):
+    for b in boxes:
+        x, y, w, h = b["x"], b["y"], b["w"], b["h"]
+        is_helmet = b.get("is_helmet", False)
+        conf = int((b.get("confidence", 0.0)) * 100)
+        color = (34, 197, 94) if is_helmet else (239, 68, 68)
+        label = b.get("label") or ("Helmet Detected" if is_helmet else "Wear the Helmet")
+        cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+        text = f"{label} {conf}%"
+        (tw, th), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+        ly = max(0, y - th - 6)
+        cv2.rectangle(frame, (x, ly), (x + tw + 10, ly + th + 8), color, -1)
+        cv2.putText(frame, text, (x + 5, ly + th + 2), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2, cv2.LINE_AA)
+    return frame
+
+
+class StageStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self.dropped = 0
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000.0, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000.0, 3),
+            "last_ms": round(self.last * 1000.0, 3),
+            "dropped": self.dropped
+        }
+
+
+class StreamPipeline:
+    """
+    Capture -> inference -> annotate/encode, each on its own thread.
+
+    Stages are joined by small bounded queues that drop the oldest item when
+    full, so a slow model never backs up the camera. Every captured frame is
+    annotated with the most recent detections, which keeps the MJPEG output at
+    camera rate while inference runs as fast as it can on the latest frame.
+
+    on_result(boxes) runs on the inference thread after each detection and
+    overlay(frame) runs on the encode thread before the boxes are drawn.
+    """
+
+    def __init__(self, source, detector, on_result=None, overlay=None, jpeg_quality=85, realtime=None):
+        self.source = source
+        self.detector = detector
+        self.on_result = on_result
+        self.overlay = overlay
+        self.jpeg_quality = jpeg_quality
+        # Video files are read as fast as possible unless paced to their own fps
+        self.realtime = realtime if realtime is not None else not (isinstance(source, int) or str(source).isdigit())
+
+        self._infer_q = queue.Queue(maxsize=1)
+        self._encode_q = queue.Queue(maxsize=2)
+        self._out_q = queue.Queue(maxsize=2)
+        self._stop = threading.Event()
+        self._capture_done = threading.Event()
+        self._encode_done = threading.Event()
+        self._lock = threading.Lock()
+        self._boxes = []
+        self._stats = {name: StageStats() for name in ("capture", "inference", "encode", "output")}
+        self._threads = []
+
+    def start(self):
+        for name, target in (("capture", self._capture), ("inference", self._infer), ("encode", self._encode)):
+            t = threading.Thread(target=target, name=f"stream-{name}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=2.0)
+
+    def latest_boxes(self):
+        with self._lock:
+            return list(self._boxes)
+
+    def frames(self):
+        """Yield encoded JPEG bytes until the source ends or stop() is called."""
+        if not self._threads:
+            self.start()
+        while not self._stop.is_set():
+            try:
+                jpg = self._out_q.get(timeout=0.1)
+            except queue.Empty:
+                if self._encode_done.is_set():
+                    break
+                continue
+            sent = time.perf_counter()
+            yield jpg
+            with self._lock:
+                self._stats["output"].record(time.perf_counter() - sent)
+
+    def stats(self):
+        with self._lock:
+            return {name: s.as_dict() for name, s in self._stats.items()}
+
+    def _put_latest(self, q, item, stage):
+        while True:
+            try:
+                q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                    with self._lock:
+                        self._stats[stage].dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _capture(self):
+        cap = open_source(self.source)
+        interval = 0.0
+        if self.realtime:
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            interval = 1.0 / fps if fps and fps > 0 else 0.0
+        try:
+            next_at = time.perf_counter()
+            while not self._stop.is_set():
+                started = time.perf_counter()
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                with self._lock:
+                    self._stats["capture"].record(time.perf_counter() - started)
+                self._put_latest(self._infer_q, frame, "inference")
+                self._put_latest(self._encode_q, frame, "encode")
+                if interval:
+                    next_at += interval
+                    delay = next_at - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+        finally:
+            cap.release()
+            self._capture_done.set()
+
+    def _infer(self):
+        while not self._stop.is_set():
+            try:
+                frame = self._infer_q.get(timeout=0.1)
+            except queue.Empty:
+                if self._capture_done.is_set():
+                    break
+                continue
+            started = time.perf_counter()
+            boxes = []
+            if self.detector is not None:
+                try:
+                    boxes = self.detector.detect_array(frame).get("boxes", [])
+                except Exception:
+                    ERRORS.inc(stage="stream_detect")
+                    boxes = []
+            with self._lock:
+                self._stats["inference"].record(time.perf_counter() - started)
+                self._boxes = boxes
+            if self.on_result is not None:
+                self.on_result(boxes)
+
+    def _encode(self):
+        try:
+            self._encode_loop()
+        finally:
+            self._encode_done.set()
+
+    def _encode_loop(self):
+        while not self._stop.is_set():
+            try:
+                frame = self._encode_q.get(timeout=0.1)
+            except queue.Empty:
+                if self._capture_done.is_set():
+                    break
+                continue
+            started = time.perf_counter()
+            # The inference stage may still be reading this frame
+            frame = frame.copy()
+            if self.overlay is not None:
+                self.overlay(frame)
+            draw_boxes(frame, self.latest_boxes())
+            ok, jpg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            with self._lock:
+                self._stats["encode"].record(time.perf_counter() - started)
+            if ok:
+                self._put_latest(self._out_q, jpg.tobytes(), "output")
@@ -0,0 +1,146 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from services.cache import LruCache
+from services.metrics import RESULT_CACHE
+
+
+def dhash(gray, size=8):
+    """64-bit difference hash of a grayscale frame: is each pixel brighter than its right neighbour, on a 9x8 downscale."""
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    return int.from_bytes(np.packbits(small[:, 1:] > small[:, :-1]).tobytes(), "big")
+
+
+class NearDuplicateIndex:
+    """
+    Bounded LRU of (version, frame shape, dHash) -> result, searched by
+    Hamming distance. The scan is linear, so keep max_entries in the hundreds.
+    """
+
+    def __init__(self, max_bits, max_entries, ttl):
+        self.max_bits = max_bits
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def find(self, version, shape, h):
+        now = time.monotonic()
+        with self._lock:
+            best, best_key = None, None
+            for key, (result, expires_at) in self._entries.items():
+                if key[0] != version or key[1] != shape or now >= expires_at:
+                    continue
+                distance = (key[2] ^ h).bit_count()
+                if distance <= self.max_bits and (best is None or distance < best):
+                    best, best_key = distance, key
+                    if distance == 0:
+                        break
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key][0]
+
+    def put(self, version, shape, h, result):
+        with self._lock:
+            key = (version, shape, h)
+            self._entries[key] = (result, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class ResultCache:
+    """
+    Answers repeated frames (a paused tab, a static camera, a client retry)
+    from earlier results instead of running the wrapped detector again.
+
+    Frames are first looked up by a hash of their raw bytes. With near_bits
+    > 0 a miss is then retried by dHash, reusing the result of any recent
+    frame of the same size within near_bits of 64. Entries expire after
+    `ttl` seconds and are evicted least recently used first beyond
+    max_entries.
+
+    Every key includes version(), the detector's config_key(), so results
+    from another model or other thresholds are never returned.
+    """
+
+    def __init__(self, detector, version, max_entries=None, ttl=None, near_bits=None, near_entries=None):
+        self.detector = detector
+        self.version = version
+        ttl = ttl if ttl is not None else float(os.getenv("HELMET_RESULT_CACHE_TTL_S", "10"))
+        self.exact = LruCache(max_entries or int(os.getenv("HELMET_RESULT_CACHE_SIZE", "2048")), ttl=ttl)
+        near_bits = near_bits if near_bits is not None else int(os.getenv("HELMET_RESULT_CACHE_NEAR_BITS", "0"))
+        self.near = None
+        if near_bits > 0:
+            self.near = NearDuplicateIndex(near_bits, near_entries or int(os.getenv("HELMET_RESULT_CACHE_NEAR_SIZE", "256")), ttl)
+        self._lock = threading.Lock()
+        self.outcomes = {"exact_hit": 0, "near_hit": 0, "miss": 0}
+
+    def _count(self, outcome):
+        RESULT_CACHE.inc(outcome=outcome)
+        with self._lock:
+            self.outcomes[outcome] += 1
+
+    def _lookup(self, version, digest, gray_fn, infer):
+        key = (version, digest)
+        result = self.exact.get(key)
+        if result is not None:
+            self._count("exact_hit")
+            return dict(result, cached="exact")
+
+        gray = gray_fn() if self.near is not None else None
+        h = dhash(gray) if gray is not None else None
+        if h is not None:
+            result = self.near.find(version, gray.shape, h)
+            if result is not None:
+                self._count("near_hit")
+                self.exact.put(key, result)
+                return dict(result, cached="near")
+
+        self._count("miss")
+        result = infer()
+        self.exact.put(key, result)
+        if h is not None:
+            self.near.put(version, gray.shape, h, result)
+        return result
+
+    def detect(self, img_bytes):
+        digest = hashlib.blake2b(img_bytes, digest_size=16).digest()
+        return self._lookup(
+            self.version(), digest,
+            lambda: cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8),
+            lambda: self.detector.detect(img_bytes)
+        )
+
+    def detect_array(self, image):
+        if image is None:
+            return self.detector.detect_array(image)
+        image = np.ascontiguousarray(image)
+        digest = hashlib.blake2b(image.data, digest_size=16)
+        digest.update(repr(image.shape).encode())
+        return self._lookup(
+            self.version(), digest.digest(),
+            lambda: cv2.cvtColor(image, cv2.COLOR_BGR2GRAY),
+            lambda: self.detector.detect_array(image)
+        )
+
+    def stats(self):
+        with self._lock:
+            outcomes = dict(self.outcomes)
+        lookups = sum(outcomes.values())
+        exact = self.exact.stats()
+        stats = {k: exact[k] for k in ("size", "max_entries", "evictions", "expired")}
+        stats["ttl_s"] = self.exact.ttl
+        stats.update(outcomes)
+        stats["hit_ratio"] = round((outcomes["exact_hit"] + outcomes["near_hit"]) / lookups, 3) if lookups else 0.0
+        stats["near_entries"] = len(self.near) if self.near is not None else None
+        return stats
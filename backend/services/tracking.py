@@ -0,0 +1,200 @@
+import os
+import time
+import numpy as np
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU between two (N, 4) / (M, 4) arrays of x, y, w, h boxes."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    ax2, ay2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx2, by2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    iw = np.clip(np.minimum(ax2[:, None], bx2[None]) - np.maximum(a[:, 0][:, None], b[:, 0][None]), 0, None)
+    ih = np.clip(np.minimum(ay2[:, None], by2[None]) - np.maximum(a[:, 1][:, None], b[:, 1][None]), 0, None)
+    inter = iw * ih
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+def summarize_boxes(boxes):
+    # Same safety logic as HelmetDetector: any no-helmet box wins
+    no_helmet = [b["confidence"] for b in boxes if not b["is_helmet"]]
+    helmet = [b["confidence"] for b in boxes if b["is_helmet"]]
+    if no_helmet:
+        return False, round(max(no_helmet), 3)
+    if helmet:
+        return True, round(max(helmet), 3)
+    return False, 0.0
+
+
+class Track:
+    def __init__(self, track_id, box, now, vote_alpha):
+        self.id = track_id
+        self.box = np.array([box["x"], box["y"], box["w"], box["h"]], dtype=np.float32)
+        self.velocity = np.zeros(2, dtype=np.float32)
+        self.confidence = box["confidence"]
+        # 1.0 when the detector last confirmed the track, times decay per frame since, whatever its confidence
+        self.score = 1.0
+        self.helmet_vote = 1.0 if box["is_helmet"] else 0.0
+        self.vote_alpha = vote_alpha
+        self.labels = {box["is_helmet"]: box["label"]}
+        self.updated = now
+        # Last detector box and its time; predict() moves self.box, so velocity is measured against this
+        self.measured = self.box.copy()
+        self.measured_at = now
+        self.misses = 0
+
+    def predict(self, now, decay):
+        dt = now - self.updated
+        self.box[:2] += self.velocity * dt
+        self.updated = now
+        self.score *= decay
+
+    def update(self, box, now):
+        dt = now - self.measured_at
+        new = np.array([box["x"], box["y"], box["w"], box["h"]], dtype=np.float32)
+        if dt > 0:
+            # Constant-velocity model on the box centre, smoothed against jitter
+            v = ((new[:2] + new[2:] / 2) - (self.measured[:2] + self.measured[2:] / 2)) / dt
+            self.velocity = 0.5 * self.velocity + 0.5 * v
+        self.box = new
+        self.updated = now
+        self.measured = new.copy()
+        self.measured_at = now
+        self.confidence = box["confidence"]
+        self.score = 1.0
+        obs = 1.0 if box["is_helmet"] else 0.0
+        self.helmet_vote = self.vote_alpha * obs + (1.0 - self.vote_alpha) * self.helmet_vote
+        self.labels[box["is_helmet"]] = box["label"]
+        self.misses = 0
+
+    def as_box(self, frame_shape):
+        h, w = frame_shape[:2]
+        x, y, bw, bh = self.box
+        x1 = int(np.clip(x, 0, w - 1))
+        y1 = int(np.clip(y, 0, h - 1))
+        x2 = int(np.clip(x + bw, 0, w - 1))
+        y2 = int(np.clip(y + bh, 0, h - 1))
+        is_helmet = self.helmet_vote >= 0.5
+        label = self.labels.get(is_helmet) or ("With Helmet" if is_helmet else "Without Helmet")
+        return {
+            "x": x1,
+            "y": y1,
+            "w": x2 - x1,
+            "h": y2 - y1,
+            "label": label,
+            "confidence": round(float(self.confidence), 3),
+            "is_helmet": is_helmet,
+            "color": [34, 197, 94] if is_helmet else [239, 68, 68],
+            "track_id": self.id
+        }
+
+
+class IouTracker:
+    """Greedy IoU association with a constant-velocity motion model and per-track helmet votes."""
+
+    def __init__(self, iou_threshold=0.3, max_misses=2, decay=0.9, vote_alpha=0.3):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.decay = decay
+        self.vote_alpha = vote_alpha
+        self.tracks = []
+        self._next_id = 1
+
+    def predict(self, now):
+        for t in self.tracks:
+            t.predict(now, self.decay)
+
+    def min_score(self):
+        return min((t.score for t in self.tracks), default=1.0)
+
+    def update(self, boxes, now):
+        self.predict(now)
+        ious = iou_matrix([t.box for t in self.tracks], [[b["x"], b["y"], b["w"], b["h"]] for b in boxes])
+        matched_tracks = set()
+        matched_boxes = set()
+        if ious.size:
+            for flat in np.argsort(-ious, axis=None):
+                ti, bi = np.unravel_index(flat, ious.shape)
+                if ious[ti, bi] < self.iou_threshold:
+                    break
+                if ti in matched_tracks or bi in matched_boxes:
+                    continue
+                self.tracks[ti].update(boxes[bi], now)
+                matched_tracks.add(ti)
+                matched_boxes.add(bi)
+
+        alive = []
+        for i, t in enumerate(self.tracks):
+            if i not in matched_tracks:
+                t.misses += 1
+                if t.misses > self.max_misses:
+                    continue
+            alive.append(t)
+        for i, b in enumerate(boxes):
+            if i not in matched_boxes:
+                alive.append(Track(self._next_id, b, now, self.vote_alpha))
+                self._next_id += 1
+        self.tracks = alive
+
+
+class TrackingDetector:
+    """
+    Wraps a detector with detect_array() and only runs it on keyframes: every
+    `interval` frames, or sooner once a track has gone unconfirmed so long
+    that decay**frames falls below `min_score`. Frames in between carry the
+    tracks forward, so inference cost drops roughly `interval`-fold.
+
+    Returned boxes carry a stable "track_id", and is_helmet is the track's
+    smoothed vote, which keeps the frame decision from flickering.
+    """
+
+    def __init__(self, detector, interval=None, min_score=None):
+        self.detector = detector
+        self.interval = interval or int(os.getenv("HELMET_TRACK_INTERVAL", "1"))
+        self.min_score = min_score if min_score is not None else float(os.getenv("HELMET_TRACK_MIN_SCORE", "0.1"))
+        self.tracker = IouTracker()
+        self._since_keyframe = None
+        self.frames = 0
+        self.keyframes = 0
+
+    def detect_array(self, image, now=None):
+        now = time.perf_counter() if now is None else now
+        self.frames += 1
+        keyframe = (
+            self._since_keyframe is None
+            or self._since_keyframe + 1 >= self.interval
+            or self.tracker.min_score() < self.min_score
+        )
+        result = None
+        if keyframe:
+            result = self.detector.detect_array(image)
+            self.tracker.update(result.get("boxes", []), now)
+            self._since_keyframe = 0
+            self.keyframes += 1
+        else:
+            self.tracker.predict(now)
+            self._since_keyframe += 1
+
+        # Tracks that missed the latest keyframe are kept alive but not shown
+        boxes = [t.as_box(image.shape) for t in self.tracker.tracks if t.misses == 0]
+        helmet, confidence = summarize_boxes(boxes)
+        return {
+            "helmet": helmet,
+            "confidence": confidence,
+            "boxes": boxes,
+            "passes": result.get("passes", 0) if result else 0,
+            "keyframe": keyframe
+        }
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "frames": self.frames,
+            "keyframes": self.keyframes,
+            "tracks": len(self.tracker.tracks),
+            "inference_ratio": round(self.keyframes / self.frames, 3) if self.frames else 0.0
+        }
+
@@ -0,0 +1,56 @@
+import cv2
+
+
+def probe_video(path):
+    """
+    fps, frame count and size of a video file, or None if OpenCV can't open
+    it or read a frame from it. Streamed containers (webm, mkv) often record
+    no frame count; "frames" is None then.
+    """
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return None
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        if frames <= 0:
+            if not cap.grab():
+                return None
+            frames = None
+        return {
+            "fps": fps,
+            "frames": frames,
+            "duration_s": round(frames / fps, 3) if fps and frames else None,
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        }
+    finally:
+        cap.release()
+
+
+def iter_video(path, stride=1, start_frame=0):
+    """(frame index, seconds, image) for every stride-th frame from start_frame on. Skipped frames are grabbed, not decoded."""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        yield start_frame, 0.0, None
+        return
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    index = 0
+    if start_frame > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        index = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+        # Some containers can't seek exactly; grab forward to the frame the caller asked for
+        if index > start_frame:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            index = 0
+    try:
+        while True:
+            if not cap.grab():
+                break
+            if index >= start_frame and index % stride == 0:
+                ok, image = cap.retrieve()
+                if ok:
+                    yield index, round(index / fps, 3) if fps else None, image
+            index += 1
+    finally:
+        cap.release()
@@ -0,0 +1,401 @@
+import os
+import math
+import time
+import atexit
+import itertools
+import traceback
+import threading
+import multiprocessing as mp
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+import cv2
+import numpy as np
+from services.batching import QueueFullError
+from services.metrics import ERRORS, FRAME_PASSES, STAGE_SECONDS, WORKER_BUSY_SECONDS, WORKER_RESTARTS
+
+EMPTY_RESULT = {"helmet": False, "confidence": 0.0, "boxes": []}
+
+
+class WorkerCrashedError(QueueFullError):
+    """The worker holding the frame exited before answering. Retrying is safe, so it is reported like a full queue."""
+
+
+class FrameRing:
+    """
+    Fixed-size frame slots in one shared memory segment. The web tier writes
+    a decoded frame into a free slot and sends the worker only (slot, shape);
+    the worker reads it in place through a numpy view.
+
+    Workers finish out of order, so slots are handed out from a free list
+    rather than strictly round the ring. Only the creating process (the pool)
+    allocates slots; workers attach by name.
+    """
+
+    def __init__(self, slots, slot_bytes, name=None):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=slots * slot_bytes if self.owner else 0)
+        self.name = self.shm.name
+        self._free = list(range(slots))
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            return self._free.pop() if self._free else None
+
+    def release(self, slot):
+        with self._lock:
+            self._free.append(slot)
+
+    def free(self):
+        with self._lock:
+            return len(self._free)
+
+    def view(self, slot, shape):
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _worker_main(index, conn, ring_name, slots, slot_bytes, threads, max_batch, warmup_frames):
+    # Entry point of a worker process: load a model, then serve batches of (job_id, slot, shape) until EOF
+    cv2.setNumThreads(threads)
+    ring = FrameRing(slots, slot_bytes, name=ring_name)
+    try:
+        from ai.backends import load_backend
+        from services.detection import HelmetDetector
+        from services.loader import synthetic_frames
+        detector = HelmetDetector(backend=load_backend(threads=threads))
+        if warmup_frames > 0:
+            detector.detect_array_batch(synthetic_frames(min(warmup_frames, max_batch)))
+    except Exception as e:
+        conn.send(("failed", str(e)))
+        return
+    conn.send(("ready", os.getpid(), detector.config_key()))
+
+    while True:
+        try:
+            jobs = [conn.recv()]
+            while len(jobs) < max_batch and conn.poll():
+                jobs.append(conn.recv())
+        except EOFError:
+            break
+        if None in jobs:
+            break
+        started = time.perf_counter()
+        try:
+            results = detector.detect_array_batch([ring.view(slot, shape) for _, slot, shape in jobs])
+            error = None
+        except Exception as e:
+            results, error = None, str(e)
+        conn.send(("done", [job_id for job_id, _, _ in jobs], results, error, time.perf_counter() - started))
+
+
+class _Worker:
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.send_lock = threading.Lock()
+        self.state = "starting"
+        self.pid = None
+        self.config_key = None
+        self.error = None
+        self.ready_at = None
+        self.restart_at = 0.0
+        self.restarts = 0
+        self.outstanding = 0
+        self.frames = 0
+        self.batches = 0
+        self.busy = 0.0
+
+    def stats(self, now):
+        alive = now - self.ready_at if self.ready_at else 0.0
+        return {
+            "index": self.index,
+            "pid": self.pid,
+            "state": self.state,
+            "outstanding": self.outstanding,
+            "frames": self.frames,
+            "batches": self.batches,
+            "mean_batch_size": round(self.frames / self.batches, 3) if self.batches else 0.0,
+            "utilization": round(min(1.0, self.busy / alive), 3) if alive > 0 else 0.0,
+            "restarts": self.restarts,
+            "error": self.error
+        }
+
+
+class WorkerPool:
+    """
+    Runs inference in `workers` processes, each with its own model using
+    `threads` intra-op threads, so inference neither shares one interpreter
+    lock with request handling nor serializes on one model.
+
+    Frames travel through a FrameRing; pipes carry only slot numbers and
+    results. Each frame goes to the ready worker with the fewest frames
+    outstanding, and a worker batches whatever is queued on its pipe (up to
+    max_batch) into one detect_array_batch call. A worker that exits is
+    restarted, its in-flight frames failing with WorkerCrashedError, with a
+    backoff doubling from 1s to 30s while it keeps exiting.
+
+    Offers the same detect/detect_batch/detect_array/detect_array_batch
+    methods as HelmetDetector. Per-stage metrics are recorded inside the
+    workers and are not visible in this process's /metrics; pass counts and
+    busy time are.
+    """
+
+    def __init__(self, workers=None, threads=None, max_batch=None, slots=None, slot_mb=None, start_timeout=None):
+        self.workers = workers or int(os.getenv("HELMET_WORKERS", "2"))
+        self.threads = threads or int(os.getenv("HELMET_WORKER_THREADS", "0")) or max(1, (os.cpu_count() or 1) // self.workers)
+        self.max_batch = max_batch or int(os.getenv("HELMET_BATCH_SIZE", "8"))
+        self.warmup_frames = int(os.getenv("HELMET_WARMUP_FRAMES", "3"))
+        slots = slots or int(os.getenv("HELMET_POOL_SLOTS", "0")) or self.workers * self.max_batch * 2
+        # Default fits a 1080p BGR frame; larger frames are downscaled into the slot
+        slot_mb = slot_mb or float(os.getenv("HELMET_POOL_SLOT_MB", "8"))
+        start_timeout = start_timeout or float(os.getenv("HELMET_WORKER_START_TIMEOUT_S", "300"))
+
+        self.ring = FrameRing(slots, int(slot_mb * 1024 * 1024))
+        # spawn: workers start from a clean interpreter, with no inherited threads or CUDA state
+        self._ctx = mp.get_context(os.getenv("HELMET_WORKER_START", "spawn"))
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._ids = itertools.count()
+        self._closed = False
+        self.rejected = 0
+        self.pass_counts = {}
+        self._workers = [_Worker(i) for i in range(self.workers)]
+
+        for w in self._workers:
+            self._spawn(w)
+        self._collector = threading.Thread(target=self._collect, name="worker-pool", daemon=True)
+        self._collector.start()
+        atexit.register(self.close)
+
+        deadline = time.monotonic() + start_timeout
+        while not all(w.state == "ready" for w in self._workers):
+            failed = [w for w in self._workers if w.error]
+            if failed or time.monotonic() > deadline:
+                error = failed[0].error if failed else f"workers not ready after {start_timeout:.0f}s"
+                self.close()
+                raise RuntimeError(f"Inference worker failed to start: {error}")
+            time.sleep(0.05)
+        print(f"[INFO] Worker pool ready: {self.workers} workers x {self.threads} threads, {slots} x {slot_mb:g} MB frame slots")
+
+    def _spawn(self, w):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main, name=f"helmet-worker-{w.index}", daemon=True,
+            args=(w.index, child_conn, self.ring.name, self.ring.slots, self.ring.slot_bytes, self.threads, self.max_batch, self.warmup_frames)
+        )
+        process.start()
+        # Our copy of the child's end must go, or its exit would never show up as EOF
+        child_conn.close()
+        w.process, w.conn = process, parent_conn
+        w.state, w.pid, w.ready_at = "starting", process.pid, None
+
+    def _collect(self):
+        while not self._closed:
+            with self._lock:
+                live = {w.conn: w for w in self._workers if w.conn is not None}
+                restart = [w for w in self._workers if w.state == "dead" and time.monotonic() >= w.restart_at]
+            for w in restart:
+                print(f"[INFO] Restarting inference worker {w.index}")
+                self._spawn(w)
+                live[w.conn] = w
+            for conn in wait(list(live), timeout=0.5):
+                w = live[conn]
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    self._on_exit(w)
+                    continue
+                try:
+                    self._on_message(w, message)
+                except Exception as e:
+                    # One bad message must not stop collection (and with it every restart and pending result)
+                    ERRORS.inc(stage="worker_message")
+                    print(f"[ERROR] Inference worker {w.index}: bad message {message[0]!r}: {e}")
+                    traceback.print_exc()
+
+    def _on_message(self, w, message):
+        kind = message[0]
+        if kind == "ready":
+            with self._lock:
+                w.state, w.pid, w.error, w.ready_at = "ready", message[1], None, time.monotonic()
+                w.config_key = message[2]
+                w.busy = 0.0
+        elif kind == "failed":
+            # EOF follows; _on_exit schedules the retry
+            w.error = message[1]
+            print(f"[ERROR] Inference worker {w.index} failed to load: {w.error}")
+        elif kind == "done":
+            _, job_ids, results, error, busy = message
+            WORKER_BUSY_SECONDS.inc(busy, worker=str(w.index))
+            with self._lock:
+                # A frame sent just as its worker died was already failed by _on_exit, and may be answered
+                # by the restarted process; its id is gone and its result is dropped
+                jobs = []
+                for i, job_id in enumerate(job_ids):
+                    job = self._jobs.pop(job_id, None)
+                    if job is not None:
+                        jobs.append((i, job))
+                w.outstanding -= len(jobs)
+                w.frames += len(jobs)
+                w.batches += 1
+                w.busy += busy
+                if results is not None:
+                    for result in results:
+                        passes = result.get("passes", 1)
+                        self.pass_counts[passes] = self.pass_counts.get(passes, 0) + 1
+            if error is not None:
+                ERRORS.inc(stage="detect")
+            for i, (future, slot, _, scale) in jobs:
+                self.ring.release(slot)
+                if error is not None:
+                    future.set_exception(RuntimeError(error))
+                    continue
+                result = results[i]
+                if scale != 1.0:
+                    result["boxes"] = [dict(b, x=int(b["x"] / scale), y=int(b["y"] / scale), w=int(b["w"] / scale), h=int(b["h"] / scale)) for b in result["boxes"]]
+                FRAME_PASSES.inc(passes=str(result.get("passes", 1)))
+                future.set_result(result)
+
+    def _on_exit(self, w):
+        w.conn.close()
+        w.process.join(timeout=1.0)
+        with self._lock:
+            w.conn = None
+            if self._closed:
+                return
+            lost = [(job_id, job) for job_id, job in self._jobs.items() if job[2] == w.index]
+            for job_id, _ in lost:
+                del self._jobs[job_id]
+            w.outstanding = 0
+            was_ready = w.state == "ready"
+            w.state = "dead"
+            w.restarts += 1
+            # Restart at once after a crash in service, back off while it can't even load
+            delay = 0.0 if was_ready else min(30.0, 2.0 ** min(w.restarts - 1, 5))
+            w.restart_at = time.monotonic() + delay
+        ERRORS.inc(stage="worker_crash")
+        WORKER_RESTARTS.inc(worker=str(w.index))
+        print(f"[ERROR] Inference worker {w.index} (pid {w.pid}) exited with code {w.process.exitcode}; "
+              f"{len(lost)} frames lost, restarting in {delay:.0f}s")
+        for _, (future, slot, _, _) in lost:
+            self.ring.release(slot)
+            future.set_exception(WorkerCrashedError(f"inference worker {w.index} exited"))
+
+    def submit_array(self, image):
+        future = Future()
+        if image is None:
+            future.set_result(dict(EMPTY_RESULT))
+            return future
+
+        scale = 1.0
+        if image.nbytes > self.ring.slot_bytes:
+            scale = math.sqrt(self.ring.slot_bytes / image.nbytes) * 0.999
+            image = cv2.resize(image, (int(image.shape[1] * scale), int(image.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+
+        slot = self.ring.acquire()
+        if slot is None:
+            with self._lock:
+                self.rejected += 1
+            ERRORS.inc(stage="queue_full")
+            raise QueueFullError("no free frame slot")
+        np.copyto(self.ring.view(slot, image.shape), image)
+
+        with self._lock:
+            ready = [w for w in self._workers if w.state == "ready"]
+            if not ready:
+                self.rejected += 1
+                self.ring.release(slot)
+                ERRORS.inc(stage="queue_full")
+                raise QueueFullError("no inference worker is ready")
+            w = min(ready, key=lambda w: (w.outstanding, w.index))
+            job_id = next(self._ids)
+            self._jobs[job_id] = (future, slot, w.index, scale)
+            w.outstanding += 1
+        try:
+            with w.send_lock:
+                w.conn.send((job_id, slot, image.shape))
+        except (OSError, AttributeError):
+            # Worker died meanwhile; _on_exit fails this job with the rest of its frames
+            pass
+        return future
+
+    def detect_array(self, image):
+        return self.submit_array(image).result()
+
+    def detect_array_batch(self, images):
+        # In chunks of one full batch per worker, so a long list doesn't need more slots than the ring has
+        chunk = self.workers * self.max_batch
+        results = []
+        for i in range(0, len(images), chunk):
+            futures = [self.submit_array(image) for image in images[i:i + chunk]]
+            results += [f.result() for f in futures]
+        return results
+
+    def detect(self, img_bytes):
+        return self.detect_batch([img_bytes])[0]
+
+    def detect_batch(self, images_bytes):
+        with STAGE_SECONDS.time(stage="imdecode"):
+            images = [cv2.imdecode(np.frombuffer(b, np.uint8), cv2.IMREAD_COLOR) for b in images_bytes]
+        return self.detect_array_batch(images)
+
+    def config_key(self):
+        # Every worker loads the same model and settings; any ready one can answer
+        with self._lock:
+            return next((w.config_key for w in self._workers if w.state == "ready"), None)
+
+    def pass_stats(self):
+        with self._lock:
+            counts = dict(self.pass_counts)
+        frames = sum(counts.values())
+        total = sum(k * v for k, v in counts.items())
+        return {
+            "mode": os.getenv("HELMET_INFER_MODE", "single"),
+            "frames": frames,
+            "passes": total,
+            "mean_passes": round(total / frames, 3) if frames else 0.0,
+            "histogram": counts
+        }
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            per_worker = [w.stats(now) for w in self._workers]
+            rejected = self.rejected
+        return {
+            "workers": self.workers,
+            "threads_per_worker": self.threads,
+            "max_batch": self.max_batch,
+            "slots": self.ring.slots,
+            "free_slots": self.ring.free(),
+            "slot_mb": round(self.ring.slot_bytes / (1024 * 1024), 2),
+            "rejected": rejected,
+            "per_worker": per_worker
+        }
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            workers = [w for w in self._workers if w.conn is not None]
+        for w in workers:
+            try:
+                with w.send_lock:
+                    w.conn.send(None)
+            except OSError:
+                pass
+        for w in workers:
+            w.process.join(timeout=5.0)
+            if w.process.is_alive():
+                w.process.terminate()
+        self.ring.close()
@@ -0,0 +1,150 @@
+import os
+import json
+import queue
+import threading
+import time
+from simple_websocket import ConnectionClosed
+from services.batching import QueueFullError
+
+_CLOSED = object()
+
+
+class DetectionChannel:
+    """
+    One persistent detection WebSocket with credit-based flow control.
+
+      client -> {"type": "auth", "token": <JWT>, "client_id": ...}    text, once
+      server -> {"type": "ready", "credits": N}
+      client -> <JPEG bytes>                                           binary, spends one credit
+      server -> {"type": "result", "seq": k, "credits": 1, ...}        detection, returns the credit
+             or {"type": "busy", "seq": k, "credits": 1, "retry_ms": ...}
+
+    The client may only have N frames outstanding, so its frame rate follows
+    the server's throughput instead of building a queue. A frame that arrives
+    with no credit left replaces the oldest unprocessed one, which is answered
+    with {"type": "dropped", "seq": k, "credits": 1}.
+
+    The token is only checked at the handshake, so the channel remembers
+    its expiry and closes with 1008 (policy violation) once it has passed:
+      server -> {"type": "error", "error": "token expired"}
+
+    authenticate(token, client_id) returns (client_id to use, expiry as a
+    Unix timestamp or None) or None; detect(img_bytes, client_id) returns
+    the result dict and may raise QueueFullError. detect runs in the thread
+    that called run().
+    """
+
+    def __init__(self, ws, authenticate, detect, credits=None, auth_timeout=10.0):
+        self.ws = ws
+        self.authenticate = authenticate
+        self.detect = detect
+        self.credits = credits or int(os.getenv("HELMET_WS_CREDITS", "2"))
+        self.auth_timeout = auth_timeout
+        self._inbox = queue.Queue(maxsize=self.credits)
+        self._send_lock = threading.Lock()
+        self.expires_at = None
+        self.frames = 0
+        self.results = 0
+        self.busy = 0
+        self.dropped = 0
+
+    def _send(self, message):
+        with self._send_lock:
+            self.ws.send(json.dumps(message))
+
+    def _handshake(self):
+        try:
+            raw = self.ws.receive(timeout=self.auth_timeout)
+            message = json.loads(raw) if isinstance(raw, str) else {}
+        except ValueError:
+            message = {}
+        if message.get("type") != "auth":
+            self._send({"type": "error", "error": "auth required"})
+            return None
+        auth = self.authenticate(message.get("token"), message.get("client_id"))
+        if auth is None:
+            self._send({"type": "error", "error": "unauthorized"})
+            return None
+        client_id, self.expires_at = auth
+        return client_id
+
+    def _receive(self):
+        # Reader thread: only queues frames, so a flooding client can't stall detection
+        seq = 0
+        try:
+            while True:
+                data = self.ws.receive()
+                if not isinstance(data, (bytes, bytearray)):
+                    continue
+                item = (seq, data, time.perf_counter())
+                seq += 1
+                while True:
+                    try:
+                        self._inbox.put_nowait(item)
+                        break
+                    except queue.Full:
+                        try:
+                            stale = self._inbox.get_nowait()
+                        except queue.Empty:
+                            continue
+                        self.dropped += 1
+                        self._send({"type": "dropped", "seq": stale[0], "credits": 1})
+        except ConnectionClosed:
+            pass
+        finally:
+            # run() may already be gone (it failed on something other than a closed socket) and never drain
+            # the inbox again, so make room rather than block this thread forever
+            try:
+                self._inbox.put_nowait(_CLOSED)
+            except queue.Full:
+                try:
+                    self._inbox.get_nowait()
+                except queue.Empty:
+                    pass
+                self._inbox.put_nowait(_CLOSED)
+
+    def run(self):
+        try:
+            client_id = self._handshake()
+            if client_id is None:
+                return
+            self._send({"type": "ready", "credits": self.credits})
+            reader = threading.Thread(target=self._receive, name="ws-detect-reader", daemon=True)
+            reader.start()
+            while True:
+                # Wakes at the expiry even if the client has gone quiet
+                timeout = None if self.expires_at is None else max(0.0, self.expires_at - time.time())
+                try:
+                    item = self._inbox.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+                if self.expires_at is not None and time.time() >= self.expires_at:
+                    self._send({"type": "error", "error": "token expired"})
+                    self.ws.close(reason=1008, message="token expired")
+                    break
+                if item is _CLOSED:
+                    break
+                if item is None:
+                    continue
+                seq, data, received = item
+                self.frames += 1
+                try:
+                    result = self.detect(bytes(data), client_id)
+                except QueueFullError:
+                    self.busy += 1
+                    self._send({"type": "busy", "seq": seq, "credits": 1, "retry_ms": 100})
+                    continue
+                self.results += 1
+                latency_ms = round((time.perf_counter() - received) * 1000.0, 2)
+                self._send(dict(result, type="result", seq=seq, credits=1, server_ms=latency_ms))
+        except ConnectionClosed:
+            pass
+
+    def stats(self):
+        return {
+            "credits": self.credits,
+            "frames": self.frames,
+            "results": self.results,
+            "busy": self.busy,
+            "dropped": self.dropped
+        }
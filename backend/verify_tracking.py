@@ -0,0 +1,71 @@
+from services.tracking import TrackingDetector
+
+
+class MovingBox:
+    """Stand-in detector: one helmet box moving right at `speed` px per call."""
+
+    def __init__(self, speed, confidence=0.9):
+        self.speed = speed
+        self.confidence = confidence
+        self.x = 100
+        self.calls = 0
+
+    def detect_array(self, image):
+        box = {"x": self.x, "y": 50, "w": 40, "h": 40, "label": "With Helmet", "confidence": self.confidence, "is_helmet": True}
+        self.x += self.speed
+        self.calls += 1
+        return {"helmet": True, "confidence": self.confidence, "boxes": [box]}
+
+
+class Frame:
+    shape = (480, 640, 3)
+
+
+def verify_tracking():
+    # A keyframe every 3 frames, 10 frames per second, box moving 10 px per keyframe (about 33 px/s)
+    detector = TrackingDetector(MovingBox(speed=10), interval=3, min_score=0.0)
+    xs = []
+    for i in range(12):
+        result = detector.detect_array(Frame(), now=i * 0.1)
+        xs.append(result["boxes"][0]["x"])
+
+    velocity = detector.tracker.tracks[0].velocity
+    print(f"Velocity: {velocity.tolist()} px/s, boxes: {xs}")
+    if velocity[0] <= 0:
+        print("❌ Steadily moving box has no velocity")
+        return False
+    if xs[-1] <= xs[-3]:
+        print("❌ Boxes are held in place between keyframes")
+        return False
+    print("✅ Tracks are extrapolated between keyframes")
+    return True
+
+
+def verify_low_confidence():
+    # A 0.1-confidence track is as trustworthy right after a keyframe as a 0.9 one
+    model = MovingBox(speed=10, confidence=0.1)
+    detector = TrackingDetector(model, interval=4, min_score=0.1)
+    for i in range(12):
+        detector.detect_array(Frame(), now=i * 0.1)
+    print(f"Low-confidence track: {model.calls} keyframes in 12 frames")
+    if model.calls != 3:
+        print("❌ Low-confidence track forces extra keyframes")
+        return False
+
+    # Still, a track left unconfirmed long enough triggers one early (0.9**7 < 0.5)
+    model = MovingBox(speed=10)
+    detector = TrackingDetector(model, interval=100, min_score=0.5)
+    for i in range(12):
+        detector.detect_array(Frame(), now=i * 0.1)
+    print(f"Decayed track: {model.calls} keyframes in 12 frames")
+    if model.calls != 2:
+        print("❌ Decayed track didn't force a keyframe")
+        return False
+    print("✅ Keyframes depend on time since the last detection, not its confidence")
+    return True
+
+
+if __name__ == "__main__":
+    ok = verify_tracking()
+    ok = verify_low_confidence() and ok
+    raise SystemExit(0 if ok else 1)
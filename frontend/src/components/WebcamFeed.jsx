@@ -1,6 +1,35 @@
 import React, { useEffect, useMemo, useRef, useState } from "react"
 import { useAuth } from "../auth/AuthContext.jsx"
 
+export function getClientId() {
+  let clientId = localStorage.getItem("helmet_client_id")
+  if (!clientId) {
+    clientId = "user_" + Math.random().toString(36).substring(2, 15)
+    localStorage.setItem("helmet_client_id", clientId)
+  }
+  return clientId
+}
+
+// Frames are sent back-to-back (at most every FRAME_INTERVAL_MS) but skipped while
+// the scene is unchanged. KEEPALIVE_MS stays under the server's 2 s timer gap so a
+// still, helmeted user keeps accumulating wear time.
+const FRAME_INTERVAL_MS = 250
+const KEEPALIVE_MS = 1500
+const CHANGE_THRESHOLD = 4
+
+function sceneChanged(canvas, source, previous) {
+  const ctx = canvas.getContext("2d", { willReadFrequently: true })
+  ctx.drawImage(source, 0, 0, canvas.width, canvas.height)
+  const pixels = ctx.getImageData(0, 0, canvas.width, canvas.height).data
+  const gray = new Uint8Array(canvas.width * canvas.height)
+  let diff = 0
+  for (let i = 0; i < gray.length; i++) {
+    gray[i] = (pixels[i * 4] * 77 + pixels[i * 4 + 1] * 150 + pixels[i * 4 + 2] * 29) >> 8
+    if (previous) diff += Math.abs(gray[i] - previous[i])
+  }
+  return { gray, changed: !previous || diff / gray.length >= CHANGE_THRESHOLD }
+}
+
 export default function WebcamFeed() {
   const videoRef = useRef(null)
   const captureCanvasRef = useRef(null)
@@ -19,16 +48,19 @@ export default function WebcamFeed() {
   )
 
   const isProcessing = useRef(false)
+  const thumbCanvasRef = useRef(null)
+  const lastSent = useRef({ gray: null, at: 0 })
 
   useEffect(() => {
     let stream
-    let intervalId
+    let timeoutId
+    let stopped = false
 
-    // Ensure client ID exists
-    let clientId = localStorage.getItem("helmet_client_id")
-    if (!clientId) {
-      clientId = "user_" + Math.random().toString(36).substring(2, 15)
-      localStorage.setItem("helmet_client_id", clientId)
+    const clientId = getClientId()
+
+    const loop = async () => {
+      await captureFrame()
+      if (!stopped) timeoutId = setTimeout(loop, FRAME_INTERVAL_MS)
     }
 
     const startCamera = async () => {
@@ -39,8 +71,7 @@ export default function WebcamFeed() {
           await videoRef.current.play()
         }
 
-        // Process frame every 500ms (2 FPS) - Good balance for detection
-        intervalId = setInterval(captureFrame, 500)
+        loop()
       } catch (err) {
         console.error("Camera Error:", err)
         setError("Camera permission denied or unavailable")
@@ -53,6 +84,10 @@ export default function WebcamFeed() {
       if (!running || isProcessing.current) return
       if (!videoRef.current || videoRef.current.readyState !== 4) return
 
+      const { gray, changed } = sceneChanged(thumbCanvasRef.current, videoRef.current, lastSent.current.gray)
+      if (!changed && performance.now() - lastSent.current.at < KEEPALIVE_MS) return
+      lastSent.current = { gray, at: performance.now() }
+
       isProcessing.current = true
 
       try {
@@ -70,15 +105,16 @@ export default function WebcamFeed() {
         const ctx = captureCanvas.getContext("2d")
         ctx.drawImage(video, 0, 0, captureCanvas.width, captureCanvas.height)
 
-        const dataUrl = captureCanvas.toDataURL("image/jpeg", 0.92)
+        // Send raw JPEG bytes instead of a base64 data URL (~33% smaller, no server-side decode)
+        const blob = await new Promise(resolve => captureCanvas.toBlob(resolve, "image/jpeg", 0.92))
 
         // Debug: Log that we are sending a request
         // console.log("Sending frame to backend...")
 
-        const res = await fetch(origin + "/api/detect", {
+        const res = await fetch(origin + "/api/detect?client_id=" + encodeURIComponent(clientId), {
           method: "POST",
-          headers: { "Content-Type": "application/json", ...(token ? { "Authorization": "Bearer " + token } : {}) },
-          body: JSON.stringify({ image: dataUrl, client_id: clientId })
+          headers: { "Content-Type": "image/jpeg", ...(token ? { "Authorization": "Bearer " + token } : {}) },
+          body: blob
         })
 
         const json = await res.json()
@@ -163,7 +199,9 @@ export default function WebcamFeed() {
     }
 
     return () => {
-      clearInterval(intervalId)
+      stopped = true
+      clearTimeout(timeoutId)
+      lastSent.current = { gray: null, at: 0 }
       if (stream) {
           stream.getTracks().forEach(t => t.stop())
       }
@@ -179,7 +217,7 @@ export default function WebcamFeed() {
       await fetch(origin + "/api/timer/control", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ action: willStop ? "stop" : "start" })
+        body: JSON.stringify({ action: willStop ? "stop" : "start", client_id: getClientId() })
       })
     } catch (err) {
       console.error("Failed to update timer:", err)
@@ -223,6 +261,7 @@ export default function WebcamFeed() {
             <video ref={videoRef} className="w-full h-full object-cover" muted playsInline />
             <canvas ref={overlayRef} className="absolute inset-0 pointer-events-none" />
             <canvas ref={captureCanvasRef} className="hidden" />
+            <canvas ref={thumbCanvasRef} width={32} height={18} className="hidden" />
             
             {!running && (
               <div className="absolute inset-0 flex flex-col items-center justify-center text-slate-500 bg-slate-900/80 backdrop-blur-sm">
@@ -1,28 +1,43 @@
 import React, { useState, useEffect } from "react"
-import WebcamFeed from "../components/WebcamFeed.jsx"
+import WebcamFeed, { getClientId } from "../components/WebcamFeed.jsx"
 import { useAuth } from "../auth/AuthContext.jsx"
 
 export default function LiveDetection() {
-  const [timer, setTimer] = useState("00:00")
-  const [totalAccumulated, setTotalAccumulated] = useState(0)
+  const [timerState, setTimerState] = useState({ accumulated: 0, running: false, at: 0 })
+  const [detection, setDetection] = useState(null)
+  const [now, setNow] = useState(() => performance.now())
   const { origin } = useAuth()
 
+  // Timer transitions and detection results are pushed by the server (SSE), no polling
   useEffect(() => {
-    const interval = setInterval(() => {
-      fetch(origin + "/api/timer_status")
-        .then(res => res.json())
-        .then(data => {
-            const totalSeconds = Math.floor(data.accumulated_time)
-            const minutes = Math.floor(totalSeconds / 60)
-            const secs = totalSeconds % 60
-            setTimer(`${minutes.toString().padStart(2, '0')}:${secs.toString().padStart(2, '0')}`)
-            setTotalAccumulated(totalSeconds)
-        })
-        .catch(() => {})
-    }, 1000)
-    return () => clearInterval(interval)
+    const events = new EventSource(origin + "/api/events?client_id=" + encodeURIComponent(getClientId()))
+    // Only this client's own events; other scopes (demo stream, cameras) have their own state
+    events.addEventListener("timer", e => {
+      const data = JSON.parse(e.data)
+      if (data.scope !== "client") return
+      setTimerState({ accumulated: data.accumulated_time, running: data.running, at: performance.now() })
+    })
+    events.addEventListener("detection", e => {
+      const data = JSON.parse(e.data)
+      if (data.scope !== "client") return
+      setDetection({ helmet: data.helmet, confidence: data.confidence })
+    })
+    return () => events.close()
   }, [origin])
 
+  // While running, advance the clock locally between server updates
+  useEffect(() => {
+    if (!timerState.running) return
+    const interval = setInterval(() => setNow(performance.now()), 1000)
+    return () => clearInterval(interval)
+  }, [timerState])
+
+  const elapsed = timerState.running ? Math.max(0, now - timerState.at) / 1000 : 0
+  const totalAccumulated = Math.floor(timerState.accumulated + elapsed)
+  const minutes = Math.floor(totalAccumulated / 60)
+  const secs = totalAccumulated % 60
+  const timer = `${minutes.toString().padStart(2, '0')}:${secs.toString().padStart(2, '0')}`
+
   return (
     <div className="flex flex-col gap-6">
       <div className="grid grid-cols-1 lg:grid-cols-2 gap-6">
@@ -52,11 +67,15 @@ export default function LiveDetection() {
             <div className="space-y-4 mb-8">
               <div className="flex items-center justify-between p-4 rounded-xl bg-slate-800/50 border border-slate-700/50">
                 <span className="text-slate-400 text-sm font-medium">Status</span>
-                <span className="text-white font-medium">Controlled via Start/Stop</span>
+                <span className="text-white font-medium">
+                  {detection === null ? "Controlled via Start/Stop" : detection.helmet ? "Helmet Detected" : "No Helmet"}
+                </span>
               </div>
               <div className="flex items-center justify-between p-4 rounded-xl bg-slate-800/50 border border-slate-700/50">
                 <span className="text-slate-400 text-sm font-medium">Confidence</span>
-                <span className="text-white font-medium">N/A</span>
+                <span className="text-white font-medium">
+                  {detection && detection.confidence > 0 ? `${Math.round(detection.confidence * 100)}%` : "N/A"}
+                </span>
               </div>
             </div>
 